@@ -23,11 +23,140 @@ MULTICAST_FLOW_HARD_TIMEOUT = 20
 # flow entry priority
 ROUTE_FLOW_PRIORITY = 1000
 
+# max time to wait for the barrier replies of a route installation
+FLOW_INSTALL_TIMEOUT = 5  # seconds
+# period of the check for routes past FLOW_INSTALL_TIMEOUT
+FLOW_INSTALL_EXPIRE_TICK = 1  # seconds
+
+# protect pair routes with a link disjoint backup path, switched to by
+# fast failover groups in the switches without the controller
+ROUTE_BACKUP_PATH = False
+
+# unicast forwarding mode:
+# "pair": exact (in_port, ipv4_src, ipv4_dst) flow entries per host pair
+# "destination": ipv4_dst flow entries forming a sink tree toward every
+# destination host, shared by all sources. servers with a business type
+# keep the exact per pair path of the route algorithm.
+ROUTE_FORWARDING_MODE = "pair"
+# destination flow entry priority is DESTINATION_FLOW_PRIORITY + prefix
+# length, below ROUTE_FLOW_PRIORITY
+DESTINATION_FLOW_PRIORITY = 500
+# hosts of one edge switch sharing this prefix are forwarded by one
+# aggregated sink tree, 32 to disable aggregation
+DESTINATION_PREFIX_LEN = 24
+# destination flow entries are removed by the switches after this time,
+# and recalculated on the next packet-in
+DESTINATION_FLOW_HARD_TIMEOUT = 1800
+
 """
 route task handler configuration
 """
 # task
 ROUTE_TASK_HANDLE_INTERVAL = 1
+# retry of failed route calculation, backoff doubled on every retry
+ROUTE_TASK_MAX_RETRY = 5
+ROUTE_TASK_RETRY_BACKOFF = 0.1  # seconds
+ROUTE_TASK_RETRY_BACKOFF_MAX = 5  # seconds
+
+"""
+route registry configuration
+"""
+# deployed unicast routes kept for fault recovery, oldest dropped first
+FLOW_REGISTRY_MAX_FLOWS = 1000000
+
+"""
+request cache configuration
+"""
+# route requests kept, the ones closest to expiry dropped first
+REQUEST_CACHE_CAPACITY = 100000
+# a request and its deployed path are forgotten this long after the last
+# packet-in of the pair
+REQUEST_CACHE_TTL = FLOW_IDLE_TIMEOUT
+# expiry period, and resolution of the request timestamps
+REQUEST_CACHE_TICK = 1  # seconds
+
+"""
+fault recovery configuration
+"""
+# link deletions arriving within the window, e.g. the links of a leaving
+# switch, are recovered in one pass
+FAULT_RECOVERY_COALESCE_WINDOW = 0.05  # seconds
+FAULT_RECOVERY_MAX_BATCH = 1024
+FAULT_RECOVERY_QUEUE_SIZE = 4096
+
+"""
+parallel route calculation configuration
+"""
+# calculate due unicast route tasks in a process pool
+ROUTE_POOL_ENABLE = False
+ROUTE_POOL_WORKERS = 4
+# max number of route tasks handed to the pool in one round
+ROUTE_POOL_MAX_BATCH = 128
+# max time to wait for the results of one round
+ROUTE_POOL_TIMEOUT = 10  # seconds
+
+"""
+packet-in batch worker configuration
+"""
+# route request queue of RouteManage
+ROUTE_QUEUE_SIZE = 1024
+ROUTE_QUEUE_MAX_BATCH = 64
+ROUTE_QUEUE_MAX_LATENCY = 0.01  # seconds
+
+# arp learning queue of ProxyArp
+ARP_QUEUE_SIZE = 4096
+ARP_QUEUE_MAX_BATCH = 256
+ARP_QUEUE_MAX_LATENCY = 0.05  # seconds
+
+"""
+link monitor polling configuration
+"""
+# the due ports of a switch are polled with one port stats request of all
+# its ports, or one request per due port when that is fewer bytes.  the
+# interval of a port is halved when the utilization of its link changed by
+# at least LINK_POLL_HOT_CHANGE of the link capacity between two polls,
+# doubled when it changed by at most LINK_POLL_IDLE_CHANGE, within the
+# bounds below
+LINK_POLL_INTERVAL = 2  # seconds, initial interval of a port
+LINK_POLL_INTERVAL_MIN = 1  # seconds
+LINK_POLL_INTERVAL_MAX = 16  # seconds
+LINK_POLL_HOT_CHANGE = 0.1
+LINK_POLL_IDLE_CHANGE = 0.02
+# scheduler resolution
+LINK_POLL_TICK = 0.25  # seconds
+# a port stats reply starts a new link state epoch, and logs the link as
+# changed, only when it moved the available band of a link by at least
+# LINK_STATE_BAND_CHANGE of the link capacity since the link was last logged
+LINK_STATE_BAND_CHANGE = 0.05
+
+"""
+link history configuration
+"""
+# port stats samples of the monitored ports are kept in ring buffers of
+# LINK_HISTORY_MEMORY bytes in all, for at most LINK_HISTORY_PORTS ports;
+# the port updated least recently gives its buffer to a new one
+LINK_HISTORY_MEMORY = 16 * 1024 * 1024  # bytes
+LINK_HISTORY_PORTS = 2048
+# time constant of the ewma of the used band, a sample dt seconds after
+# the former one has the weight 1 - exp(-dt / LINK_HISTORY_EWMA_TAU)
+LINK_HISTORY_EWMA_TAU = 3  # seconds
+# used band of a link set by the link monitor: 'last' sample, 'ewma' or
+# the LINK_BAND_PERCENTILE of the last LINK_BAND_PERCENTILE_WINDOW samples
+LINK_BAND_ESTIMATOR = 'ewma'
+LINK_BAND_PERCENTILE = 90
+LINK_BAND_PERCENTILE_WINDOW = 30
+# points of a history returned by the rest api
+LINK_HISTORY_POINTS = 60
+
+"""
+app event queue configuration
+"""
+# event queue of the apps handling packet-ins: RouteManage, HostTrack and
+# ProxyArp.  when the queue is full packet-ins are dropped, oldest first,
+# instead of blocking the datapath that received them, the other events
+# are always queued.  policy: 'block', 'drop_newest' or 'drop_oldest'
+PACKET_IN_EVENT_QUEUE_SIZE = 1024
+PACKET_IN_EVENT_QUEUE_POLICY = 'drop_oldest'
 
 """
 server cluster configuration
@@ -4,6 +4,8 @@ import random
 
 from ryu.app.wsgi import ControllerBase, route
 from route_manage.route_algorithm.RouteAlgorithm import Dijkstra
+from route_manage.flow_deployer import FlowBatch, FlowDeployer
+from link_monitor import link_monitor_main
 from base.parameters import BusinessType
 from host_manage.object.server import ClusterServer
 
@@ -317,7 +319,7 @@ class ServerToEdgeSwitchFault(FaultTypeBase):
 
         # Here may be rewrite for improve: for the same switch server, we just need to change the flow entries 
         # in edge switch and access switch(NAT strategy) 
-        task_entry.deploy_flow_table(link_list=link_list, link_cost=None)
+        task_entry.install(link_list=link_list, link_cost=None)
         # if same_switch_server:
         #     self.dispatch_same_switch_flow_entry(chosen_server_switch, server_ip, to_server_port_no, route_request)
         # else:
@@ -417,10 +419,67 @@ class IntraTopoFault(FaultTypeBase):
             logger.error("route path calculate failed/ no path exist, recovery failed.")
             return
 
-        task_entry.deploy_flow_table(link_list=link_list, link_cost=None)
+        task_entry.install(link_list=link_list, link_cost=None)
         logger.info('request from %s to %s, recalculated route path:%s',
                     route_request.src_ip, route_request.dst_ip, link_list)
 
+    def recovery_paths(self, affected_route_requests, switches=None, links=None):
+        """recover the routes of many requests in one pass.
+
+        the requests are grouped by source switch, the shortest path tree
+        of every source is calculated once on the topology after the
+        failure and gives the new path of all its requests.  only the
+        switches whose hops changed are rewritten, the FlowMods of every
+        route are sent in one write per datapath.
+
+        :param affected_route_requests: [(route_request, former_route_path, task_entry)]
+        :param switches: topology switches after the failure, None if already loaded
+        :param links: topology links after the failure
+        :return: number of recovered routes
+        """
+        if switches is not None:
+            self.routing_algorithm.init_algorithm(switches, links)
+        self.routing_algorithm.update_link_status(link_monitor_main.global_link_table)
+
+        requests_by_source = {}
+        for affected in affected_route_requests:
+            requests_by_source.setdefault(affected[0].src_dpid, []).append(affected)
+
+        batch = FlowBatch()
+        recovered = []
+        for src_dpid, requests in requests_by_source.items():
+            # the tree does not depend on the bandwidth requirement
+            self.routing_algorithm.run(src_dpid, requests[0][0].dst_dpid,
+                                       requests[0][2].get_business_type())
+            for route_request, former_route_path, task_entry in requests:
+                if route_request.dst_dpid == src_dpid:
+                    link_list = [src_dpid]
+                else:
+                    link_list, link_cost = self.routing_algorithm.get_link(src_dpid,
+                                                                           route_request.dst_dpid)
+                if link_list is None:
+                    logger.error("request from %s to %s, no path exist, recovery failed.",
+                                 route_request.src_ip, route_request.dst_ip)
+                    continue
+
+                task_entry.flow_batch = batch
+                try:
+                    result = task_entry.deploy_changed(link_list, former_route_path)
+                finally:
+                    task_entry.flow_batch = None
+                if result:
+                    recovered.append((task_entry, link_list))
+                logger.debug('request from %s to %s, recalculated route path:%s',
+                             route_request.src_ip, route_request.dst_ip, link_list)
+
+        install_future = FlowDeployer().commit(batch)
+        for task_entry, link_list in recovered:
+            task_entry.install_future = install_future
+            task_entry.register_route(link_list)
+        logger.info('recovered %s routes of %s sources, %s flow mods',
+                    len(recovered), len(requests_by_source), len(batch))
+        return len(recovered)
+
 
 class AccessSwitchToTopoFault(FaultTypeBase):
     def __init__(self, *args, **kwargs):
@@ -20,10 +20,13 @@ class EventFaultRecoveryUpdateServer(EventBase):
 
 
 class EventFaultRecoveryLinkDelete(EventBase):
-    def __init__(self, src_port, dst_port, timestamp):
+    def __init__(self, src_port, dst_port, timestamp, switches=None, links=None):
         self.src_port = src_port
         self.dst_port = dst_port
         self.timestamp = timestamp
+        # topology after the deletion
+        self.switches = switches
+        self.links = links
         pass
     pass
 
@@ -6,10 +6,13 @@ from ryu.app.wsgi import WSGIApplication
 from ryu.ofproto import ofproto_v1_3
 from ryu.base import app_manager
 from base.parameters import SERVER_STATE_DOWN
+from base.parameters import FAULT_RECOVERY_COALESCE_WINDOW, FAULT_RECOVERY_MAX_BATCH, FAULT_RECOVERY_QUEUE_SIZE
 from fault_recovery import fault_recovery_event
 from fault_recovery.fault_classifier import FaultClassifier, FaultRecoveryDataMaintainer
-from fault_recovery.fault_classifier import ServerToEdgeSwitchFault
+from fault_recovery.fault_classifier import ServerToEdgeSwitchFault, IntraTopoFault
+from lib.batch_worker import BatchWorker
 from route_manage.route_info_maintainer import RequestInfo, RouteInfoMaintainer
+from route_manage.backup_path import path_links
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
 logging.basicConfig(format=FORMAT)
@@ -36,6 +39,12 @@ class FaultRecoveryMain(app_manager.RyuApp):
         super(FaultRecoveryMain, self).__init__(*args, **kwargs)
         self.fault_classifier = FaultClassifier()
 
+        # link deletions waiting for recovery
+        self.link_delete_queue = BatchWorker('fault_recovery', self._recover_link_faults,
+                                             FAULT_RECOVERY_QUEUE_SIZE, FAULT_RECOVERY_MAX_BATCH,
+                                             FAULT_RECOVERY_COALESCE_WINDOW)
+        self.link_delete_queue.start()
+
         # Register a restful controller for this module
         wsgi = kwargs['wsgi']
         wsgi.register(FaultRecoveryDataMaintainer, {fault_recovery_instance_name: self})
@@ -43,43 +52,82 @@ class FaultRecoveryMain(app_manager.RyuApp):
     @set_ev_cls(fault_recovery_event.EventFaultRecoveryLinkDelete)
     def link_delete_handler(self, ev):
         """
-            try to recovery when link is down.
+            try to recovery when link is down, the link deletions arriving
+            within FAULT_RECOVERY_COALESCE_WINDOW are recovered together.
         """
-        src_port = ev.src_port
-        src_switch_dpid = src_port.dpid
-        dst_port = ev.dst_port
-        dst_switch_dpid = dst_port.dpid
-
-        # get fault type by src & dst switch port.
-        link_fault = self.fault_classifier.classify_link_fault_type(src_port, dst_port)
-
-        failure_link_index = (src_switch_dpid, dst_switch_dpid)
-        reverse_failure_link_index = (dst_switch_dpid, src_switch_dpid)
-
-        if DATA_STORE_METHOD == IMPROVED_STORE_METHOD:
-            affected_route_requests = self._find_affected_route_requests(failure_link_index,
-                                                                         reverse_failure_link_index)
-        elif DATA_STORE_METHOD == OLD_STORE_METHOD:
-            affected_route_requests = self._find_affected_route_requests_old(failure_link_index,
+        if not self.link_delete_queue.put(ev):
+            logger.error('link delete queue full, link %s->%s not recovered',
+                         ev.src_port.dpid, ev.dst_port.dpid)
+
+    def _recover_link_faults(self, events):
+        """recover the routes over the links deleted by events in one pass."""
+        failure_links = set()
+        # {flow id: (route_request, route_path, task_entry)}, a route over
+        # several deleted links is recovered once
+        intra_topo_requests = {}
+        other_requests = []
+        for ev in events:
+            src_port = ev.src_port
+            src_switch_dpid = src_port.dpid
+            dst_port = ev.dst_port
+            dst_switch_dpid = dst_port.dpid
+
+            # get fault type by src & dst switch port.
+            link_fault = self.fault_classifier.classify_link_fault_type(src_port, dst_port)
+
+            failure_link_index = (src_switch_dpid, dst_switch_dpid)
+            reverse_failure_link_index = (dst_switch_dpid, src_switch_dpid)
+            failure_links.add(failure_link_index)
+            failure_links.add(reverse_failure_link_index)
+
+            if DATA_STORE_METHOD == IMPROVED_STORE_METHOD:
+                affected_route_requests = self._find_affected_route_requests(failure_link_index,
                                                                              reverse_failure_link_index)
-        else:
-            logger.exception("unsupported method:%s", DATA_STORE_METHOD)
-            return
+            elif DATA_STORE_METHOD == OLD_STORE_METHOD:
+                # the old structure keeps the paths only, nothing to recover
+                affected_route_path = self._find_affected_route_requests_old(failure_link_index,
+                                                                             reverse_failure_link_index)
+                logger.info('affected route %s paths', len(affected_route_path))
+                continue
+            else:
+                logger.exception("unsupported method:%s", DATA_STORE_METHOD)
+                return
+
+            for (route_request, route_path, task_entry) in affected_route_requests or []:
+                if not isinstance(route_request, RequestInfo):
+                    raise TypeError('The type of request is not RequestInfo!')
+                if isinstance(link_fault, IntraTopoFault):
+                    intra_topo_requests[task_entry.flow_id] = (route_request, route_path, task_entry)
+                else:
+                    other_requests.append((link_fault, route_request, route_path, task_entry))
+
+        # the switches already forward over the backup path
+        failed_over = []
+        affected_route_requests = []
+        for (route_request, route_path, task_entry) in intra_topo_requests.values():
+            backup_path = getattr(task_entry, 'backup_path', None)
+            if backup_path and not failure_links & path_links(backup_path):
+                failed_over.append(task_entry)
+            else:
+                affected_route_requests.append((route_request, route_path, task_entry))
 
         # try to recovery all affected route requests.
+        logger.info('affected route %s requests', len(intra_topo_requests) + len(other_requests))
         if affected_route_requests:
-            logger.info('affected route %s requests', len(affected_route_requests))
-            for (route_request, route_path, task_entry) in affected_route_requests:
-                if isinstance(route_request, RequestInfo):
-                    link_fault.recovery_path(route_request, servers, route_path, task_entry)
-                else:
-                    raise TypeError('The type of request is not RequestInfo!')
-                pass
-            pass
+            IntraTopoFault().recovery_paths(affected_route_requests, events[-1].switches,
+                                            events[-1].links)
+        for (link_fault, route_request, route_path, task_entry) in other_requests:
+            link_fault.recovery_path(route_request, servers, route_path, task_entry)
 
         # calculate recovery time cost.
-        recovery_spend_time = time.time() - ev.timestamp
-        logger.info('recover fault link success, time cost: %s', recovery_spend_time)
+        recovery_spend_time = time.time() - min(ev.timestamp for ev in events)
+        logger.info('recover fault link success, time cost: %s, deleted links: %s, '
+                    'failed over to backup path: %s',
+                    recovery_spend_time, len(failure_links) / 2, len(failed_over))
+
+        # find better routes for the failed over requests in background
+        for task_entry in failed_over:
+            task_entry.reoptimize()
 
     @set_ev_cls(fault_recovery_event.EventFaultRecoveryPortDown)
     def port_modify_handler(self, ev):
@@ -116,18 +164,11 @@ class FaultRecoveryMain(app_manager.RyuApp):
     def _find_affected_route_requests(failure_link_index, reverse_failure_link_index):
         find_affected_request_start_time = time.time()
 
+        # the link index covers both ways of the link
         route_info_maintainer = RouteInfoMaintainer()
-        request_info_dic = route_info_maintainer.get_route_info()
-
-        if not request_info_dic:
+        affected_route_requests_and_path = route_info_maintainer.get_route_info_by_link(*failure_link_index)
+        if not affected_route_requests_and_path:
             return None
-        else:
-            if failure_link_index in request_info_dic:
-                affected_route_requests_and_path = request_info_dic[failure_link_index]
-            elif reverse_failure_link_index in request_info_dic:
-                affected_route_requests_and_path = request_info_dic[reverse_failure_link_index]
-            else:
-                return None
 
         find_affected_request_end_time = time.time()
         find_affected_request_spend_time = find_affected_request_end_time - find_affected_request_start_time
@@ -139,15 +180,9 @@ class FaultRecoveryMain(app_manager.RyuApp):
     @staticmethod
     def _find_affected_route_path_by_port(port_index):
         route_info_maintainer = RouteInfoMaintainer()
-        request_info_dic_by_port = route_info_maintainer.get_route_info_by_port()
-
-        if not request_info_dic_by_port:
+        affected_route_requests_and_path = route_info_maintainer.get_route_info_by_port(port_index)
+        if not affected_route_requests_and_path:
             return None
-        else:
-            if port_index in request_info_dic_by_port:
-                affected_route_requests_and_path = request_info_dic_by_port[port_index]
-            else:
-                return None
 
         return affected_route_requests_and_path
 
@@ -0,0 +1,73 @@
+import json
+import logging
+import random
+import time
+
+from host_manage.HostTrack import MacEntry
+from host_manage.object.host_index import HostIndex
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, HOST_NUM hosts with one ip each, 20 hosts per edge
+    switch, LOOKUP_NUM lookups of random known ips.
+"""
+HOST_NUM = 20000
+LOOKUP_NUM = 200000
+
+
+def build_entries(host_num=HOST_NUM):
+    entries = {}
+    for num in range(host_num):
+        mac = '02:00:00:%02x:%02x:%02x' % (num >> 16, (num >> 8) & 0xff, num & 0xff)
+        entry = MacEntry(300001 + num / 20, 1 + num % 20, mac)
+        entry.ipaddrs['10.%d.%d.%d' % (num >> 16, (num >> 8) & 0xff, num & 0xff)] = 0
+        entries[mac] = entry
+    return entries
+
+
+def get_mac_scan(entries, ip_addr):
+    # the former RouteManage.get_mac
+    for mac_addr, host_info_entry in entries.items():
+        if host_info_entry.ipaddrs.keys()[0] == ip_addr:
+            return mac_addr
+    return None
+
+
+def bench(name, func, ips):
+    start = time.time()
+    for ip in ips:
+        func(ip)
+    used = time.time() - start
+    logger.info("%s: %d lookups in %.3fs, %.0f lookups/sec",
+                name, len(ips), used, len(ips) / used)
+    return used
+
+
+if __name__ == '__main__':
+    entries = build_entries()
+    host_index = HostIndex()
+    for entry in entries.values():
+        host_index.add_entry(entry)
+    logger.info("%d hosts, %s", HOST_NUM, host_index.stats())
+
+    ips = [random.choice(entries.values()).ipaddrs.keys()[0] for _ in range(LOOKUP_NUM)]
+    for ip in ips[:100]:
+        assert host_index.get_mac(ip) == get_mac_scan(entries, ip)
+
+    scan = bench("entry scan", lambda ip: get_mac_scan(entries, ip), ips[:LOOKUP_NUM / 1000])
+    index = bench("host index", host_index.get_mac, ips)
+    logger.info("speed up: %.0fx", (scan * 1000) / index)
+
+    start = time.time()
+    size = sum(len(chunk) for chunk in host_index.iter_json())
+    used = time.time() - start
+    logger.info("streamed dump: %d bytes in %.3fs, largest chunk %d bytes",
+                size, used, max(len(chunk) for chunk in host_index.iter_json()))
+    start = time.time()
+    size = len(json.dumps([{mac: entry.to_dict()} for mac, entry in entries.items()]))
+    logger.info("single blob dump: %d bytes in %.3fs", size, time.time() - start)
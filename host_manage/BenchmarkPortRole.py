@@ -0,0 +1,106 @@
+import logging
+import random
+import time
+from collections import namedtuple
+
+from ryu.ofproto import ofproto_v1_3
+from ryu.topology.switches import Port, Link
+
+from host_manage.object.port_role import PortRoleTable
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, fattree k=10: 25 core, 50 aggregation, 50 edge switches,
+    500 switch-to-switch links (1000 directed links as reported by
+    ryu.topology.api.get_all_link).
+"""
+FAT_TREE_K = 10
+PACKET_IN_NUM = 200000
+
+OFPPort = namedtuple('OFPPort', ['port_no', 'hw_addr', 'name', 'config', 'state'])
+
+
+def _port(dpid, port_no):
+    return Port(dpid, ofproto_v1_3,
+                OFPPort(port_no, '00:00:00:00:00:00', 'eth%d' % port_no, 0, 0))
+
+
+def build_fat_tree(k=FAT_TREE_K):
+    """
+        return (directed link list, host facing (dpid, port_no) list).
+        dpid: core 1xxx, aggregation 2xxx, edge 3xxx.
+    """
+    half = k / 2
+    links = []
+    host_ports = []
+
+    def connect(src_dpid, src_port, dst_dpid, dst_port):
+        src = _port(src_dpid, src_port)
+        dst = _port(dst_dpid, dst_port)
+        links.append(Link(src, dst))
+        links.append(Link(dst, src))
+
+    for pod in range(k):
+        for a in range(half):
+            agg = 2001 + pod * half + a
+            for e in range(half):
+                edge = 3001 + pod * half + e
+                connect(edge, half + 1 + a, agg, 1 + e)
+            for c in range(half):
+                core = 1001 + a * half + c
+                connect(agg, half + 1 + c, core, 1 + pod)
+        for e in range(half):
+            edge = 3001 + pod * half + e
+            for h in range(half):
+                host_ports.append((edge, 1 + h))
+
+    return links, host_ports
+
+
+def is_inter_switch_scan(link_list, dpid, in_port):
+    # the former HostTrack._packet_in_handler check
+    for index, link in enumerate(link_list):
+        if dpid == link.src.dpid:
+            if in_port == link.src.port_no:
+                return True
+        elif dpid == link.dst.dpid:
+            if in_port == link.dst.port_no:
+                return True
+    return False
+
+
+def bench(name, func, packet_ins):
+    start = time.time()
+    for dpid, port_no in packet_ins:
+        func(dpid, port_no)
+    used = time.time() - start
+    logger.info("%s: %d packet-ins in %.3fs, %.0f packet-ins/sec",
+                name, len(packet_ins), used, len(packet_ins) / used)
+    return used
+
+
+if __name__ == '__main__':
+    links, host_ports = build_fat_tree()
+    logger.info("fat tree k=%d, links=%d", FAT_TREE_K, len(links) / 2)
+
+    table = PortRoleTable()
+    for link in links:
+        table.add_link(link)
+
+    # packet-ins come from hosts, they are the ones that scan all links
+    packet_ins = [random.choice(host_ports) for _ in range(PACKET_IN_NUM)]
+    for dpid, port_no in packet_ins[:1000]:
+        assert not table.is_inter_switch(dpid, port_no)
+        assert not is_inter_switch_scan(links, dpid, port_no)
+
+    # NOTE: the request/reply round-trip of get_all_link() to the
+    # Switches app is not included, so the scan figure is optimistic.
+    scan = bench("get_all_link scan", lambda d, p: is_inter_switch_scan(links, d, p),
+                 packet_ins[:PACKET_IN_NUM / 100])
+    index = bench("port role table", table.is_inter_switch, packet_ins)
+    logger.info("speed up: %.0fx", (scan * 100) / index)
@@ -15,6 +15,7 @@ from ryu.lib.packet import arp, ipv4
 import topology_manage.api as topo_api
 from lib.project_lib import find_packet
 from HostTrack import DEFAULT_ARP_PING_SRC_MAC
+from host_manage.object.host_index import HostIndex
 
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
@@ -63,6 +64,15 @@ class HostDiscovery(app_manager.RyuApp):
 
         self.switches = topo_api.get_all_switch(self)
 
+        # ask the last known location only
+        location = HostIndex().get_location(req_ip)
+        if location is not None:
+            mac_addr, dpid, port_no = location
+            sw = self.switches.get_switch(dpid)
+            if sw is not None:
+                self._send_arp_request(sw.dp, req_ip, port_no)
+                return
+
         for dpid in self.switches:
             sw = self.switches.get_switch(dpid)
             if sw.attribute == sw.AttributeEnum.edge:
@@ -70,10 +80,11 @@ class HostDiscovery(app_manager.RyuApp):
                 pass
 
     @staticmethod
-    def _send_arp_request(datapath, req_ip):
+    def _send_arp_request(datapath, req_ip, out_port=None):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
-        out_port = ofproto.OFPP_FLOOD
+        if out_port is None:
+            out_port = ofproto.OFPP_FLOOD
 
         p = packet.Packet()
         p.add_protocol(ethernet.ethernet(ethertype=ether.ETH_TYPE_ARP,
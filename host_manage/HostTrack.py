@@ -19,12 +19,18 @@ from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.ofproto import ether
-from ryu.topology import api
+from ryu.topology import event as topo_event
 from ryu.lib import hub
 from ryu.lib.packet import (arp, ipv4, tcp, icmp, lldp)
+from ryu.lib.packet.packet_view import get_packet_view
 from ryu.lib.dpid import dpid_to_str
 from ryu.app.wsgi import ControllerBase, WSGIApplication, route
 
+from host_manage.object.port_role import PortRoleTable
+from host_manage.object.host_index import HostIndex
+from lib.expiry_scheduler import ExpiryScheduler
+from base.parameters import PACKET_IN_EVENT_QUEUE_SIZE, PACKET_IN_EVENT_QUEUE_POLICY
+
 
 ETHERNET = ethernet.ethernet.__name__
 ARP = arp.arp.__name__
@@ -44,7 +50,7 @@ timeoutSec = dict(
     arpAware=10 * 2,  # Quiet ARP-responding entries are pinged after this
     arpSilent=10 * 20,  # This is for quiet entries not known to answer ARP
     arpReply=4,  # Time to wait for an ARP reply before retrial
-    timerInterval=5,  # Seconds between timer routine activations
+    timerInterval=5,  # Seconds between ARP ping retrials, and deferrals of entry expiry
     entryMove=60  # Minimum expected time to move a physical entry
 )
 
@@ -197,6 +203,9 @@ class MacEntry(Alive):
 class HostTrack(app_manager.RyuApp):
     _EVENTS = [EventHostState]
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    EVENT_QUEUE_SIZE = PACKET_IN_EVENT_QUEUE_SIZE
+    EVENT_QUEUE_POLICY = PACKET_IN_EVENT_QUEUE_POLICY
+    EVENT_QUEUE_DROPPABLE = [ofp_event.EventOFPPacketIn]
     _CONTEXTS = {
         'wsgi': WSGIApplication
     }
@@ -223,7 +232,13 @@ class HostTrack(app_manager.RyuApp):
 
         # The following tables should go to Topology later
         self.entry_by_mac = {}
-        self.timer_thread = hub.spawn(self._timer)
+        # {(dpid, port_no): links}, maintained from topology events
+        self.port_role = PortRoleTable()
+        # ip/mac -> MacEntry of the hosts learned here
+        self.host_index = HostIndex()
+        # deadlines of the mac and ip entries
+        self.expiry_scheduler = ExpiryScheduler()
+        self.expiry_scheduler.start()
 
     # def update_gateway_entry(self):
     #     for gateway_ip,gateway_mac in GATEWAY_MAC_DICT.items():
@@ -233,11 +248,6 @@ class HostTrack(app_manager.RyuApp):
     #                                      MAIN_DISPATCHER)
     #     pass
 
-    def _timer(self):
-        while True:
-            self._check_timeouts()
-            hub.sleep(timeoutSec['timerInterval'])
-
     def get_mac_entry(self, macaddr):
         try:
             result = self.entry_by_mac[macaddr]
@@ -267,6 +277,7 @@ class HostTrack(app_manager.RyuApp):
             self.logger.debug("%i %i ERROR sending ARP REQ to %s %s",
                               mac_entry.dpid, mac_entry.port, mac_entry.macaddr, ipaddr)
             del mac_entry.ipaddrs[ipaddr]
+            self.host_index.remove_ip(mac_entry, ipaddr)
         else:
             ofproto = datapath.ofproto
             parser = datapath.ofproto_parser
@@ -317,6 +328,9 @@ class HostTrack(app_manager.RyuApp):
             # new mapping
             ip_entry = IpEntry(has_arp)
             mac_entry.ipaddrs[pkt_ip_src] = ip_entry
+            self.host_index.add_ip(mac_entry, pkt_ip_src)
+            self.expiry_scheduler.schedule('host_track_ip', ip_entry.lastTimeSeen + ip_entry.interval,
+                                           self._ip_timeout, mac_entry, pkt_ip_src, ip_entry)
             self.logger.debug("Learned %s got IP %s", str(mac_entry), str(pkt_ip_src))
         if has_arp:
             ip_entry.pings.received()
@@ -340,6 +354,22 @@ class HostTrack(app_manager.RyuApp):
                                 match=match, instructions=inst)
         datapath.send_msg(mod)
 
+    @set_ev_cls(topo_event.EventLinkAdd)
+    def link_add_handler(self, ev):
+        self.port_role.add_link(ev.link)
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+    def link_delete_handler(self, ev):
+        self.port_role.del_link(ev.link)
+
+    @set_ev_cls(topo_event.EventPortDelete)
+    def port_delete_handler(self, ev):
+        self.port_role.del_port(ev.port.dpid, ev.port.port_no)
+
+    @set_ev_cls(topo_event.EventSwitchLeave)
+    def switch_leave_handler(self, ev):
+        self.port_role.del_switch(ev.switch.dp.id)
+
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
         """
@@ -361,24 +391,17 @@ class HostTrack(app_manager.RyuApp):
             # ignore reserve port
             return
         dpid = datapath.id
-        pkt = packet.Packet(msg.data)
+        pkt = get_packet_view(ev)
 
         eth = pkt.get_protocols(ethernet.ethernet)[0]
         dst_mac = eth.dst
         src_mac = eth.src
 
-        header_list = dict(
-            (p.protocol_name, p) for p in pkt.protocols if type(p) != str)
+        header_list = pkt.header_list
 
         # if the in_port is the port between switches:return
-        link_list = api.get_all_link(self)
-        for index, link in enumerate(link_list):
-            if dpid == link.src.dpid:
-                if in_port == link.src.port_no:
-                    return
-            elif dpid == link.dst.dpid:
-                if in_port == link.dst.port_no:
-                    return
+        if self.port_role.is_inter_switch(dpid, in_port):
+            return
         # if the packet is LLDP:return         
         if LLDP in header_list:
             return
@@ -395,6 +418,9 @@ class HostTrack(app_manager.RyuApp):
             mac_entry = MacEntry(dpid, in_port, src_mac)
             self.mac_to_port[dpid][src_mac] = in_port
             self.entry_by_mac[src_mac] = mac_entry
+            self.host_index.add_entry(mac_entry)
+            self.expiry_scheduler.schedule('host_track_mac', mac_entry.lastTimeSeen + mac_entry.interval,
+                                           self._mac_timeout, mac_entry)
             self.logger.info("Learned %s", str(mac_entry))
             self.send_event_to_observers(EventHostState(self.mac_to_port, mac_entry, join=True), MAIN_DISPATCHER)
         elif mac_entry != (dpid, in_port, src_mac):
@@ -413,7 +439,7 @@ class HostTrack(app_manager.RyuApp):
             e = EventHostState(self.mac_to_port, mac_entry, move=True, new_dpid=dpid, new_port=in_port)
             self.send_event_to_observers(e)
             mac_entry.dpid = e._new_dpid
-            mac_entry.inport = e._new_port
+            mac_entry.port = e._new_port
         mac_entry.refresh()
 
         pkt_ip_src, has_arp = self.get_src_ip_and_arp(header_list)
@@ -423,33 +449,68 @@ class HostTrack(app_manager.RyuApp):
         if self.eat_packets and dst_mac == self.ping_src_mac:
             pass  # RYU do not support Event Halt
 
-    def _check_timeouts(self):
+    def _ip_timeout(self, mac_entry, ip_addr, ip_entry):
+        """
+        Called by the expiry scheduler at the deadline of an IP entry
+
+        Pings the host of an expired IP address every timerInterval, and
+        removes the address when the pings failed.
         """
-        Checks for timed out entries
+        if mac_entry.ipaddrs.get(ip_addr) is not ip_entry or \
+                self.entry_by_mac.get(mac_entry.macaddr) is not mac_entry:
+            # removed meanwhile
+            return None
+        if not ip_entry.expired():
+            self.expiry_scheduler.schedule('host_track_ip', ip_entry.lastTimeSeen + ip_entry.interval,
+                                           self._ip_timeout, mac_entry, ip_addr, ip_entry)
+            return None
+        if ip_entry.pings.failed():
+            del mac_entry.ipaddrs[ip_addr]
+            self.host_index.remove_ip(mac_entry, ip_addr)
+            self.logger.info("Entry %s: IP address %s expired",
+                             str(mac_entry), str(ip_addr))
+            return 'ip_expired'
+
+        self.send_ping(mac_entry, ip_addr)
+        if mac_entry.ipaddrs.get(ip_addr) is not ip_entry:
+            # the ping could not be sent
+            return 'ip_expired'
+        ip_entry.pings.sent()
+        self.expiry_scheduler.schedule('host_track_ip', time.time() + timeoutSec['timerInterval'],
+                                       self._ip_timeout, mac_entry, ip_addr, ip_entry)
+        return 'pinged'
+
+    def _mac_timeout(self, mac_entry):
         """
-        for mac_entry in self.entry_by_mac.values():
-            entry_pinged = False
-            for ip_addr, ip_entry in mac_entry.ipaddrs.items():
-                if ip_entry.expired():
-                    if ip_entry.pings.failed():
-                        del mac_entry.ipaddrs[ip_addr]
-                        self.logger.info("Entry %s: IP address %s expired",
-                                         str(mac_entry), str(ip_addr))
-                    else:
-                        self.send_ping(mac_entry, ip_addr)
-                        ip_entry.pings.sent()
-                        entry_pinged = True
-            if mac_entry.expired() and not entry_pinged:
-                self.logger.info("Entry %s expired", str(mac_entry))
-                # sanity check: there should be no IP addresses left
-                if len(mac_entry.ipaddrs) > 0:
-                    for ip in mac_entry.ipaddrs.keys():
-                        self.logger.warning("Entry %s expired but still had IP address %s",
-                                            str(mac_entry), str(ip_addr))
-                        del mac_entry.ipaddrs[ip_addr]
-                del self.mac_to_port[mac_entry.dpid][mac_entry.macaddr]
-                self.send_event_to_observers(EventHostState(self.mac_to_port, mac_entry, leave=True))
-                del self.entry_by_mac[mac_entry.macaddr]
+        Called by the expiry scheduler at the deadline of a MAC entry
+
+        The entry leaves when it expired and none of its IP addresses is
+        being pinged.
+        """
+        if self.entry_by_mac.get(mac_entry.macaddr) is not mac_entry:
+            return None
+        if not mac_entry.expired():
+            self.expiry_scheduler.schedule('host_track_mac', mac_entry.lastTimeSeen + mac_entry.interval,
+                                           self._mac_timeout, mac_entry)
+            return None
+        if any(ip_entry.expired() for ip_entry in mac_entry.ipaddrs.values()):
+            self.expiry_scheduler.schedule('host_track_mac', time.time() + timeoutSec['timerInterval'],
+                                           self._mac_timeout, mac_entry)
+            return None
+
+        self.logger.info("Entry %s expired", str(mac_entry))
+        # sanity check: there should be no IP addresses left
+        if len(mac_entry.ipaddrs) > 0:
+            for ip_addr in mac_entry.ipaddrs.keys():
+                self.logger.warning("Entry %s expired but still had IP address %s",
+                                    str(mac_entry), str(ip_addr))
+                del mac_entry.ipaddrs[ip_addr]
+                self.host_index.remove_ip(mac_entry, ip_addr)
+        del self.mac_to_port[mac_entry.dpid][mac_entry.macaddr]
+        self.send_event_to_observers(EventHostState(self.mac_to_port, mac_entry, leave=True))
+        del self.entry_by_mac[mac_entry.macaddr]
+        self.host_index.remove_entry(mac_entry)
+        return 'mac_expired'
 
 
 class HostTrackRestController(ControllerBase):
@@ -467,3 +528,24 @@ class HostTrackRestController(ControllerBase):
         else:
             body = rest_body_none
         return Response(content_type='application/json', body=body)
+
+    @route('hosttrack', '/hosttrack/stats/expiry', methods=['GET'])
+    def get_expiry_stats(self, req, **kwargs):
+        body = json.dumps(self.host_track_instance.expiry_scheduler.stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('hosttrack', '/hosttrack/hostindex', methods=['GET'])
+    def get_host_index(self, req, **kwargs):
+        """every known ip with its location, streamed in chunks."""
+        host_index = self.host_track_instance.host_index
+        return Response(content_type='application/json', app_iter=host_index.iter_json())
+
+    @route('hosttrack', '/hosttrack/hostindex/{ip}', methods=['GET'])
+    def get_host_location(self, req, ip, **kwargs):
+        location = self.host_track_instance.host_index.get_location(ip)
+        if location is None:
+            body = rest_body_none
+        else:
+            mac, dpid, port = location
+            body = json.dumps({'ip': ip, 'mac': mac, 'dpid': dpid, 'port': port})
+        return Response(content_type='application/json', body=body)
@@ -0,0 +1,101 @@
+import json
+
+
+class HostIndex(object):
+    """
+        singleton index of host locations: {mac: MacEntry} and
+        {ip: MacEntry}, a mac entry may own several ips, an ip belongs to
+        the entry that announced it last.
+
+        HostTrack keeps the hosts it learns up to date (join, move, leave
+        and ip learning or expiry), RouteManage adds the static entries
+        of servers and gateways.  the entries are shared, a move updating
+        the dpid and port of an entry moves all its ips.
+    """
+
+    def __init__(self):
+        if not hasattr(self, 'by_mac'):
+            super(HostIndex, self).__init__()
+            self.by_mac = {}
+            self.by_ip = {}
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(HostIndex, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def add_entry(self, mac_entry):
+        """index mac_entry and the ips it already has, on join or move."""
+        former = self.by_mac.get(mac_entry.macaddr)
+        if former is not None and former is not mac_entry:
+            self.remove_entry(former)
+        self.by_mac[mac_entry.macaddr] = mac_entry
+        for ip in mac_entry.ipaddrs:
+            self.by_ip[ip] = mac_entry
+
+    def remove_entry(self, mac_entry):
+        """forget mac_entry and its ips, on leave."""
+        if self.by_mac.get(mac_entry.macaddr) is mac_entry:
+            del self.by_mac[mac_entry.macaddr]
+        for ip in mac_entry.ipaddrs:
+            self.remove_ip(mac_entry, ip)
+
+    def add_ip(self, mac_entry, ip):
+        self.by_ip[ip] = mac_entry
+        if mac_entry.macaddr not in self.by_mac:
+            self.by_mac[mac_entry.macaddr] = mac_entry
+
+    def remove_ip(self, mac_entry, ip):
+        """forget ip if it still belongs to mac_entry."""
+        if self.by_ip.get(ip) is mac_entry:
+            del self.by_ip[ip]
+
+    def get_by_ip(self, ip):
+        return self.by_ip.get(ip)
+
+    def get_by_mac(self, mac):
+        return self.by_mac.get(mac)
+
+    def get_mac(self, ip):
+        entry = self.by_ip.get(ip)
+        if entry is None:
+            return None
+        return entry.macaddr
+
+    def get_location(self, ip):
+        """(mac, dpid, port) of the host owning ip, None if unknown."""
+        entry = self.by_ip.get(ip)
+        if entry is None:
+            return None
+        return entry.macaddr, entry.dpid, entry.port
+
+    def locations(self):
+        """[(ip, dpid)] of every indexed ip."""
+        return [(ip, entry.dpid) for ip, entry in self.by_ip.items()]
+
+    def iter_json(self, chunk_size=1000):
+        """
+            json list of {ip, mac, dpid, port} in chunks of chunk_size
+            hosts, for streaming.  the ips are listed first, the ones
+            removed meanwhile are skipped.
+        """
+        ips = self.by_ip.keys()
+        yield '['
+        first = True
+        for start in range(0, len(ips), chunk_size):
+            hosts = []
+            for ip in ips[start:start + chunk_size]:
+                entry = self.by_ip.get(ip)
+                if entry is None:
+                    continue
+                hosts.append(json.dumps({'ip': ip, 'mac': entry.macaddr,
+                                         'dpid': entry.dpid, 'port': entry.port}))
+            if hosts:
+                yield (',' if not first else '') + ','.join(hosts)
+                first = False
+        yield ']'
+
+    def stats(self):
+        return {'macs': len(self.by_mac),
+                'ips': len(self.by_ip)}
@@ -0,0 +1,61 @@
+from ryu.ofproto import ofproto_v1_3
+
+from lib.project_lib import enum
+
+
+PortRoleEnum = enum(host_facing="host_facing", inter_switch="inter_switch",
+                    reserved="reserved")
+
+
+class PortRoleTable(dict):
+    """
+        (dpid, port_no) -> set of directed links ((src_dpid, src_port_no),
+        (dst_dpid, dst_port_no)) ending at that port.
+
+        a port keeps the inter_switch role as long as at least one
+        link still uses it; every port that is not in the table and
+        not reserved is host facing.
+    """
+
+    def __init__(self, ofp_max=ofproto_v1_3.OFPP_MAX):
+        super(PortRoleTable, self).__init__()
+        self.ofp_max = ofp_max
+
+    def get_role(self, dpid, port_no):
+        if port_no > self.ofp_max:
+            return PortRoleEnum.reserved
+        if (dpid, port_no) in self:
+            return PortRoleEnum.inter_switch
+        return PortRoleEnum.host_facing
+
+    def is_inter_switch(self, dpid, port_no):
+        return (dpid, port_no) in self
+
+    def add_link(self, link):
+        src = (link.src.dpid, link.src.port_no)
+        dst = (link.dst.dpid, link.dst.port_no)
+        self.setdefault(src, set()).add((src, dst))
+        self.setdefault(dst, set()).add((src, dst))
+
+    def del_link(self, link):
+        src = (link.src.dpid, link.src.port_no)
+        dst = (link.dst.dpid, link.dst.port_no)
+        self._discard(src, (src, dst))
+        self._discard(dst, (src, dst))
+
+    def del_port(self, dpid, port_no):
+        port = (dpid, port_no)
+        for src, dst in self.pop(port, ()):
+            self._discard(dst if src == port else src, (src, dst))
+
+    def del_switch(self, dpid):
+        for port in [p for p in self if p[0] == dpid]:
+            self.del_port(*port)
+
+    def _discard(self, port, link_key):
+        links = self.get(port)
+        if links is None:
+            return
+        links.discard(link_key)
+        if not links:
+            del self[port]
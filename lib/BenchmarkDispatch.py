@@ -0,0 +1,125 @@
+import logging
+import time
+
+from ryu.base import app_manager
+from ryu.controller import event
+from ryu.controller.handler import set_ev_cls
+from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER
+from ryu.lib import hub
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, EVENT_NUM events through a chain of APP_NUM apps, as many
+    as the apps of main.py: app i handles EventChain<i> in MAIN_DISPATCHER
+    and sends EventChain<i + 1> to its observers, app i + 1.  every app
+    also has OTHER_HANDLER_NUM handlers of the same event in other
+    states, and observers of other events.  compares the dispatch cache
+    of RyuApp with the former get_handlers/get_observers.
+"""
+APP_NUM = 10
+EVENT_NUM = 50000
+OTHER_HANDLER_NUM = 4
+
+EVENT_CLASSES = [type('EventChain%d' % num, (event.EventBase,), {})
+                 for num in range(APP_NUM + 1)]
+
+
+class FormerDispatch(object):
+    # RyuApp.get_handlers and get_observers before the dispatch cache
+
+    def get_handlers(self, ev, state=None):
+        ev_cls = ev.__class__
+        handlers = self.event_handlers.get(ev_cls, [])
+        if state is None:
+            return handlers
+
+        def test(h):
+            if not hasattr(h, 'callers') or ev_cls not in h.callers:
+                return True
+            states = h.callers[ev_cls].dispatchers
+            if not states:
+                return True
+            return state in states
+
+        return filter(test, handlers)
+
+    def get_observers(self, ev, state):
+        observers = []
+        for k, v in self.observers.get(ev.__class__, {}).items():
+            if not state or not v or state in v:
+                observers.append(k)
+
+        return observers
+
+
+def make_app_class(num, base):
+    ev_cls = EVENT_CLASSES[num]
+    next_cls = EVENT_CLASSES[num + 1]
+
+    def chain_handler(self, ev):
+        if num + 1 == APP_NUM:
+            self.received += 1
+            if self.received == EVENT_NUM:
+                self.done.set()
+            return
+        self.send_event_to_observers(next_cls(), MAIN_DISPATCHER)
+
+    def other_handler(self, ev):
+        pass
+
+    attrs = {'chain_handler': set_ev_cls(ev_cls, MAIN_DISPATCHER)(chain_handler)}
+    for other in range(OTHER_HANDLER_NUM):
+        attrs['other_handler%d' % other] = set_ev_cls(
+            ev_cls, CONFIG_DISPATCHER)(other_handler)
+    return type('ChainApp%d' % num, base, attrs)
+
+
+def build_chain(base):
+    apps = []
+    for num in range(APP_NUM):
+        app = make_app_class(num, base)()
+        app.name = 'ChainApp%d' % num
+        app.received = 0
+        app.done = hub.Event()
+        app_manager.register_instance(app)
+        apps.append(app)
+    for num, app in enumerate(apps):
+        if num + 1 < APP_NUM:
+            app.register_observer(EVENT_CLASSES[num + 1], apps[num + 1].name,
+                                  set([MAIN_DISPATCHER]))
+        for other in range(APP_NUM):
+            app.register_observer(EVENT_CLASSES[other], 'Observer%d' % other,
+                                  set([CONFIG_DISPATCHER]))
+    return apps
+
+
+def run(name, base):
+    apps = build_chain(base)
+    for app in apps:
+        app_manager.SERVICE_BRICKS[app.name] = app
+        app.start()
+
+    source = apps[0]
+    start = time.time()
+    for _ in range(EVENT_NUM):
+        source._send_event(EVENT_CLASSES[0](), MAIN_DISPATCHER)
+    apps[-1].done.wait()
+    used = time.time() - start
+
+    for app in apps:
+        app.stop()
+        del app_manager.SERVICE_BRICKS[app.name]
+    logger.info("%s: %d events through %d apps in %.3fs, %.0f events/sec",
+                name, EVENT_NUM, APP_NUM, used, EVENT_NUM * APP_NUM / used)
+    return used
+
+
+if __name__ == '__main__':
+    former = run("former dispatch", (FormerDispatch, app_manager.RyuApp))
+    current = run("dispatch cache", (app_manager.RyuApp,))
+    logger.info("speed up: %.2fx", former / current)
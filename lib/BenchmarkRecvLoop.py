@@ -0,0 +1,178 @@
+import logging
+import struct
+import time
+
+from eventlet.green import socket
+
+from ryu.base import app_manager
+from ryu.controller import controller
+from ryu.controller import ofp_event
+from ryu.lib import hub
+from ryu.ofproto import ofproto_common
+from ryu.ofproto import ofproto_parser
+from ryu.ofproto import ofproto_v1_3
+from ryu.lib.packet.packet_view import PacketView
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, a burst of MSG_NUM messages sent by a fake switch over a
+    local tcp connection: port stats replies of PORT_NUM ports and 128 byte
+    packet-ins, alternately.  compares the former recv(required_len) loop
+    with the preallocated recv_into buffer of Datapath._recv_loop.
+"""
+MSG_NUM = 100000
+PORT_NUM = 4
+SEND_CHUNK = 64 * 1024
+
+
+class FakeBrick(object):
+    """the ofp_event service brick, counting the events."""
+
+    def __init__(self):
+        self.events = 0
+        self.dispatch_version = 0
+
+    def send_event_to_observers(self, ev, state=None):
+        self.events += 1
+
+    def get_handlers(self, ev, state=None):
+        return []
+
+
+class CountingSocket(object):
+    """controller side of the socket pair, counting the reads."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reads = 0
+
+    def recv(self, bufsize):
+        self.reads += 1
+        return self.sock.recv(bufsize)
+
+    def recv_into(self, buf):
+        self.reads += 1
+        return self.sock.recv_into(buf)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def port_stats_reply(xid):
+    body = struct.pack(ofproto_v1_3.OFP_MULTIPART_REPLY_PACK_STR,
+                       ofproto_v1_3.OFPMP_PORT_STATS, 0)
+    for port_no in range(1, PORT_NUM + 1):
+        body += struct.pack(ofproto_v1_3.OFP_PORT_STATS_PACK_STR, port_no,
+                            *([xid] * 12 + [0, 0]))
+    return struct.pack(ofproto_common.OFP_HEADER_PACK_STR,
+                       ofproto_v1_3.OFP_VERSION, ofproto_v1_3.OFPT_MULTIPART_REPLY,
+                       ofproto_common.OFP_HEADER_SIZE + len(body), xid) + body
+
+
+def packet_in(xid):
+    # match of in_port=1, padded to 16 bytes
+    match = struct.pack('!HHIII', ofproto_v1_3.OFPMT_OXM, 12, 0x80000004, 1, 0)
+    data = '\xff' * 6 + '\x02\x00\x00\x00\x00\x01' + '\x08\x06' + '\x00' * 114
+    body = struct.pack('!IHBBQ', 0xffffffff, len(data), 0, 0, 0) + match + '\x00' * 2 + data
+    return struct.pack(ofproto_common.OFP_HEADER_PACK_STR,
+                       ofproto_v1_3.OFP_VERSION, ofproto_v1_3.OFPT_PACKET_IN,
+                       ofproto_common.OFP_HEADER_SIZE + len(body), xid) + body
+
+
+def build_burst(msg_num=MSG_NUM):
+    return ''.join(port_stats_reply(xid) if xid % 2 else packet_in(xid)
+                   for xid in range(msg_num))
+
+
+def former_recv_loop(self):
+    # Datapath._recv_loop before the preallocated buffer
+    buf = bytearray()
+    required_len = ofproto_common.OFP_HEADER_SIZE
+
+    count = 0
+    while self.is_active:
+        ret = self.socket.recv(required_len)
+        if len(ret) == 0:
+            self.is_active = False
+            self.socket.close()
+            break
+        buf += ret
+        while len(buf) >= required_len:
+            (version, msg_type, msg_len, xid) = ofproto_parser.header(buf)
+            required_len = msg_len
+            if len(buf) < required_len:
+                break
+
+            msg = ofproto_parser.msg(self,
+                                     version, msg_type, msg_len, xid, buf)
+            if msg:
+                ev = ofp_event.ofp_msg_to_ev(msg)
+                if msg_type == self.ofproto.OFPT_PACKET_IN:
+                    ev.packet_view = PacketView(msg.data)
+                self.ofp_brick.send_event_to_observers(ev, self.state)
+
+                dispatchers = lambda x: x.callers[ev.__class__].dispatchers
+                handlers = [handler for handler in
+                            self.ofp_brick.get_handlers(ev) if
+                            self.state in dispatchers(handler)]
+                for handler in handlers:
+                    handler(ev)
+
+            buf = buf[required_len:]
+            required_len = ofproto_common.OFP_HEADER_SIZE
+
+            count += 1
+            if count > 2048:
+                count = 0
+                hub.sleep(0)
+
+
+def socket_pair():
+    # tcp over loopback, the datapath sets TCP_NODELAY
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    switch_sock = socket.create_connection(server.getsockname())
+    controller_sock, _ = server.accept()
+    server.close()
+    return switch_sock, controller_sock
+
+
+def fake_switch(sock, burst):
+    for start in range(0, len(burst), SEND_CHUNK):
+        sock.sendall(burst[start:start + SEND_CHUNK])
+    sock.close()
+
+
+def run(name, recv_loop, burst):
+    brick = FakeBrick()
+    app_manager.SERVICE_BRICKS['ofp_event'] = brick
+    switch_sock, controller_sock = socket_pair()
+    sock = CountingSocket(controller_sock)
+    datapath = controller.Datapath(sock, ('127.0.0.1', 6633))
+    datapath.set_version(ofproto_v1_3.OFP_VERSION)
+    brick.events = 0
+
+    switch = hub.spawn(fake_switch, switch_sock, burst)
+    start = time.time()
+    recv_loop(datapath)
+    used = time.time() - start
+    hub.joinall([switch])
+    logger.info("%s: %d messages in %.3fs, %.0f msgs/sec, %d reads",
+                name, brick.events, used, brick.events / used, sock.reads)
+    assert brick.events == MSG_NUM
+    return used
+
+
+if __name__ == '__main__':
+    burst = build_burst()
+    logger.info("%d messages, %d bytes", MSG_NUM, len(burst))
+
+    former = run("recv(required_len)", former_recv_loop, burst)
+    current = run("recv_into buffer", controller.Datapath._recv_loop, burst)
+    logger.info("speed up: %.1fx", former / current)
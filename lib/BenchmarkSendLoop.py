@@ -0,0 +1,112 @@
+import logging
+import time
+
+from ryu.base import app_manager
+from ryu.controller import controller
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+from lib.BenchmarkRecvLoop import FakeBrick, socket_pair
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, ROUTE_NUM bidirectional 6 hop routes deployed to one
+    switch over a local tcp connection: 12 FlowMods and a barrier each.
+    compares one queued buffer and sendall() per message, as before the
+    coalescing send loop, with send_msg() and with send_msg(flush=False)
+    followed by flush().
+"""
+ROUTE_NUM = 5000
+HOP_NUM = 6
+
+
+class CountingSocket(object):
+    """controller side of the connection, counting the writes."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.writes = 0
+
+    def sendall(self, buf):
+        self.writes += 1
+        return self.sock.sendall(buf)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def flow_mod(datapath, num):
+    parser = ofproto_v1_3_parser
+    match = parser.OFPMatch(eth_type=0x0800, ipv4_src='10.0.0.1',
+                            ipv4_dst='10.0.%d.%d' % (num / 256 % 256, num % 256))
+    actions = [parser.OFPActionOutput(num % 4 + 1)]
+    inst = [parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, actions)]
+    return parser.OFPFlowMod(datapath=datapath, priority=10, match=match,
+                             idle_timeout=300, instructions=inst)
+
+
+def former_send_loop(self):
+    # Datapath._send_loop before coalescing
+    while self.is_active:
+        buf = self.send_q.get()
+        self.socket.sendall(buf)
+
+
+def fake_switch(sock, size, received):
+    while received[0] < size:
+        data = sock.recv(64 * 1024)
+        if not data:
+            break
+        received[0] += len(data)
+    sock.close()
+
+
+def run(name, send_loop, flush):
+    app_manager.SERVICE_BRICKS['ofp_event'] = FakeBrick()
+    switch_sock, controller_sock = socket_pair()
+    sock = CountingSocket(controller_sock)
+    datapath = controller.Datapath(sock, ('127.0.0.1', 6633))
+    datapath.set_version(ofproto_v1_3.OFP_VERSION)
+    datapath.id = 1
+
+    routes = [[flow_mod(datapath, num * 2 * HOP_NUM + hop) for hop in range(2 * HOP_NUM)]
+              for num in range(ROUTE_NUM)]
+    size = 0
+    for mods in routes:
+        for mod in mods:
+            mod.serialize()
+            size += len(mod.buf)
+    barrier = ofproto_v1_3_parser.OFPBarrierRequest(datapath)
+    barrier.serialize()
+    size += ROUTE_NUM * len(barrier.buf)
+
+    sender = hub.spawn(send_loop, datapath)
+    received = [0]
+    switch = hub.spawn(fake_switch, switch_sock, size, received)
+    start = time.time()
+    for mods in routes:
+        for mod in mods:
+            mod.xid = None
+            datapath.send_msg(mod, flush=flush)
+        datapath.send_msg(ofproto_v1_3_parser.OFPBarrierRequest(datapath))
+    hub.joinall([switch])
+    used = time.time() - start
+    hub.kill(sender)
+    logger.info("%s: %d messages, %d bytes in %.3fs, %.0f msgs/sec, %d writes",
+                name, ROUTE_NUM * (2 * HOP_NUM + 1), received[0], used,
+                ROUTE_NUM * (2 * HOP_NUM + 1) / used, sock.writes)
+    return used
+
+
+if __name__ == '__main__':
+    former = run("sendall per message", former_send_loop, True)
+    current = run("coalesced send_msg", controller.Datapath._send_loop, True)
+    flush_later = run("flush later", controller.Datapath._send_loop, False)
+    logger.info("speed up: %.1fx coalesced, %.1fx flush later",
+                former / current, former / flush_later)
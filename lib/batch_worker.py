@@ -0,0 +1,108 @@
+import logging
+import time
+
+from ryu.lib import hub
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BatchWorker(object):
+    """
+        a bounded hub.Queue drained by one long-lived green thread.
+
+        items are handed to handler(batch) in lists of at most max_batch
+        items; a batch is closed as soon as it is full or max_latency
+        seconds after its first item arrived.  put() never blocks, an
+        item offered to a full queue is dropped and counted.
+    """
+
+    def __init__(self, name, handler, maxsize, max_batch, max_latency):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.max_batch = max(1, max_batch)
+        self.max_latency = max_latency
+        self.queue = hub.Queue(maxsize)
+        self.thread = None
+
+        # counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self.max_depth = 0
+        # {batch size upper bound (power of 2): count}
+        self.batch_histogram = {}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = hub.spawn(self._loop)
+        return self.thread
+
+    def stop(self):
+        if self.thread is not None:
+            hub.kill(self.thread)
+            hub.joinall([self.thread])
+            self.thread = None
+
+    def put(self, item):
+        """add item to the queue, return False if it was dropped."""
+        if self.queue.full():
+            self.dropped += 1
+            return False
+        self.queue.put_nowait(item)
+        self.enqueued += 1
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _get_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.max_latency
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except hub.QueueEmpty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._get_batch()
+            self._record(len(batch))
+            try:
+                self.handler(batch)
+            except Exception:
+                logger.exception("[BatchWorker.%s]handler failed, %d items lost",
+                                 self.name, len(batch))
+
+    def _record(self, size):
+        self.batches += 1
+        self.processed += size
+        bucket = 1
+        while bucket < size:
+            bucket <<= 1
+        self.batch_histogram[bucket] = self.batch_histogram.get(bucket, 0) + 1
+
+    def stats(self):
+        return {'name': self.name,
+                'depth': self.queue.qsize(),
+                'max_depth': self.max_depth,
+                'maxsize': self.maxsize,
+                'max_batch': self.max_batch,
+                'max_latency': self.max_latency,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'batches': self.batches,
+                'batch_histogram': self.batch_histogram}
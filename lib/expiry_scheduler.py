@@ -0,0 +1,107 @@
+import heapq
+import logging
+import time
+
+from ryu.lib import hub
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ExpiryScheduler(object):
+    """
+        singleton min-heap of deadlines, run by one green thread.
+
+        every tick the due deadlines only are popped and their
+        callback(*args) called.  a callback returns the name of what it
+        did, e.g. 'expired' or 'pinged', counted per owner for the tick,
+        or None.  entries refreshed in the meantime are not rescheduled
+        on refresh: their callback finds them alive and schedules their
+        new deadline, so every entry has one deadline in the heap.
+    """
+
+    def __init__(self, tick=1):
+        if not hasattr(self, 'heap'):
+            super(ExpiryScheduler, self).__init__()
+            self.tick = tick
+            # [(deadline, seq, owner, callback, args)]
+            self.heap = []
+            self.seq = 0
+            self.thread = None
+
+            # counters
+            self.ticks = 0
+            self.called = 0
+            # {owner: {result: count}} of the last tick with results, and in total
+            self.last_tick = {}
+            self.total = {}
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(ExpiryScheduler, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def start(self):
+        if self.thread is None:
+            self.thread = hub.spawn(self._loop)
+        return self.thread
+
+    def stop(self):
+        if self.thread is not None:
+            hub.kill(self.thread)
+            hub.joinall([self.thread])
+            self.thread = None
+
+    def schedule(self, owner, deadline, callback, *args):
+        """call callback(*args) at the first tick after deadline."""
+        self.seq += 1
+        heapq.heappush(self.heap, (deadline, self.seq, owner, callback, args))
+
+    def _loop(self):
+        while True:
+            hub.sleep(self.tick)
+            try:
+                self.run_due(time.time())
+            except Exception:
+                logger.exception("[ExpiryScheduler]tick failed")
+
+    def run_due(self, now_time):
+        """call the callbacks due at now_time, return {owner: {result: count}}."""
+        # deadlines scheduled by the callbacks wait for the next tick
+        due = []
+        while self.heap and self.heap[0][0] <= now_time:
+            due.append(heapq.heappop(self.heap))
+
+        results = {}
+        for deadline, seq, owner, callback, args in due:
+            self.called += 1
+            try:
+                result = callback(*args)
+            except Exception:
+                logger.exception("[ExpiryScheduler]%s callback failed", owner)
+                result = 'failed'
+            if result is None:
+                continue
+            counts = results.setdefault(owner, {})
+            counts[result] = counts.get(result, 0) + 1
+
+        self.ticks += 1
+        if results:
+            self.last_tick = results
+            for owner, counts in results.items():
+                total = self.total.setdefault(owner, {})
+                for result, count in counts.items():
+                    total[result] = total.get(result, 0) + count
+            logger.debug("[ExpiryScheduler]tick:%s", results)
+        return results
+
+    def stats(self):
+        return {'tick': self.tick,
+                'scheduled': len(self.heap),
+                'ticks': self.ticks,
+                'called': self.called,
+                'last_tick': self.last_tick,
+                'total': self.total}
@@ -0,0 +1,28 @@
+class LatencyHistogram(object):
+    """
+        latency counters with power of 2 millisecond buckets:
+        {upper bound in ms: count}, the first bucket holds everything
+        up to 1ms.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = 1
+        while bucket < seconds * 1000:
+            bucket <<= 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def to_dict(self):
+        return {'count': self.count,
+                'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'max_ms': self.max * 1000,
+                'buckets_ms': self.buckets}
@@ -0,0 +1,159 @@
+import logging
+import random
+import time
+
+import numpy as np
+
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+from lib.project_lib import Bytes
+from link_monitor import link_monitor_main
+from link_monitor.link_history import LinkHistory
+from topology_manage.object.link import Link, LinkTableApi
+from base.parameters import LINK_HISTORY_MEMORY, LINK_HISTORY_POINTS
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, PORT_NUM monitored ports polled every second until their
+    ring buffers are full, with a noisy used band around 50 Mbits/s.
+    measures record(), the estimators and history(), compared with
+    building the history from a full ordered copy of the ring buffer.
+    first checks that the host ports and OFPP_LOCAL of OFPP_ANY replies
+    parsed by the link monitor do not take slots.
+"""
+PORT_NUM = 800
+QUERY_NUM = 2000
+MEAN_BAND = 50 * 1000 * 1000
+
+
+class FakePortStats(object):
+    def __init__(self, tx_bytes, rx_bytes):
+        self.tx_bytes = tx_bytes
+        self.rx_bytes = rx_bytes
+        self.tx_dropped = 0
+        self.rx_dropped = 0
+        self.tx_errors = 0
+        self.rx_errors = 0
+
+
+class FakeDatapath(object):
+    def __init__(self, dpid):
+        self.id = dpid
+
+
+class FakeReply(object):
+    def __init__(self, datapath, body):
+        self.datapath = datapath
+        self.body = body
+        self.msg_len = 0
+
+
+class FakeEvent(object):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def port_stats(port_no, tx_bytes):
+    return ofproto_v1_3_parser.OFPPortStats(
+        port_no=port_no, rx_packets=0, tx_packets=0, rx_bytes=0, tx_bytes=tx_bytes,
+        rx_dropped=0, tx_dropped=0, rx_errors=0, tx_errors=0, rx_frame_err=0,
+        rx_over_err=0, rx_crc_err=0, collisions=0, duration_sec=0, duration_nsec=0)
+
+
+def check_link_ports_only(history):
+    # switch 1 port 1 is the only link port, 2 and 3 face hosts
+    link_table = LinkTableApi()
+    link_table[(1, 2)] = {(1, 1): Link(None, None, total_band=MEAN_BAND * 2,
+                                       available_band=MEAN_BAND * 2)}
+    link_monitor_main.global_link_table = link_table
+    link_monitor_main.global_port_index = {(1, 1): [((1, 2), (1, 1))]}
+    monitor = link_monitor_main.LinkMonitor()
+    datapath = FakeDatapath(1)
+    slots = len(history.slots)
+    for num in range(1, 4):
+        body = [port_stats(port_no, num * MEAN_BAND / Bytes)
+                for port_no in (1, 2, 3, ofproto_v1_3.OFPP_LOCAL)]
+        monitor.parse_port_stats_reply(FakeEvent(FakeReply(datapath, body)))
+    assert len(history.slots) == slots + 1 and (1, 1) in history.slots
+    assert history.stats()['recorded'] == 2
+    history.remove(1, 1)
+    link_monitor_main.global_link_table = LinkTableApi()
+    link_monitor_main.global_port_index = {}
+    logger.info("OFPP_ANY replies of 4 ports: 1 link port recorded")
+
+
+def full_copy_history(history, dpid, port_no, points):
+    # order the whole ring buffer, then downsample it
+    slot = history.slots[(dpid, port_no)]
+    rows = np.roll(history.samples[slot], -history.head[slot])[-history.count[slot]:]
+    rows = rows[::max(1, len(rows) // points)]
+    elapsed = np.diff(rows['time'])
+    sent = np.diff(rows['tx_bytes'].astype(np.int64) + rows['rx_bytes'].astype(np.int64))
+    dropped = np.diff(rows['tx_dropped'].astype(np.int64) + rows['rx_dropped'].astype(np.int64))
+    errors = np.diff(rows['tx_errors'].astype(np.int64) + rows['rx_errors'].astype(np.int64))
+    return {'time': rows['time'][1:].tolist(),
+            'band': (sent * Bytes / elapsed).tolist(),
+            'dropped': dropped.tolist(),
+            'errors': errors.tolist()}
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    history = LinkHistory()
+    check_link_ports_only(history)
+    keys = [(dpid, port_no) for dpid in range(1, PORT_NUM // 40 + 1) for port_no in range(1, 41)]
+    sent = dict((key, 0) for key in keys)
+
+    recorded = history.recorded
+    start = time.time()
+    now_time = start
+    for _ in range(history.capacity):
+        now_time += 1
+        for dpid, port_no in keys:
+            band = max(0.0, random.gauss(MEAN_BAND, MEAN_BAND / 2))
+            sent[(dpid, port_no)] += int(band / Bytes)
+            stats = FakePortStats(sent[(dpid, port_no)], 0)
+            history.record(dpid, port_no, stats, band, now_time)
+    used = time.time() - start
+    stats = history.stats()
+    logger.info("%d ports, %d samples per port, %.1f MB of %.1f MB budget",
+                stats['ports'], stats['samples_per_port'],
+                stats['memory'] / 1048576.0, LINK_HISTORY_MEMORY / 1048576.0)
+    logger.info("record: %.0f samples/sec", (stats['recorded'] - recorded) / used)
+
+    last = [history.last(*key) for key in keys]
+    ewma = [history.ewma(*key) for key in keys]
+    p90 = [history.percentile(*key) for key in keys]
+    logger.info("band error to the %d Mbits/s mean: last %.1f%%, ewma %.1f%%, p90 %+.1f%%",
+                MEAN_BAND / 1000000,
+                100.0 * np.mean(np.abs(np.array(last) - MEAN_BAND)) / MEAN_BAND,
+                100.0 * np.mean(np.abs(np.array(ewma) - MEAN_BAND)) / MEAN_BAND,
+                100.0 * (np.mean(p90) - MEAN_BAND) / MEAN_BAND)
+
+    # the same step of the used band polled every second and every 250 ms
+    step = []
+    for dpid, interval in ((0, 1.0), (-1, 0.25)):
+        history.record(dpid, 1, FakePortStats(0, 0), 0, now_time)
+        for num in range(1, int(10 / interval) + 1):
+            history.record(dpid, 1, FakePortStats(0, 0), MEAN_BAND, now_time + num * interval)
+        step.append(history.ewma(dpid, 1))
+    logger.info("ewma 10s after a step, polled every 1s: %.1f%%, every 250ms: %.1f%%",
+                100.0 * step[0] / MEAN_BAND, 100.0 * step[1] / MEAN_BAND)
+    assert abs(step[0] - step[1]) < 1e-6 * MEAN_BAND
+
+    start = time.time()
+    for num in range(QUERY_NUM):
+        full_copy_history(history, *keys[num % len(keys)], points=LINK_HISTORY_POINTS)
+    former = time.time() - start
+    start = time.time()
+    for num in range(QUERY_NUM):
+        history.history(*keys[num % len(keys)], points=LINK_HISTORY_POINTS)
+    current = time.time() - start
+    logger.info("history of %d points: full copy %.0f queries/sec, history() %.0f queries/sec",
+                LINK_HISTORY_POINTS, QUERY_NUM / former, QUERY_NUM / current)
@@ -0,0 +1,125 @@
+import logging
+import random
+import time
+
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+from link_monitor.monitor_scheduler import PollingScheduler, OFP_PORT_STATS_REQUEST
+from link_monitor.monitor_scheduler import PORT_STATS_REPLY_HEADER_SIZE, PORT_STATS_SIZE
+from link_monitor.link_monitor_main import POLL_INTERVAL
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, SWITCH_NUM switches of PORT_NUM ports, LINK_PORT_NUM of
+    them monitored, polled during SIMULATED_TIME seconds.  HOT_RATIO of
+    the links change utilization by up to 30% between polls, the others
+    stay idle.  the former scheduler sent one request per monitored port
+    every POLL_INTERVAL.
+"""
+SWITCH_NUM = 20
+PORT_NUM = 48
+LINK_PORT_NUM = 40
+HOT_RATIO = 0.1
+SIMULATED_TIME = 600
+TICK = 0.25
+
+
+class FakeDatapath(object):
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self, dpid):
+        self.id = dpid
+        self.is_active = True
+        self.sent = []
+
+    def set_xid(self, msg):
+        msg.set_xid(0)
+
+    def send_msg(self, msg):
+        self.set_xid(msg)
+        msg.serialize()
+        self.sent.append(len(msg.buf))
+
+
+class FakePortStats(object):
+    def __init__(self, port_no):
+        self.port_no = port_no
+
+
+class FakeReply(object):
+    def __init__(self, datapath, port_nos):
+        self.datapath = datapath
+        self.body = [FakePortStats(port_no) for port_no in port_nos]
+        self.msg_len = PORT_STATS_REPLY_HEADER_SIZE + PORT_STATS_SIZE * len(port_nos)
+
+
+def utilization_of(key, hot, utilization):
+    if key in hot:
+        return min(1.0, max(0.0, utilization.get(key, 0.5) + random.uniform(-0.3, 0.3)))
+    return utilization.get(key, random.uniform(0, 0.05))
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    datapaths = [FakeDatapath(dpid) for dpid in range(1, SWITCH_NUM + 1)]
+    ports = [(dp.id, port_no, dp) for dp in datapaths for port_no in range(1, LINK_PORT_NUM + 1)]
+    keys = [(dpid, port_no) for dpid, port_no, dp in ports]
+    hot = set(random.sample(keys, int(len(keys) * HOT_RATIO)))
+
+    scheduler = PollingScheduler(POLL_INTERVAL, [])
+    scheduler.set_need_monitor_ports(ports)
+    scheduler.stats_request_type = [OFP_PORT_STATS_REQUEST]
+    # simulated time, from the first polls scheduled on set_need_monitor_ports
+    start = now_time = time.time()
+
+    utilization = {}
+    samples = {}
+    most_replies = 0
+    while now_time < start + SIMULATED_TIME:
+        now_time += TICK
+        requested = scheduler.poll(now_time, TICK)
+        most_replies = max(most_replies, len(requested))
+        for dpid, port_no in requested:
+            dp = datapaths[dpid - 1]
+            if port_no == ofproto_v1_3.OFPP_ANY:
+                port_nos = range(1, PORT_NUM + 1)
+            else:
+                port_nos = [port_no]
+            scheduler.port_stats_reply(FakeReply(dp, port_nos))
+            for port_no in port_nos:
+                key = (dpid, port_no)
+                if port_no > LINK_PORT_NUM:
+                    continue
+                utilization[key] = utilization_of(key, hot, utilization)
+                samples[key] = samples.get(key, 0) + 1
+                scheduler.record_usage(dpid, port_no, utilization[key], now_time)
+
+    scheduler.start_time = time.time() - SIMULATED_TIME
+    stats = scheduler.stats()
+    former_requests = len(keys) * SIMULATED_TIME / POLL_INTERVAL
+    logger.info("%d switches, %d monitored ports, %d hot, %ds simulated",
+                SWITCH_NUM, len(keys), len(hot), SIMULATED_TIME)
+    logger.info("request size %d bytes", datapaths[0].sent[0])
+    logger.info("former:    %.1f requests/sec, %.0f bytes",
+                former_requests / SIMULATED_TIME, stats['former_bytes'])
+    logger.info("scheduler: %.1f requests/sec, %.1f of them OFPP_ANY, %d bytes, "
+                "%d bytes saved (%.0f%%)",
+                stats['requests'] / float(SIMULATED_TIME),
+                stats['datapath_requests'] / float(SIMULATED_TIME),
+                stats['bytes_sent'] + stats['bytes_received'], stats['bytes_saved'],
+                100.0 * stats['bytes_saved'] / stats['former_bytes'])
+    logger.info("samples per port and second: hot %.2f, idle %.2f, former %.2f",
+                sum(samples[key] for key in hot) / float(len(hot) * SIMULATED_TIME),
+                sum(samples[key] for key in keys if key not in hot) /
+                float((len(keys) - len(hot)) * SIMULATED_TIME),
+                1.0 / POLL_INTERVAL)
+    logger.info("most replies in one %.2fs tick: %d, former %d",
+                TICK, most_replies, len(keys))
+    logger.info("interval histogram: %s", stats['interval_histogram'])
@@ -0,0 +1,216 @@
+import logging
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lib.project_lib import Bytes
+from base.parameters import LINK_HISTORY_MEMORY, LINK_HISTORY_PORTS, LINK_HISTORY_EWMA_TAU
+from base.parameters import LINK_BAND_ESTIMATOR, LINK_BAND_PERCENTILE, LINK_BAND_PERCENTILE_WINDOW
+from base.parameters import LINK_HISTORY_POINTS
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# one port stats sample, band is the used band computed by the link monitor
+SAMPLE_FIELDS = [('time', 'f8'),
+                 ('tx_bytes', 'u8'), ('rx_bytes', 'u8'),
+                 ('tx_dropped', 'u8'), ('rx_dropped', 'u8'),
+                 ('tx_errors', 'u8'), ('rx_errors', 'u8'),
+                 ('band', 'f8')]
+
+ESTIMATOR_LAST = 'last'
+ESTIMATOR_EWMA = 'ewma'
+ESTIMATOR_PERCENTILE = 'percentile'
+
+
+class LinkHistory(object):
+    """
+        singleton store of the port stats samples of the monitored ports.
+
+        the samples are kept in one preallocated numpy array of
+        max_ports ring buffers, as many samples per port as fit in
+        memory bytes.  a port gets a ring buffer on its first sample and
+        keeps it until it is removed; when every buffer is taken, the
+        port updated least recently gives its buffer to the new one.
+        the ewma of the used band is updated on every sample, weighted by
+        the time since the former sample of the port with the time
+        constant tau, so it does not depend on the polling interval.
+
+        history() reads only the samples of the downsampled points from
+        the ring buffer, the band between two points is computed from
+        the byte counters, so it is the mean over the whole bucket.
+        without numpy nothing is recorded and every query returns None.
+    """
+
+    def __init__(self, memory=LINK_HISTORY_MEMORY, max_ports=LINK_HISTORY_PORTS,
+                 tau=LINK_HISTORY_EWMA_TAU):
+        if not hasattr(self, 'slots'):
+            super(LinkHistory, self).__init__()
+            self.tau = tau
+            # {(dpid, port_no): slot}, free slots
+            self.slots = {}
+            self.free_slots = []
+            self.samples = None
+            self.capacity = 0
+            if np is None:
+                logger.warning("[LinkHistory]numpy is not installed, no link history is kept")
+            else:
+                dtype = np.dtype(SAMPLE_FIELDS)
+                self.capacity = max(2, memory // (max_ports * dtype.itemsize))
+                self.samples = np.zeros((max_ports, self.capacity), dtype=dtype)
+                # next write position and number of samples of every slot
+                self.head = np.zeros(max_ports, dtype=np.int64)
+                self.count = np.zeros(max_ports, dtype=np.int64)
+                self.ewma_band = np.zeros(max_ports)
+                self.free_slots = range(max_ports - 1, -1, -1)
+
+            # counters
+            self.recorded = 0
+            self.evicted = 0
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(LinkHistory, cls)
+            cls._instance = orig.__new__(cls)
+        return cls._instance
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            # the port updated least recently gives its buffer
+            oldest = min(self.slots.items(),
+                         key=lambda item: self.samples[item[1], self.head[item[1]] - 1]['time'])
+            del self.slots[oldest[0]]
+            slot = oldest[1]
+            self.evicted += 1
+        self.head[slot] = 0
+        self.count[slot] = 0
+        self.slots[key] = slot
+        return slot
+
+    def record(self, dpid, port_no, stats, band, now_time=None):
+        """append the port stats sample of a port and its used band."""
+        if self.samples is None:
+            return
+        if now_time is None:
+            now_time = time.time()
+        slot = self._slot((dpid, port_no))
+        head = self.head[slot]
+        if self.count[slot]:
+            elapsed = max(0.0, now_time - self.samples[slot, head - 1]['time'])
+            weight = 1 - math.exp(-elapsed / self.tau)
+            self.ewma_band[slot] += weight * (band - self.ewma_band[slot])
+        else:
+            self.ewma_band[slot] = band
+        self.samples[slot, head] = (now_time,
+                                    stats.tx_bytes, stats.rx_bytes,
+                                    stats.tx_dropped, stats.rx_dropped,
+                                    stats.tx_errors, stats.rx_errors,
+                                    band)
+        self.head[slot] = (head + 1) % self.capacity
+        self.count[slot] = min(self.count[slot] + 1, self.capacity)
+        self.recorded += 1
+
+    def remove(self, dpid, port_no):
+        slot = self.slots.pop((dpid, port_no), None)
+        if slot is not None:
+            self.free_slots.append(slot)
+
+    def retain(self, keys):
+        """free the buffers of the ports not in keys [(dpid, port_no)]."""
+        keys = set(keys)
+        for key in self.slots.keys():
+            if key not in keys:
+                self.remove(*key)
+
+    def _positions(self, slot, start, stop):
+        # buffer positions of the samples start to stop, oldest is 0
+        oldest = self.head[slot] - self.count[slot]
+        return (oldest + start + np.arange(stop - start)) % self.capacity
+
+    def last(self, dpid, port_no):
+        slot = self.slots.get((dpid, port_no))
+        if slot is None:
+            return None
+        return float(self.samples[slot, self.head[slot] - 1]['band'])
+
+    def ewma(self, dpid, port_no):
+        slot = self.slots.get((dpid, port_no))
+        if slot is None:
+            return None
+        return float(self.ewma_band[slot])
+
+    def percentile(self, dpid, port_no, q=LINK_BAND_PERCENTILE,
+                   window=LINK_BAND_PERCENTILE_WINDOW):
+        """q-th percentile of the used band of the last window samples."""
+        slot = self.slots.get((dpid, port_no))
+        if slot is None:
+            return None
+        count = self.count[slot]
+        positions = self._positions(slot, max(0, count - window), count)
+        return float(np.percentile(self.samples[slot, positions]['band'], q))
+
+    def band(self, dpid, port_no, estimator=LINK_BAND_ESTIMATOR):
+        """used band of a port by estimator, None before its first sample."""
+        if estimator == ESTIMATOR_EWMA:
+            return self.ewma(dpid, port_no)
+        elif estimator == ESTIMATOR_PERCENTILE:
+            return self.percentile(dpid, port_no)
+        return self.last(dpid, port_no)
+
+    def history(self, dpid, port_no, since=None, points=LINK_HISTORY_POINTS):
+        """
+            the samples of a port after since, downsampled to at most points
+            buckets: their end time, mean band, drops and errors.
+        """
+        slot = self.slots.get((dpid, port_no))
+        if slot is None:
+            return None
+        count = self.count[slot]
+        start = 0
+        if since is not None:
+            # the ring holds the samples oldest first in two runs
+            oldest = (self.head[slot] - count) % self.capacity
+            first = self.samples[slot, oldest:oldest + count]['time']
+            second = self.samples[slot, :count - len(first)]['time']
+            start = np.searchsorted(first, since, side='right')
+            if start == len(first):
+                start += np.searchsorted(second, since, side='right')
+            # the sample before since gives the counters at the bucket start
+            start = max(0, start - 1)
+        num = count - start
+        if num < 2:
+            return {'time': [], 'band': [], 'dropped': [], 'errors': []}
+
+        buckets = min(points, num - 1)
+        selected = np.arange(buckets + 1) * (num - 1) // buckets
+        rows = self.samples[slot, (self.head[slot] - count + start + selected) % self.capacity]
+        elapsed = np.diff(rows['time'])
+        sent = np.diff(rows['tx_bytes'].astype(np.int64) + rows['rx_bytes'].astype(np.int64))
+        dropped = np.diff(rows['tx_dropped'].astype(np.int64) + rows['rx_dropped'].astype(np.int64))
+        errors = np.diff(rows['tx_errors'].astype(np.int64) + rows['rx_errors'].astype(np.int64))
+        # counters go back to 0 when a switch restarts
+        band = np.where(elapsed > 0, np.maximum(sent, 0) * Bytes / np.maximum(elapsed, 1e-9), 0)
+        return {'time': rows['time'][1:].tolist(),
+                'band': band.tolist(),
+                'dropped': np.maximum(dropped, 0).tolist(),
+                'errors': np.maximum(errors, 0).tolist()}
+
+    def stats(self):
+        memory = self.samples.nbytes if self.samples is not None else 0
+        return {'ports': len(self.slots),
+                'free_ports': len(self.free_slots),
+                'samples_per_port': self.capacity,
+                'memory': memory,
+                'recorded': self.recorded,
+                'evicted': self.evicted}
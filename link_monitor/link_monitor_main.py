@@ -16,8 +16,12 @@ from monitor_scheduler import PollingScheduler
 from stats_parser import StateParser
 from switch_port_selector import SwitchPortSelector
 from topology_manage.object.link import Link, LinkTable, LinkTableApi
+from topology_manage.object import topo_event
+from link_state import LinkStateEpoch, LinkStateLog
+from link_history import LinkHistory
 from web_service import ws_event
 from lib.project_lib import Bytes
+from base.parameters import LINK_POLL_INTERVAL, LINK_STATE_BAND_CHANGE
 
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
@@ -37,9 +41,11 @@ SPECIAL_DST_MAC = 'ee:ee:ee:ee:ee:ee'
 SPECIAL_COOKIE = 123654
 SPECIAL_DPID_PORT_NO = '00_00'
 MIN_DELAY = 0.000100
-POLL_INTERVAL = 2 # seconds, should be larger than 1 second
+POLL_INTERVAL = LINK_POLL_INTERVAL # seconds, should be larger than 1 second
 
 global_link_table = LinkTableApi()
+# {(dpid, port_no): [(link_key, port_key)]} of global_link_table
+global_port_index = {}
 global_number = False
 
 
@@ -59,6 +65,10 @@ class LinkMonitor(app_manager.RyuApp):
         self.controller_to_switch_send_time = {}
         self.poll_interval = POLL_INTERVAL
         self.stats_parser = StateParser()
+        self.polling_scheduler = PollingScheduler(self.poll_interval, [])
+        self.link_history = LinkHistory()
+        # {(link_key, port_key): available band last logged to LinkStateLog}
+        self.logged_band = {}
         hub.spawn_after(60,self.change_number)
         # hub.spawn_after(8, self.test_handle_topo_initialize_end)
         pass
@@ -80,20 +90,38 @@ class LinkMonitor(app_manager.RyuApp):
     def topo_initialize_end_handler(self, ev):
         # print 'receive topo initialize end event!!!!!!!! link_table is: ', ev.link_table
 
-        global global_link_table
+        global global_link_table, global_port_index
         link_table = ev.link_table
         global_link_table = link_table
+        self.logged_band = {}
         self.link_table = link_table
         self.stats_request_type = self.select_request_type()
 
         self.switch_port_selctor = SwitchPortSelector(link_table)
         self.need_monitor_ports = self.switch_port_selctor.select_need_monitor_ports()
+        global_port_index = self.switch_port_selctor.get_port_index()
 
+        # one poller, started by the first topology initialization
         self.monitor_scheduler_obj = PollingScheduler(self.poll_interval, self.need_monitor_ports)
+        self.monitor_scheduler_obj.set_need_monitor_ports(self.need_monitor_ports)
+        self.link_history.retain((dpid, port_no) for dpid, port_no, _ in self.need_monitor_ports)
         self.monitor_scheduler_obj.start_monitor_band(self.stats_request_type)
         hub.spawn_after(30,self.change_number)
         pass
 
+    @set_ev_cls(topo_event.EventLinkDelUpdateTopo)
+    def link_delete_handler(self, ev):
+        """drop the deleted link from the link table and port index."""
+        global global_link_table, global_port_index
+        global_link_table = ev.links
+        self.logged_band = dict((key, band) for key, band in self.logged_band.items()
+                                if key[1] in ev.links.get(key[0], {}))
+        selector = SwitchPortSelector(ev.links)
+        need_monitor_ports = selector.select_need_monitor_ports()
+        self.polling_scheduler.set_need_monitor_ports(need_monitor_ports)
+        self.link_history.retain((dpid, port_no) for dpid, port_no, _ in need_monitor_ports)
+        global_port_index = selector.get_port_index()
+
     def change_number(self):
         global global_number
         global_number = True
@@ -209,18 +237,16 @@ class LinkMonitor(app_manager.RyuApp):
         pass
 
     def parse_port_stats_reply(self, ev):
-        global global_number
         current_time = time.time()
-#         print 'current_time', current_time
-        global global_link_table
         body = ev.msg.body
         dpid = ev.msg.datapath.id
+        self.polling_scheduler.port_stats_reply(ev.msg)
+        changed = False
 
         for stats in sorted(body, key=attrgetter('port_no')):
-            port = stats.port_no
-            contain_keys = self.port_state[dpid].keys()
-            if dpid not in self.port_state or ((dpid in self.port_state) and (port not in contain_keys)):
-                self.port_state[dpid][port] = {
+            port_no = stats.port_no
+            if port_no not in self.port_state[dpid]:
+                self.port_state[dpid][port_no] = {
                     'rx_packets': 0, 'tx_packets': 0,
                     'rx_bytes': 0, 'tx_bytes': 0,
                     'rx_dropped': 0, 'tx_dropped': 0,
@@ -230,9 +256,6 @@ class LinkMonitor(app_manager.RyuApp):
                     'duration_sec': 0, 'duration_nsec': 0,
                     'time': 0}
 
-        for stats in sorted(body, key=attrgetter('port_no')):
-            port_no = stats.port_no
-
             error_packet = (stats.tx_errors + stats.rx_errors) - (
                 self.port_state[dpid][port_no]['tx_errors'] + self.port_state[dpid][port_no]['rx_errors'])
             totle_packet = (stats.tx_packets + stats.rx_packets) - (
@@ -246,9 +269,7 @@ class LinkMonitor(app_manager.RyuApp):
 
             receive_bytes = (stats.tx_bytes + stats.rx_bytes) - (
                 self.port_state[dpid][port_no]['tx_bytes'] + self.port_state[dpid][port_no]['rx_bytes'])
-#             print 'current_time', current_time
             last_time = self.port_state[dpid][port_no]['time']
-#             print 'last_time', last_time
             time_interval = current_time - last_time
             if receive_bytes != 0 and time_interval != 0:
                 used_band = receive_bytes / time_interval * Bytes
@@ -257,33 +278,42 @@ class LinkMonitor(app_manager.RyuApp):
                 pass
             self.link_state[dpid][port_no]['Speed'] = used_band
 
-            global global_number
-            for dpid_index in global_link_table.iterkeys():
-                if dpid in dpid_index:
-                    select_dpid_index = dpid_index
-                    for port_no_index in global_link_table[select_dpid_index]:
-                        if port_no in port_no_index:
-                            if global_number:
-                                if int(dpid)==int(128983237624):
-#                                     print 'receive_bytes:', receive_bytes, 'time_interval', time_interval, ', used_band:', used_band
-#                                     print 'dpid: ', dpid,', port_no: ', port_no, ', stats.tx_bytes: ', stats.tx_bytes, ', stats.rx_bytes', stats.rx_bytes
-#                                     print 'dpid: ', dpid, ', tx_bytes in store data: ', self.port_state[dpid][port_no]['tx_bytes'], ', rx_bytes in store data: ', self.port_state[dpid][port_no]['rx_bytes']
-                                    pass
-                            select_port_index = port_no_index
-                            # TODO: set link info before link monitor start
-                            total_band = global_link_table[select_dpid_index][select_port_index].total_band
-                            # total_band = 1024000
-                            available_band = total_band - used_band
-                            global_link_table[select_dpid_index][select_port_index].available_band = available_band
-#                             print 'available_band', available_band, ' select_dpid_index ', select_dpid_index
-                            
-                            # send ws update band event
-                            (current_dpid,next_dpid) = select_dpid_index
-                            (current_port_no,next_port_no) = select_port_index
-                            link_band = [current_dpid, current_port_no, next_dpid, next_port_no, available_band]
-                            self.send_event_to_observers(ws_event.EventWebLinkBandChange(link_band))
-
-            self.port_state[dpid][port] = {
+            # OFPP_ANY replies carry host ports and OFPP_LOCAL too, only
+            # the ports of links take a slot of the link history
+            port_links = global_port_index.get((dpid, port_no), ())
+            if port_links:
+                if last_time:
+                    self.link_history.record(dpid, port_no, stats, used_band, current_time)
+                smoothed_band = self.link_history.band(dpid, port_no)
+                if smoothed_band is None:
+                    smoothed_band = used_band
+
+            utilization = None
+            for link_key, port_key in port_links:
+                try:
+                    link = global_link_table[link_key][port_key]
+                except KeyError:
+                    continue
+                if utilization is None and link.total_band:
+                    utilization = min(1.0, float(used_band) / link.total_band)
+                    self.polling_scheduler.record_usage(dpid, port_no, utilization, current_time)
+                # TODO: set link info before link monitor start
+                available_band = link.total_band - smoothed_band
+                link.available_band = available_band
+                logged_band = self.logged_band.get((link_key, port_key))
+                if logged_band is None or \
+                        abs(available_band - logged_band) >= LINK_STATE_BAND_CHANGE * link.total_band:
+                    self.logged_band[(link_key, port_key)] = available_band
+                    LinkStateLog().mark(link_key)
+                    changed = True
+
+                # send ws update band event
+                (current_dpid, next_dpid) = link_key
+                (current_port_no, next_port_no) = port_key
+                link_band = [current_dpid, current_port_no, next_dpid, next_port_no, available_band]
+                self.send_event_to_observers(ws_event.EventWebLinkBandChange(link_band))
+
+            self.port_state[dpid][port_no] = {
                 'rx_packets': stats.rx_packets,
                 'tx_packets': stats.tx_packets,
                 'rx_bytes': stats.rx_bytes,
@@ -299,6 +329,10 @@ class LinkMonitor(app_manager.RyuApp):
                 'duration_sec': stats.duration_sec,
                 'duration_nsec': stats.duration_nsec,
                 'time': current_time}
+
+        # the bands of this reply are applied, routes computed from now on see them
+        if changed:
+            LinkStateEpoch().bump('link_monitor', topology=False)
         return self.port_state, self.link_state
 
 
@@ -0,0 +1,88 @@
+import logging
+import time
+
+from collections import deque
+from itertools import islice
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+
+class LinkStateEpoch(object):
+    """
+        singleton version number of the link state.
+
+        bumped by the link monitor when a port stats reply changed the
+        band of a link, and on every topology change; anything computed
+        from the link state is valid as long as the epoch it was computed
+        at is still current.  topology is bumped on topology changes only,
+        for what depends on the links but not on their band.
+    """
+
+    def __init__(self):
+        if not hasattr(self, 'value'):
+            super(LinkStateEpoch, self).__init__()
+            self.value = 0
+            self.topology = 0
+            self.timestamp = time.time()
+            # {reason: bump times}
+            self.bumps = {}
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(LinkStateEpoch, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def bump(self, reason, topology=True):
+        self.value += 1
+        if topology:
+            self.topology += 1
+        self.timestamp = time.time()
+        self.bumps[reason] = self.bumps.get(reason, 0) + 1
+        logger.debug("link state epoch %s, reason: %s", self.value, reason)
+        return self.value
+
+    def to_dict(self):
+        return {'epoch': self.value,
+                'topology': self.topology,
+                'timestamp': self.timestamp,
+                'bumps': self.bumps}
+
+
+class LinkStateLog(object):
+    """
+        singleton log of the link keys (src_dpid, dst_dpid) whose state
+        was changed by the link monitor.
+
+        a consumer keeps the sequence number returned by changed_since()
+        and passes it back next time to get the keys changed meanwhile.
+        only the last maxlen changes are kept; a consumer left further
+        behind gets None and has to reload every link.
+    """
+
+    def __init__(self, maxlen=4096):
+        if not hasattr(self, 'seq'):
+            super(LinkStateLog, self).__init__()
+            self.seq = 0
+            self.entries = deque(maxlen=maxlen)
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(LinkStateLog, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def mark(self, link_key):
+        self.seq += 1
+        self.entries.append(link_key)
+
+    def changed_since(self, seq):
+        """return (set of link keys changed after seq or None, current seq)."""
+        if seq is None:
+            return None, self.seq
+        num = self.seq - seq
+        if num > len(self.entries) or num < 0:
+            return None, self.seq
+        return set(islice(reversed(self.entries), num)), self.seq
@@ -1,59 +1,265 @@
+import logging
+import random
+import time
+
 from ryu.lib import hub
 
+from base.parameters import LINK_POLL_INTERVAL, LINK_POLL_INTERVAL_MIN, LINK_POLL_INTERVAL_MAX
+from base.parameters import LINK_POLL_HOT_CHANGE, LINK_POLL_IDLE_CHANGE, LINK_POLL_TICK
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
 OFP_FLOW_STATS_REQUEST = 1
 OFP_PORT_STATS_REQUEST = 2
 OFP_QUEUE_STATS_REQUEST = 3
 OFP_GROUP_STATS_REQUEST = 4
 OFP_METER_STATS_REQUEST = 5
 
+# OpenFlow 1.3 message sizes: port stats request, and per port of a reply
+PORT_STATS_REQUEST_SIZE = 24
+PORT_STATS_REPLY_HEADER_SIZE = 16
+PORT_STATS_SIZE = 112
+
+
 class MonitorScheduler(object):
 
     def __init__(self, need_monitor_ports):
         self.need_monitor_ports = need_monitor_ports
         pass
-    
+
     def set_need_monitor_ports(self, need_monitor_ports):
         self.need_monitor_ports = need_monitor_ports
         pass
-    
-    
+
+
     def send_request(self, stats_request_type, need_monitor_ports):
         # print ('send request!')
         if OFP_PORT_STATS_REQUEST in stats_request_type:
+            # one request of every port per datapath
+            datapaths = {}
             for each_port in need_monitor_ports:
-                datapath = each_port[2]
-                port_no = each_port[1]
-                self.start_request_port(datapath, port_no)
-                pass
-            pass
-        
+                datapaths[each_port[0]] = each_port[2]
+            for datapath in datapaths.values():
+                self.start_request_datapath(datapath)
+
         pass
-        
+
     def start_request_port(self, datapath, port_no):
         parser = datapath.ofproto_parser
         port_request = parser.OFPPortStatsRequest(datapath, 0, port_no)
         datapath.send_msg(port_request)
         pass
+
+    def start_request_datapath(self, datapath):
+        self.start_request_port(datapath, datapath.ofproto.OFPP_ANY)
     pass
 
-    
+
 class PollingScheduler(MonitorScheduler):
-    def __init__(self,poll_interval, need_monitor_ports):
-        super(PollingScheduler, self).__init__(need_monitor_ports)
-#         MonitorScheduler.__init__(need_monitor_ports)
-        self.poll_interval = poll_interval
-        pass
-        
+    """
+        singleton poller of the port stats of the monitored ports.
+
+        every monitored port has its own interval within
+        [LINK_POLL_INTERVAL_MIN, LINK_POLL_INTERVAL_MAX], halved when the
+        utilization of its link changed by LINK_POLL_HOT_CHANGE or more
+        since the last poll and doubled when it changed by
+        LINK_POLL_IDLE_CHANGE or less.  the due ports of a switch are
+        polled with one OFPP_ANY request, whose reply updates all its
+        ports, unless requesting only the due ports is fewer bytes, as
+        for a few hot ports on a switch of idle ones.  the first poll of
+        a switch is delayed randomly within poll_interval so that the
+        replies of the switches are spread.
+
+        the saved control channel bytes are counted against the former
+        scheme, one request and one reply per monitored port every
+        poll_interval.
+    """
+
+    def __init__(self, poll_interval=LINK_POLL_INTERVAL, need_monitor_ports=()):
+        if not hasattr(self, 'poll_interval'):
+            super(PollingScheduler, self).__init__([])
+            self.poll_interval = poll_interval
+            self.interval_min = LINK_POLL_INTERVAL_MIN
+            self.interval_max = LINK_POLL_INTERVAL_MAX
+            self.tick = LINK_POLL_TICK
+            self.stats_request_type = []
+            # {dpid: datapath}, {dpid: set(port_no)} of the monitored ports
+            self.datapaths = {}
+            self.ports = {}
+            # {dpid: number of ports in the last OFPP_ANY reply}
+            self.port_count = {}
+            # {(dpid, port_no): next poll time}
+            self.next_poll = {}
+            # {(dpid, port_no): interval}, {(dpid, port_no): utilization}
+            self.intervals = {}
+            self.utilization = {}
+            self.thread = None
+
+            # counters
+            self.start_time = None
+            self.requests = 0
+            self.datapath_requests = 0
+            self.replies = 0
+            self.samples = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.former_bytes = 0.0
+            self.hot = 0
+            self.idle = 0
+            self.set_need_monitor_ports(need_monitor_ports)
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(PollingScheduler, cls)
+            cls._instance = orig.__new__(cls)
+        return cls._instance
+
+    def set_need_monitor_ports(self, need_monitor_ports):
+        """monitor the ports [(dpid, port_no, datapath)], keeping their state."""
+        self.need_monitor_ports = need_monitor_ports
+        datapaths = {}
+        ports = {}
+        for dpid, port_no, datapath in need_monitor_ports:
+            datapaths[dpid] = datapath
+            ports.setdefault(dpid, set()).add(port_no)
+
+        now_time = time.time()
+        for dpid, port_nos in ports.items():
+            first_poll = now_time + random.uniform(0, self.poll_interval)
+            for port_no in port_nos:
+                if (dpid, port_no) not in self.next_poll:
+                    self.next_poll[(dpid, port_no)] = first_poll
+        for key in self.next_poll.keys():
+            if key[1] not in ports.get(key[0], ()):
+                del self.next_poll[key]
+                self.intervals.pop(key, None)
+                self.utilization.pop(key, None)
+        for dpid in self.port_count.keys():
+            if dpid not in ports:
+                del self.port_count[dpid]
+        self.datapaths = datapaths
+        self.ports = ports
+
     def start_monitor_band(self, stats_request_type):
         # print ('start monitor!')
-        hub.spawn(self.start_poll_monitor(stats_request_type))
-        pass
-    
-    
+        self.stats_request_type = stats_request_type
+        if self.thread is None:
+            self.start_time = time.time()
+            self.thread = hub.spawn(self.start_poll_monitor, stats_request_type)
+        return self.thread
+
+    def stop(self):
+        if self.thread is not None:
+            hub.kill(self.thread)
+            hub.joinall([self.thread])
+            self.thread = None
+
     def start_poll_monitor(self, stats_request_type):
+        last_time = time.time()
         while True:
-            self.send_request(stats_request_type, self.need_monitor_ports)
-            hub.sleep(self.poll_interval)
-        pass
-        
-    
+            hub.sleep(self.tick)
+            now_time = time.time()
+            try:
+                self.poll(now_time, now_time - last_time)
+            except Exception:
+                logger.exception("[PollingScheduler]poll failed")
+            last_time = now_time
+
+    def poll(self, now_time, elapsed=0):
+        """send the requests due at now_time, return the requested [(dpid, port_no)]."""
+        if OFP_PORT_STATS_REQUEST not in self.stats_request_type:
+            return []
+        port_bytes = PORT_STATS_REQUEST_SIZE + PORT_STATS_REPLY_HEADER_SIZE + PORT_STATS_SIZE
+        self.former_bytes += len(self.next_poll) * elapsed / self.poll_interval * port_bytes
+
+        due = {}
+        for key, next_time in self.next_poll.items():
+            if next_time <= now_time:
+                due.setdefault(key[0], []).append(key[1])
+        if not due:
+            return []
+
+        requested = []
+        for dpid, port_nos in due.items():
+            datapath = self.datapaths[dpid]
+            # the reply to OFPP_ANY carries every port of the switch
+            datapath_bytes = (PORT_STATS_REQUEST_SIZE + PORT_STATS_REPLY_HEADER_SIZE +
+                              PORT_STATS_SIZE * self.port_count.get(dpid, 0))
+            whole = datapath_bytes <= port_bytes * len(port_nos)
+            polled = self.ports[dpid] if whole else port_nos
+            for port_no in polled:
+                key = (dpid, port_no)
+                self.next_poll[key] = now_time + self.intervals.get(key, self.poll_interval)
+            if not datapath.is_active:
+                continue
+            if whole:
+                self.start_request_datapath(datapath)
+                requested.append((dpid, datapath.ofproto.OFPP_ANY))
+                self.datapath_requests += 1
+                continue
+            for port_no in port_nos:
+                self.start_request_port(datapath, port_no)
+                requested.append((dpid, port_no))
+        self.requests += len(requested)
+        self.bytes_sent += PORT_STATS_REQUEST_SIZE * len(requested)
+        return requested
+
+    def port_stats_reply(self, msg):
+        """count a port stats reply."""
+        dpid = msg.datapath.id
+        ports = self.ports.get(dpid, ())
+        self.replies += 1
+        self.samples += len([stats for stats in msg.body if stats.port_no in ports])
+        self.bytes_received += msg.msg_len
+        if len(msg.body) > 1:
+            self.port_count[dpid] = len(msg.body)
+
+    def record_usage(self, dpid, port_no, utilization, now_time=None):
+        """adapt the interval of a monitored port to its link utilization, in [0, 1]."""
+        key = (dpid, port_no)
+        if key not in self.next_poll:
+            return
+        last = self.utilization.get(key)
+        self.utilization[key] = utilization
+        if last is None:
+            return
+
+        interval = self.intervals.get(key, self.poll_interval)
+        change = abs(utilization - last)
+        if change >= LINK_POLL_HOT_CHANGE:
+            interval = max(self.interval_min, interval / 2.0)
+            self.hot += 1
+        elif change <= LINK_POLL_IDLE_CHANGE:
+            interval = min(self.interval_max, interval * 2.0)
+            self.idle += 1
+        self.intervals[key] = interval
+
+        if now_time is None:
+            now_time = time.time()
+        if now_time + interval < self.next_poll[key]:
+            self.next_poll[key] = now_time + interval
+
+    def stats(self):
+        elapsed = time.time() - self.start_time if self.start_time is not None else 0
+        histogram = {}
+        for key in self.next_poll:
+            interval = self.intervals.get(key, self.poll_interval)
+            histogram[float(interval)] = histogram.get(float(interval), 0) + 1
+        bytes_used = self.bytes_sent + self.bytes_received
+        return {'datapaths': len(self.ports),
+                'ports': len(self.next_poll),
+                'interval_histogram': histogram,
+                'requests': self.requests,
+                'datapath_requests': self.datapath_requests,
+                'replies': self.replies,
+                'requests_per_sec': self.requests / elapsed if elapsed else 0,
+                'samples_per_sec': self.samples / elapsed if elapsed else 0,
+                'hot': self.hot,
+                'idle': self.idle,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'former_bytes': int(self.former_bytes),
+                'bytes_saved': int(self.former_bytes) - bytes_used}
@@ -6,10 +6,13 @@ class SwitchPortSelector(object):
     def __init__(self, link_table):
         self.link_table = link_table
         self.need_monitor_ports = []
+        # {(dpid, port_no): [(link_key, port_key)]}
+        self.port_index = {}
         pass
     
     def select_need_monitor_ports(self):
         # print ('select need monitor ports!')
+        self.port_index = self.build_port_index()
         for src_dpid,dst_dpid in self.link_table.iterkeys():
             links = self.link_table[(src_dpid,dst_dpid)]
             for link in links.values():
@@ -28,12 +31,31 @@ class SwitchPortSelector(object):
             pass
         return self.need_monitor_ports
     
+    def build_port_index(self):
+        """
+            index every link end of the link table by (dpid, port_no).
+            a port stats reply of (dpid, port_no) updates the links
+            link_table[link_key][port_key] listed in the index.
+        """
+        port_index = {}
+        for link_key, links in self.link_table.iteritems():
+            src_dpid, dst_dpid = link_key
+            for port_key in links.iterkeys():
+                src_port_no, dst_port_no = port_key
+                port_index.setdefault((src_dpid, src_port_no), []).append((link_key, port_key))
+                port_index.setdefault((dst_dpid, dst_port_no), []).append((link_key, port_key))
+        return port_index
+
     def set_link_table(self, link_table):
         self.link_table = link_table
+        self.port_index = self.build_port_index()
         pass
         
     def get_need_monitor_ports(self):
         return self.need_monitor_ports
+
+    def get_port_index(self):
+        return self.port_index
     
     def update_need_monitor_ports(self, update_type, src_port, dst_port):
         src_port_dpid = src_port.dpid
@@ -28,6 +28,7 @@ from ryu.lib import addrconv
 from ryu.lib import hub
 from ryu.lib.dpid import dpid_to_str
 from ryu.lib.packet import (packet, ethernet, ipv4, igmp)
+from ryu.lib.packet.packet_view import get_packet_view
 from lib.project_lib import find_packet
 from topology_manage.object.switch import SwitchTable
 
@@ -92,10 +93,10 @@ class IgmpLib(app_manager.RyuApp):
         proceed it. otherwise, ignore event."""
         msg = ev.msg
 
-        req_pkt = packet.Packet(msg.data)
-        req_igmp = req_pkt.get_protocol(igmp.igmp)
+        view = get_packet_view(ev)
+        req_igmp = view.get_protocol(igmp.igmp)
         if req_igmp:
-            self._querier.packet_in_handler(req_pkt, req_igmp, msg)
+            self._querier.packet_in_handler(view.pkt, req_igmp, msg)
 
     def start_igmp_querier(self):
         self._querier.start_loop()
@@ -336,7 +337,7 @@ class IgmpVirtualQuerier(IgmpBase):
         elif (igmp.IGMP_TYPE_REPORT_V1 == req_igmp.msgtype or
               igmp.IGMP_TYPE_REPORT_V2 == req_igmp.msgtype):
             self.logger.debug(log + "[REPORT]")
-            self._do_report(req_igmp, in_port, msg)
+            self._do_report(req_igmp, in_port, msg, req_pkt)
         elif igmp.IGMP_TYPE_LEAVE == req_igmp.msgtype:
             self.logger.debug(log + "[LEAVE]")
             self._do_leave(req_igmp, in_port, msg)
@@ -426,7 +427,7 @@ class IgmpVirtualQuerier(IgmpBase):
         """
         pass
 
-    def _do_report(self, report, in_port, msg):
+    def _do_report(self, report, in_port, msg, req_pkt):
         """
             the process when one querier received a REPORT message.
         """
@@ -463,8 +464,7 @@ class IgmpVirtualQuerier(IgmpBase):
                 {'replied': True, 'leave': False, 'member': 1,
                  'out': False, 'in': False})
 
-            pkt = packet.Packet(msg.data)
-            ip_layer = find_packet(pkt, 'ipv4')
+            ip_layer = find_packet(req_pkt, 'ipv4')
             self._send_event(EventMulticastGroupChanged(
                 MG_MEMBER_CHANGED, report.address, ip_layer.src, self._groups))
 
@@ -0,0 +1,160 @@
+import logging
+import random
+import time
+
+from route_manage.route_algorithm.RouteAlgorithm import Dijkstra
+from topology_manage.object.link import Link, LinkTableApi
+from link_monitor.link_state import LinkStateEpoch, LinkStateLog
+from base.parameters import BusinessType
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, fat trees of k = 6, 12, 20, 40, 64:
+    45, 180, 500, 2000, 5120 switches.
+"""
+FAT_TREE_K = [6, 12, 20, 40, 64]
+REQUEST_NUM = 20
+# the former O(V^2 * E) search is only timed on small topologies
+LEGACY_MAX_SWITCH = 500
+# links changed by one link monitor round in the incremental update
+CHANGED_LINK_NUM = 10
+
+
+class FakeSwitch(object):
+    def __init__(self):
+        self.neighbors = {}
+
+
+def build_fat_tree(k):
+    """
+        return (switches, links) in the format of TopologyManage:
+        switches = {dpid: switch}, links = LinkTableApi.
+        dpid: core 1xxxxx, aggregation 2xxxxx, edge 3xxxxx.
+    """
+    half = k / 2
+    switches = {}
+    links = LinkTableApi()
+
+    def connect(src_dpid, dst_dpid, port_no):
+        for dpid in (src_dpid, dst_dpid):
+            if dpid not in switches:
+                switches[dpid] = FakeSwitch()
+        switches[src_dpid].neighbors[dst_dpid] = [port_no]
+        switches[dst_dpid].neighbors[src_dpid] = [port_no]
+        total_band = random.choice([10, 20, 100]) * 1000000.0
+        link = Link(None, None, pkt_loss=0, total_band=total_band,
+                    available_band=total_band * random.random(),
+                    delay=random.choice([0.001, 0.01, 0.02]),
+                    cost=random.choice([2.0, 20.0, 1000.0]))
+        links[(src_dpid, dst_dpid)] = {(port_no, port_no): link}
+
+    for pod in range(k):
+        for a in range(half):
+            agg = 200001 + pod * half + a
+            for e in range(half):
+                connect(300001 + pod * half + e, agg, 1 + a)
+            for c in range(half):
+                connect(agg, 100001 + a * half + c, half + 1 + c)
+
+    return switches, links
+
+
+def legacy_calculate(algorithm, sou_vertex, vertexs, edges):
+    """the former array scan Dijkstra.calculate."""
+    def weight(vertex1, vertex2):
+        for e in edges:
+            if (vertex1, vertex2) == (e[1], e[2]) or (vertex2, vertex1) == (e[1], e[2]):
+                return (algorithm.delay_coefficient * e[3] +
+                        algorithm.cost_coefficient * e[4] +
+                        algorithm.bw_load_coefficient * (1-e[5]/e[6]))
+        return 2 * (algorithm.delay_coefficient * 1 +
+                    algorithm.cost_coefficient * 100 +
+                    algorithm.bw_load_coefficient * 1)
+
+    tag = [0 for i in range(vertexs.__len__())]
+    previous_vertex = [-1 for i in range(vertexs.__len__())]
+    paths_length = [10000 for i in range(vertexs.__len__())]
+    paths = []
+
+    vertex_selected = sou_vertex
+    tag[sou_vertex] = 1
+    paths_length[sou_vertex] = 0
+
+    for i in range(vertexs.__len__() - 1):
+        for j in range(vertexs.__len__()):
+            if tag[j] == 0:
+                min_length = paths_length[j]
+                record = j
+                break
+        for j in vertexs[vertex_selected][1]:
+            if tag[j] == 0:
+                temp = weight(vertex_selected, j)
+                if paths_length[vertex_selected] + temp < paths_length[j]:
+                    paths_length[j] = paths_length[vertex_selected] + temp
+                    previous_vertex[j] = vertex_selected
+        for j in range(vertexs.__len__()):
+            if tag[j] == 0:
+                if paths_length[j] < min_length:
+                    min_length = paths_length[j]
+                    record = j
+        vertex_selected = record
+        tag[vertex_selected] = 1
+    return paths_length
+
+
+def path_weight(algorithm, path):
+    return sum(algorithm.use_available_bandwidth_mark_weight(path[i], path[i+1], algorithm.edges)
+               for i in range(len(path)-1))
+
+
+if __name__ == '__main__':
+    algorithm = Dijkstra()
+    for k in FAT_TREE_K:
+        switches, links = build_fat_tree(k)
+        edge_switches = [dpid for dpid in switches if dpid >= 300000]
+
+        start = time.time()
+        algorithm.init_algorithm(switches, links)
+        algorithm.update_link_status(links)
+        update_used = time.time() - start
+
+        requests = [random.sample(edge_switches, 2) for _ in range(REQUEST_NUM)]
+        start = time.time()
+        for src, dst in requests:
+            # time the search itself, not the shortest path tree cache
+            algorithm.spt_cache.invalidate()
+            algorithm.run(src, dst, BusinessType["FTP"])
+            algorithm.get_link(src, dst)
+        used = (time.time() - start) / REQUEST_NUM
+        logger.info("switches:%s links:%s update_link_status:%.1fms heap dijkstra:%.2fms/request",
+                    len(switches), len(links), update_used * 1000, used * 1000)
+
+        # one link monitor round changing a few links
+        for dpids in random.sample(links.keys(), CHANGED_LINK_NUM):
+            link = links[dpids].values()[0]
+            link.available_band = link.total_band * random.random()
+            LinkStateLog().mark(dpids)
+        LinkStateEpoch().bump('link_monitor', topology=False)
+        start = time.time()
+        algorithm.update_link_status(links)
+        logger.info("switches:%s incremental update_link_status of %d links:%.2fms",
+                    len(switches), CHANGED_LINK_NUM, (time.time() - start) * 1000)
+
+        if len(switches) > LEGACY_MAX_SWITCH:
+            continue
+
+        start = time.time()
+        for src, dst in requests[:5]:
+            src_num = algorithm.switch_queue.index(src)
+            lengths = legacy_calculate(algorithm, src_num, algorithm.vertexs, algorithm.edges)
+            algorithm.run(src, dst, BusinessType["FTP"])
+            dst_num = algorithm.switch_queue.index(dst)
+            assert abs(lengths[dst_num] - path_weight(algorithm, algorithm.links[dst_num])) < 1e-6
+        legacy_used = (time.time() - start) / 5
+        logger.info("switches:%s legacy dijkstra:%.2fms/request",
+                    len(switches), legacy_used * 1000)
@@ -0,0 +1,79 @@
+import logging
+import random
+import time
+
+from route_manage.route_algorithm.RouteAlgorithm import GAPopulation
+from route_manage.BenchmarkDijkstra import build_fat_tree
+from base.parameters import BusinessType
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, fat trees of k = 4, 8, 12: 20, 80, 180 switches.
+    the population is the DFS initialization of GAPopulation (paths up
+    to max_hop) between two random edge switches, about 20, 600 and
+    3600 paths with max_hop = 7.
+"""
+FAT_TREE_K = [4, 8, 12]
+MAX_HOP = 7
+REQUEST_NUM = 5
+EVALUATE_NUM = 20
+# select/cross of evolve are quadratic in the population size, the
+# whole evolve is only timed on small topologies
+EVOLVE_MAX_SWITCH = 80
+
+
+def bench(func, num=EVALUATE_NUM):
+    start = time.time()
+    for _ in range(num):
+        func()
+    return (time.time() - start) / num
+
+
+if __name__ == '__main__':
+    algorithm = GAPopulation()
+    algorithm.max_hop = MAX_HOP
+    min_bandwidth = BusinessType["FTP"]
+
+    for k in FAT_TREE_K:
+        switches, links = build_fat_tree(k)
+        edge_switches = [dpid for dpid in switches if dpid >= 300000]
+        algorithm.init_algorithm(switches, links)
+        algorithm.update_link_status(links)
+
+        loop_used = vector_used = 0.0
+        population = 0
+        for src, dst in [random.sample(edge_switches, 2) for _ in range(REQUEST_NUM)]:
+            paths = algorithm.init(algorithm.switch_index[src],
+                                   algorithm.switch_index[dst], MAX_HOP)
+            population += len(paths)
+
+            loop = algorithm.fitness_evaluate(paths, min_bandwidth, algorithm.vertexs, algorithm.edges)
+            vector = algorithm.fitness_evaluate_vector(paths, min_bandwidth)
+            assert all(abs(a - b) < 1e-9 * max(1.0, abs(a)) for a, b in zip(loop, vector))
+
+            loop_used += bench(lambda: algorithm.fitness_evaluate(
+                paths, min_bandwidth, algorithm.vertexs, algorithm.edges))
+            vector_used += bench(lambda: algorithm.fitness_evaluate_vector(paths, min_bandwidth))
+
+        logger.info("switches:%s population:%d loop:%.2fms vector:%.2fms speed up:%.1fx",
+                    len(switches), population / REQUEST_NUM,
+                    loop_used / REQUEST_NUM * 1000, vector_used / REQUEST_NUM * 1000,
+                    loop_used / vector_used)
+
+        if len(switches) > EVOLVE_MAX_SWITCH:
+            continue
+
+        for mode in ("loop", "vector"):
+            algorithm.fitness_mode = mode
+            random.seed(k)
+            start = time.time()
+            for src, dst in [random.sample(edge_switches, 2) for _ in range(REQUEST_NUM)]:
+                algorithm.age = 0
+                algorithm.run(src, dst, min_bandwidth)
+            logger.info("switches:%s evolve with %s fitness:%.2fms/request",
+                        len(switches), mode, (time.time() - start) / REQUEST_NUM * 1000)
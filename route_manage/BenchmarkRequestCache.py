@@ -0,0 +1,108 @@
+import logging
+import random
+import resource
+import time
+
+from route_manage.request_cache import RequestCache
+from link_monitor.link_state import LinkStateEpoch
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, PACKET_IN_NUM packet-ins of pairs among HOST_NUM hosts,
+    PACKET_IN_RATE per second of simulated time, half of them from a few
+    hot pairs.  compares the former unbounded dict of request timestamps
+    (one time.time() per packet-in) with RequestCache ticked once per
+    simulated second.  the link monitor changes the band of a link every
+    simulated second, a topology change happens every TOPOLOGY_PERIOD:
+    repeated requests of a pair still deploy its cached path.
+"""
+HOST_NUM = 5000
+HOT_PAIR_NUM = 100
+PACKET_IN_NUM = 2000000
+PACKET_IN_RATE = 2000
+REQUEST_TIMEOUT = 50
+CAPACITY = 100000
+TTL = 300
+TOPOLOGY_PERIOD = 200
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build_requests():
+    hosts = ['10.%d.%d.%d' % (i / 65536, i / 256 % 256, i % 256) for i in range(HOST_NUM)]
+    hot_pairs = [tuple(random.sample(hosts, 2)) for _ in range(HOT_PAIR_NUM)]
+    requests = []
+    for _ in range(PACKET_IN_NUM):
+        if random.random() < 0.5:
+            requests.append(random.choice(hot_pairs))
+        else:
+            requests.append((random.choice(hosts), random.choice(hosts)))
+    return requests
+
+
+def run_dict(requests):
+    request_cache = {}
+    new = 0
+    for key in requests:
+        if key in request_cache:
+            if time.time() - request_cache[key][0] < REQUEST_TIMEOUT:
+                continue
+            else:
+                request_cache[key][0] = time.time()
+        else:
+            request_cache[key] = [time.time(), 0]
+        new += 1
+    return new, len(request_cache)
+
+
+def run_cache(requests):
+    cache = RequestCache(CAPACITY, TTL, REQUEST_TIMEOUT)
+    epoch = LinkStateEpoch()
+    now_time = 0.0
+    new = 0
+    for num, key in enumerate(requests):
+        if num % PACKET_IN_RATE == 0:
+            # expiry thread tick, link monitor reply and topology changes
+            now_time += 1
+            cache.now = now_time
+            cache._expire(now_time)
+            epoch.bump('link_monitor', topology=False)
+            if now_time % TOPOLOGY_PERIOD == 0:
+                epoch.bump('link_delete')
+        accepted, link_list, link_cost = cache.request(key, epoch.topology)
+        if accepted:
+            new += 1
+            if link_list is None:
+                cache.put_path(key, [1, 2, 3], 0, epoch.topology)
+    return new, len(cache.entries), cache
+
+
+if __name__ == '__main__':
+    requests = build_requests()
+    logger.info("%d packet-ins, %d hosts, %d simulated seconds",
+                PACKET_IN_NUM, HOST_NUM, PACKET_IN_NUM / PACKET_IN_RATE)
+
+    rss = max_rss()
+    start = time.time()
+    new, size = run_dict(requests)
+    used = time.time() - start
+    logger.info("dict:         %.0f packet-ins/sec, %d requests, %d entries, "
+                "%.0f MB max rss growth", PACKET_IN_NUM / used, new, size,
+                float(max_rss() - rss) / 2 ** 20)
+
+    rss = max_rss()
+    start = time.time()
+    new, size, cache = run_cache(requests)
+    used = time.time() - start
+    logger.info("RequestCache: %.0f packet-ins/sec, %d requests, %d entries, "
+                "%.0f MB max rss growth", PACKET_IN_NUM / used, new, size,
+                float(max_rss() - rss) / 2 ** 20)
+    logger.info("RequestCache:%s", cache.stats())
+    assert cache.path_hits > 0
@@ -0,0 +1,83 @@
+import logging
+import random
+import resource
+import time
+
+from route_manage.route_algorithm.RouteAlgorithm import Dijkstra
+from route_manage.route_info_maintainer import RouteInfoMaintainer
+from route_manage.BenchmarkDijkstra import build_fat_tree
+from route_manage.BenchmarkSinkTree import build_hosts
+from fault_recovery.fault_recovery_main import FaultRecoveryMain
+from base.parameters import BusinessType
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, FLOW_NUM routes between random hosts of a fat tree k = 24
+    (720 switches, 3456 hosts) registered in RouteInfoMaintainer, then
+    the routes over random failed links are looked up in the link index
+    and by scanning every path (former 'old' store method).
+"""
+FAT_TREE_K = 24
+FLOW_NUM = 1000000
+FAILED_LINK_NUM = 20
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+if __name__ == '__main__':
+    switches, links = build_fat_tree(FAT_TREE_K)
+    hosts = build_hosts(FAT_TREE_K)
+    algorithm = Dijkstra()
+    algorithm.init_algorithm(switches, links)
+    algorithm.update_link_status(links)
+
+    paths = {}
+    flows = []
+    for _ in range(FLOW_NUM):
+        src, dst = random.sample(hosts, 2)
+        if (src[1], dst[1]) not in paths:
+            if src[1] == dst[1]:
+                paths[(src[1], dst[1])] = [src[1]]
+            else:
+                algorithm.run(src[1], dst[1], BusinessType["HTML"])
+                paths[(src[1], dst[1])] = algorithm.get_link(src[1], dst[1])[0]
+        flows.append((src, dst, paths[(src[1], dst[1])]))
+
+    maintainer = RouteInfoMaintainer()
+    rss = max_rss()
+    start = time.time()
+    for src, dst, path in flows:
+        maintainer.register(src[1], src[0], src[2], dst[1], dst[0], dst[2], path)
+    used = time.time() - start
+    flow_num = len(maintainer.flows)
+    logger.info("registered %d flows (%d distinct pairs) in %.1fs, %.0f flows/sec, "
+                "%.0f bytes/flow max rss growth",
+                FLOW_NUM, flow_num, used, FLOW_NUM / used,
+                float(max_rss() - rss) / flow_num)
+
+    maintainer.link_path_old = [path for src, dst, path in flows]
+    link_keys = random.sample(links.keys(), FAILED_LINK_NUM)
+
+    start = time.time()
+    affected = [FaultRecoveryMain._find_affected_route_requests(key, key[::-1]) or []
+                for key in link_keys]
+    index_used = time.time() - start
+
+    start = time.time()
+    for key in link_keys:
+        FaultRecoveryMain._find_affected_route_requests_old(key, key[::-1])
+    scan_used = time.time() - start
+
+    affected_num = sum(len(a) for a in affected)
+    logger.info("%d failed links, %d affected flows: link index %.2fms/link "
+                "(%.1fus/affected flow), path scan %.0fms/link",
+                FAILED_LINK_NUM, affected_num, index_used * 1000 / FAILED_LINK_NUM,
+                index_used * 1000000 / max(affected_num, 1), scan_used * 1000 / FAILED_LINK_NUM)
+    logger.info("registry:%s", maintainer.stats())
@@ -0,0 +1,63 @@
+import logging
+import random
+import time
+
+from route_manage.route_algorithm.RouteAlgorithm import GAPopulation, Dijkstra
+from route_manage.route_pool import RoutePool
+from route_manage.BenchmarkDijkstra import build_fat_tree
+from base.parameters import BusinessType, ROUTE_POOL_WORKERS, ROUTE_POOL_TIMEOUT
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    test data, a burst of REQUEST_NUM requests between random edge
+    switches of a fat tree k = 8 (80 switches), as after a gateway
+    fails over.  the burst is calculated serially and in the pool.
+"""
+FAT_TREE_K = 8
+REQUEST_NUM = 64
+
+
+if __name__ == '__main__':
+    switches, links = build_fat_tree(FAT_TREE_K)
+    edge_switches = [dpid for dpid in switches if dpid >= 300000]
+    requests = [tuple(random.sample(edge_switches, 2)) + (BusinessType["HTML"],)
+                for _ in range(REQUEST_NUM)]
+
+    pool = RoutePool(ROUTE_POOL_WORKERS, REQUEST_NUM, ROUTE_POOL_TIMEOUT)
+    pool.start()
+
+    for algorithm in (Dijkstra(), GAPopulation()):
+        name = algorithm.__class__.__name__
+        algorithm.init_algorithm(switches, links)
+        algorithm.update_link_status(links)
+
+        start = time.time()
+        serial = []
+        for src, dst, business_type in requests:
+            algorithm.update_link_status(links)
+            algorithm.run(src, dst, business_type)
+            serial.append(algorithm.get_link(src, dst))
+        serial_used = time.time() - start
+
+        # the first round builds the snapshot and the algorithm in workers
+        pool.calculate(algorithm, switches, links, requests)
+        start = time.time()
+        parallel = pool.calculate(algorithm, switches, links, requests)
+        parallel_used = time.time() - start
+
+        assert all(link_list is not None for link_list, link_cost in parallel)
+        if name == 'Dijkstra':
+            assert [link_list for link_list, link_cost in parallel] == \
+                   [link_list for link_list, link_cost in serial]
+
+        logger.info("%s: %d requests, serial:%.1fms, pool of %d workers:%.1fms, speed up:%.1fx",
+                    name, REQUEST_NUM, serial_used * 1000, pool.workers,
+                    parallel_used * 1000, serial_used / parallel_used)
+
+    logger.info("pool stats:%s", pool.stats())
+    pool.stop()
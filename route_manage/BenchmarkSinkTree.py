@@ -0,0 +1,117 @@
+import logging
+import random
+import time
+
+from route_manage.route_algorithm.RouteAlgorithm import Dijkstra
+from route_manage.sink_tree import SinkTrees
+from route_manage.BenchmarkDijkstra import build_fat_tree
+from base.parameters import BusinessType
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+logger.setLevel(logging.INFO)
+
+"""
+    simulation, fat trees of k = 4, 8, 16 with k/2 hosts on every edge
+    switch addressed 10.pod.edge.host (one /24 per edge switch), and
+    FLOW_NUM flows between random hosts in arrival order.  counts the
+    flow entries per switch, packet-ins and route calculations of pair
+    forwarding (exact in_port, ipv4_src, ipv4_dst entries in both ways
+    on every hop) and destination forwarding (sink trees, with and
+    without prefix aggregation).
+"""
+FAT_TREE_K = [4, 8, 16]
+FLOW_NUM = 20000
+
+
+def build_hosts(k):
+    """[(ip, dpid, port_no)] of the hosts on the edge switches of build_fat_tree(k)."""
+    half = k / 2
+    hosts = []
+    for pod in range(k):
+        for e in range(half):
+            for h in range(half):
+                hosts.append(('10.%d.%d.%d' % (pod, e, h + 2),
+                              300001 + pod * half + e, half + 1 + h))
+    return hosts
+
+
+def table_sizes(entries):
+    sizes = entries.values()
+    return max(sizes), float(sum(sizes)) / len(sizes), sum(sizes)
+
+
+def simulate_pair(switches, links, flows):
+    algorithm = Dijkstra()
+    algorithm.init_algorithm(switches, links)
+    algorithm.update_link_status(links)
+
+    entries = dict((dpid, 0) for dpid in switches)
+    installed = set()
+    packet_in = 0
+    for src, dst in flows:
+        # the first packet of a pair, in either way, misses
+        if (src[0], dst[0]) in installed or src[0] == dst[0]:
+            continue
+        installed.add((src[0], dst[0]))
+        installed.add((dst[0], src[0]))
+        packet_in += 1
+
+        if src[1] == dst[1]:
+            link_list = [src[1]]
+        else:
+            algorithm.run(src[1], dst[1], BusinessType["HTML"])
+            link_list, link_cost = algorithm.get_link(src[1], dst[1])
+        for dpid in link_list:
+            entries[dpid] += 2
+    return entries, packet_in, packet_in
+
+
+def simulate_destination(switches, links, flows, hosts, prefix_len):
+    sink_trees = SinkTrees(prefix_len)
+    known_hosts = [(ip, dpid) for ip, dpid, port_no in hosts]
+
+    # {dpid: set of matches}, entries are shared by every source
+    entries = dict((dpid, set()) for dpid in switches)
+    packet_in = 0
+    for src, dst in flows:
+        if src[0] == dst[0] or \
+                (sink_trees.has_host(*dst) and sink_trees.has_host(*src)):
+            continue
+        packet_in += 1
+
+        for ip, dpid, port_no in (dst, src):
+            tree = sink_trees.get_tree(ip, dpid, switches, links, lambda: known_hosts)
+            if not tree.installed:
+                for tree_dpid, outport in tree.entries(switches):
+                    entries[tree_dpid].add((tree.network, tree.prefix_len))
+                tree.installed = True
+            if not sink_trees.has_host(ip, dpid, port_no):
+                entries[dpid].add((ip, 32))
+                sink_trees.add_host(ip, dpid, port_no)
+    entries = dict((dpid, len(matches)) for dpid, matches in entries.items())
+    return entries, packet_in, sink_trees.calculated
+
+
+if __name__ == '__main__':
+    for k in FAT_TREE_K:
+        switches, links = build_fat_tree(k)
+        hosts = build_hosts(k)
+        flows = [tuple(random.sample(hosts, 2)) for _ in range(FLOW_NUM)]
+        logger.info("fat tree k=%d: %d switches, %d hosts, %d flows",
+                    k, len(switches), len(hosts), FLOW_NUM)
+
+        for name, simulate in (('pair', lambda: simulate_pair(switches, links, flows)),
+                               ('destination /32', lambda: simulate_destination(
+                                   switches, links, flows, hosts, 32)),
+                               ('destination /24', lambda: simulate_destination(
+                                   switches, links, flows, hosts, 24))):
+            start = time.time()
+            entries, packet_in, calculated = simulate()
+            used = time.time() - start
+            max_size, avg_size, total = table_sizes(entries)
+            logger.info("  %-16s flow entries per switch max:%d avg:%.1f total:%d, "
+                        "packet-ins:%d, route calculations:%d, %.1fms",
+                        name, max_size, avg_size, total, packet_in, calculated, used * 1000)
@@ -17,24 +17,36 @@ from ryu.lib import hub
 from ryu.lib import mac
 from ryu.lib.packet import packet
 from ryu.lib.packet import ipv4, ipv6, ethernet, igmp
+from ryu.lib.packet import packet_view
 from ryu.app.wsgi import ControllerBase, WSGIApplication, route
 
 from base.parameters import DefaultBusinessType, BusinessType
 from base.parameters import GATEWAY_IP_LIST, GATEWAY_MAC_DICT, ROUTE_TASK_HANDLE_INTERVAL
 from base.parameters import LINK_STATUS_PRINTER, LINK_STATUS_PRINTER_INTERVAL
+from base.parameters import ROUTE_QUEUE_SIZE, ROUTE_QUEUE_MAX_BATCH, ROUTE_QUEUE_MAX_LATENCY
+from base.parameters import ROUTE_FORWARDING_MODE
+from base.parameters import REQUEST_CACHE_CAPACITY, REQUEST_CACHE_TTL, REQUEST_CACHE_TICK
+from base.parameters import PACKET_IN_EVENT_QUEUE_SIZE, PACKET_IN_EVENT_QUEUE_POLICY
 from lib.project_lib import Megabits, find_packet
+from lib.batch_worker import BatchWorker
 # from SystemLogger import SystemPerformanceLogger
 from web_service import ws_event
 from multicast import igmplib
 from topology_manage.object import topo_event as topo_event
 from topology_manage.object.link import LinkTableApi
+from link_monitor.link_state import LinkStateEpoch
 from host_manage.HostTrack import EventHostState, MacEntry
 from host_manage.HostDiscovery import EventHostMissing
+from host_manage.object.host_index import HostIndex
 from topology_manage.ProxyArp import ARPTable
 from route_manage.route_algorithm.RouteAlgorithm import GAPopulation, Dijkstra, RouteAlgorithm
 from route_manage.route_algorithm.MulticastRouteAlgorithm import MGAlgorithm
 from route_manage.route_algorithm.NSGA2 import NSGA2
 from route_manage.route_task import RouteTaskEntry, NATRouteTaskEntry, MulticastTaskEntry, RouteTaskHandler
+from route_manage.route_task import SinkTreeTaskEntry
+from route_manage.sink_tree import SinkTrees
+from route_manage.flow_deployer import FlowDeployer
+from route_manage.request_cache import RequestCache
 from route_info_maintainer import RouteInfoMaintainer
 from link_monitor import link_monitor_main
 from fault_recovery import fault_recovery_event, fault_recovery_main
@@ -66,6 +78,9 @@ ROUTE_TYPE_INTRA_TOPO = 3
 
 class RouteManage(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    EVENT_QUEUE_SIZE = PACKET_IN_EVENT_QUEUE_SIZE
+    EVENT_QUEUE_POLICY = PACKET_IN_EVENT_QUEUE_POLICY
+    EVENT_QUEUE_DROPPABLE = [ofp_event.EventOFPPacketIn]
 
     _EVENTS = [ws_event.EventWebRouteSet, ws_event.EventWebLinkBandChange,
                ws_event.EventWebRouteSetDij, EventHostMissing,
@@ -87,6 +102,8 @@ class RouteManage(app_manager.RyuApp):
             # mac_to_port
             self.mac_to_port = None
             self.entry = {}
+            # ip/mac -> MacEntry of every known host
+            self.host_index = HostIndex()
 
             # multicast group info
             self.multicast_group = {}
@@ -97,8 +114,13 @@ class RouteManage(app_manager.RyuApp):
             # link list
             self.links = None
 
-            # request cache: {(src_ip, dst_ip): timestamp}
-            self.request_cache = {}
+            # request cache: {(src_ip, dst_ip): CacheEntry}
+            self.request_cache = RequestCache(REQUEST_CACHE_CAPACITY, REQUEST_CACHE_TTL,
+                                              REQUEST_CACHE_TIMEOUT, REQUEST_CACHE_TICK)
+            self.request_cache.start()
+
+            # times out the routes whose barriers are never answered
+            FlowDeployer().start()
 
             # Algorithm object
             self.algorithm_state = False
@@ -113,9 +135,17 @@ class RouteManage(app_manager.RyuApp):
             # self.multicast_algorithm = MGAlgorithm()
             self.multicast_algorithm = NSGA2()
 
+            # unicast forwarding mode, "pair" or "destination"
+            self.forwarding_mode = ROUTE_FORWARDING_MODE
+            # sink trees of destination forwarding
+            self.sink_trees = SinkTrees()
+
             # route task handler
-            self.queue = hub.Queue()
             self.route_task_handler = RouteTaskHandler(self)
+            self.queue = BatchWorker('route_manage', self.process_queued_msg,
+                                     ROUTE_QUEUE_SIZE, ROUTE_QUEUE_MAX_BATCH,
+                                     ROUTE_QUEUE_MAX_LATENCY)
+            self.queue.start()
 
             # install flow for fail match ip packet
             self.install_flow = install_flow
@@ -167,13 +197,10 @@ class RouteManage(app_manager.RyuApp):
         mac_entry = MacEntry(dpid, port, macaddr)
         mac_entry.ipaddrs[ip_addr] = 0
         self.entry[macaddr] = mac_entry
+        self.host_index.add_entry(mac_entry)
 
     def get_mac(self, ip_addr):
-        for mac_addr, host_info_entry in self.entry.items():
-            if host_info_entry.ipaddrs.keys()[0] == ip_addr:
-                return mac_addr
-            pass
-        return None
+        return self.host_index.get_mac(ip_addr)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def table_miss_flow_entry(self, ev):
@@ -190,6 +217,21 @@ class RouteManage(app_manager.RyuApp):
                                 match=match, instructions=inst)
         datapath.send_msg(mod)
 
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        """resolve route installations waiting for this barrier."""
+        FlowDeployer().barrier_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        """unregister the routes whose ingress entries were removed."""
+        match = ev.msg.match
+        src_ip = match.get('ipv4_src')
+        dst_ip = match.get('ipv4_dst')
+        if src_ip is None or dst_ip is None:
+            return
+        self.route_info_maintainer.flow_removed(src_ip, dst_ip)
+
     @set_ev_cls(topo_event.EventTopoInitializeEnd)
     def topo_init_handler(self, ev):
         """
@@ -245,8 +287,18 @@ class RouteManage(app_manager.RyuApp):
             active fault_recovery module by EventFaultRecoveryLinkDelete.
         """
         self.algorithm.init_algorithm(ev.switches, ev.links)
+        self._reinstall_sink_trees(ev.src_port.dpid, ev.dst_port.dpid)
         self.send_event_to_observers(fault_recovery_event.EventFaultRecoveryLinkDelete(
-            ev.src_port, ev.dst_port, ev.timestamp))
+            ev.src_port, ev.dst_port, ev.timestamp, ev.switches, ev.links))
+
+    def _reinstall_sink_trees(self, src_dpid, dst_dpid):
+        """recalculate the sink trees forwarding over a deleted link."""
+        for ip, dpid, port_no in self.sink_trees.invalidate_link(src_dpid, dst_dpid):
+            task_entry = SinkTreeTaskEntry(route_type=ROUTE_TYPE_INTRA_TOPO,
+                                           src_dpid=dpid, src_ip=ip, src_port_no=port_no,
+                                           dst_dpid=dpid, dst_ip=ip, dst_port_no=port_no,
+                                           route_manage=self)
+            self.add_to_queue(task_entry)
 
     @set_ev_cls(topo_event.EventPortDownUpdateTopo)
     def port_down_handler(self, ev):
@@ -280,11 +332,14 @@ class RouteManage(app_manager.RyuApp):
             return
 
         new_algorithm.switch_queue = self.algorithm.switch_queue
+        new_algorithm.switch_index = self.algorithm.switch_index
         new_algorithm.edge_queue = self.algorithm.edge_queue
         new_algorithm.switch_neighbors = self.algorithm.switch_neighbors
         new_algorithm.edge_collection = self.algorithm.edge_collection
         new_algorithm.vertexs = self.algorithm.vertexs
-        new_algorithm.edges = self.algorithm.edges
+        new_algorithm.edges = []
+        # reload every edge in its own format on next update_link_status
+        new_algorithm.link_state_seq = None
 
         logger.info("change algorithm from %s to %s",
                     self.algorithm_type, algorithm_type)
@@ -310,6 +365,10 @@ class RouteManage(app_manager.RyuApp):
             logger.info("[host leave]entry updated:%s", ev.entry)
             del self.entry[ev.entry.macaddr]
 
+    def host_locations(self):
+        """[(ip, dpid)] of known hosts."""
+        return self.host_index.locations()
+
     @set_ev_cls(igmplib.EventMulticastGroupChanged, MAIN_DISPATCHER)
     def multicast_group_handler(self, ev):
         """
@@ -337,10 +396,10 @@ class RouteManage(app_manager.RyuApp):
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def packet_in_handler(self, ev):
         msg = ev.msg
-        pkt = packet.Packet(msg.data)
+        view = packet_view.get_packet_view(ev)
+        pkt = view.pkt
 
-        header_list = dict(
-            (p.protocol_name, p) for p in pkt.protocols if type(p) != str)
+        header_list = view.header_list
 
         # ignore igmp packet
         if igmp.igmp.__name__ in header_list:
@@ -413,14 +472,10 @@ class RouteManage(app_manager.RyuApp):
 
         # ignore same (src_ip, dst_ip) packet-in in queue
         # while task in queue and call algorithm.evolve
-        if (src_ip, dst_ip) in self.request_cache:
-            if time.time() - self.request_cache[(src_ip, dst_ip)][0] < \
-                    REQUEST_CACHE_TIMEOUT:
-                return
-            else:
-                self.request_cache[(src_ip, dst_ip)][0] = time.time()
-        else:
-            self.request_cache[(src_ip, dst_ip)] = [time.time(), 0]
+        topology = LinkStateEpoch().topology
+        new, link_list, link_cost = self.request_cache.request((src_ip, dst_ip), topology)
+        if not new:
+            return
 
         # set logger and push task to queue.
         # system_performance_logger.new_request()
@@ -466,14 +521,23 @@ class RouteManage(app_manager.RyuApp):
 
         '''
 
-        task_entry = RouteTaskEntry(route_type=ROUTE_TYPE_INTRA_TOPO,
-                                    src_dpid=src_dpid, src_ip=src_ip, src_port_no=src_port_no,
-                                    dst_dpid=dst_dpid, dst_ip=dst_ip, dst_port_no=dst_port_no,
-                                    route_manage=self)
-
+        # servers with a business type keep the exact path of the algorithm
+        if self.forwarding_mode == "destination" and dst_ip not in self.servers:
+            task_entry = SinkTreeTaskEntry(route_type=ROUTE_TYPE_INTRA_TOPO,
+                                           src_dpid=src_dpid, src_ip=src_ip, src_port_no=src_port_no,
+                                           dst_dpid=dst_dpid, dst_ip=dst_ip, dst_port_no=dst_port_no,
+                                           route_manage=self)
+        else:
+            task_entry = RouteTaskEntry(route_type=ROUTE_TYPE_INTRA_TOPO,
+                                        src_dpid=src_dpid, src_ip=src_ip, src_port_no=src_port_no,
+                                        dst_dpid=dst_dpid, dst_ip=dst_ip, dst_port_no=dst_port_no,
+                                        route_manage=self)
+            # no link changed since the path was calculated
+            if link_list is not None and (link_list[0], link_list[-1]) == (src_dpid, dst_dpid):
+                task_entry.cached_route = (link_list, link_cost)
+                task_entry.topology_version = topology
 
         self.add_to_queue(task_entry)
-        self.trigger_update()
 
     def _handle_multicast_udp(self, msg, pkt, ip_layer):
         ether_layer = find_packet(pkt, ethernet.ethernet.__name__)
@@ -509,43 +573,27 @@ class RouteManage(app_manager.RyuApp):
 
         # ignore same (src_ip, dst_ip) packet-in in queue
         # while task in queue and call algorithm.evolve
-        if (src_ip, dst_ip) in self.request_cache:
-            if time.time() - self.request_cache[(src_ip, dst_ip)][0] < \
-                    REQUEST_CACHE_TIMEOUT:
-                return
-            else:
-                self.request_cache[(src_ip, dst_ip)][0] = time.time()
-        else:
-            self.request_cache[(src_ip, dst_ip)] = [time.time(), 0]
+        new, link_list, link_cost = self.request_cache.request((src_ip, dst_ip),
+                                                               LinkStateEpoch().topology)
+        if not new:
+            return
 
         task_entry = MulticastTaskEntry(route_type=ROUTE_TYPE_INTRA_TOPO,
                                         src_dpid=src_dpid, src_ip=src_ip, src_port_no=src_port_no,
                                         dst_dpid_set=self.multicast_group[dst_ip].keys(), group_ip=dst_ip,
                                         route_manage=self)
         self.add_to_queue(task_entry)
-        self.trigger_update()
 
         pass
 
-    def process_queued_msg(self):
-        """add all the queued routing information to route task handler."""
-        try:
-            while not self.queue.empty():
-                task_entry = self.queue.get()
-                self.route_task_handler.update_entry(task_entry)
-        except:
-            pass
+    def process_queued_msg(self, batch):
+        """add a batch of queued routing information to route task handler."""
+        for task_entry in batch:
+            self.route_task_handler.update_entry(task_entry)
 
     def add_to_queue(self, msg):
-        """an interface to add a object into queue."""
-        if not self.queue.full():
-            self.queue.put(msg)
-
-    def trigger_update(self):
-        """create a thread to update route task queue."""
-        update_thread = Thread(target=self.process_queued_msg)
-        update_thread.setDaemon(True)
-        update_thread.start()
+        """an interface to add a object into queue, dropped when it is full."""
+        self.queue.put(msg)
 
     def _start_link_status_printer(self):
         """create link status print thread."""
@@ -627,3 +675,63 @@ class RouteManageRestController(ControllerBase):
     def update_algorithm_type(self, req, **kwargs):
         payload = json.loads(req.body)
         self.route_manage_instance.change_algorithm_type(str(payload["algorithm_type"]))
+
+    @route('routemanage', '/routemanage/stats/packetin', methods=['GET'])
+    def get_packet_in_stats(self, req, **kwargs):
+        body = json.dumps(packet_view.stats.to_dict())
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/routecache', methods=['GET'])
+    def get_route_cache_stats(self, req, **kwargs):
+        body = json.dumps({'link_state': LinkStateEpoch().to_dict(),
+                           'spt_cache': Dijkstra().spt_cache.to_dict()})
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/eventqueue', methods=['GET'])
+    def get_event_queue_stats(self, req, **kwargs):
+        body = json.dumps({name: app.events.stats()
+                           for name, app in app_manager.SERVICE_BRICKS.items()})
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/requestcache', methods=['GET'])
+    def get_request_cache_stats(self, req, **kwargs):
+        body = json.dumps(self.route_manage_instance.request_cache.stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/hostindex', methods=['GET'])
+    def get_host_index_stats(self, req, **kwargs):
+        body = json.dumps(self.route_manage_instance.host_index.stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/routetask', methods=['GET'])
+    def get_route_task_stats(self, req, **kwargs):
+        body = json.dumps(self.route_manage_instance.route_task_handler.stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/flowinstall', methods=['GET'])
+    def get_flow_install_stats(self, req, **kwargs):
+        body = json.dumps(FlowDeployer().stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/routepool', methods=['GET'])
+    def get_route_pool_stats(self, req, **kwargs):
+        route_pool = self.route_manage_instance.route_task_handler.route_pool
+        body = json.dumps(route_pool.stats() if route_pool is not None else {})
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/routeinfo', methods=['GET'])
+    def get_route_info_stats(self, req, **kwargs):
+        body = json.dumps(self.route_manage_instance.route_info_maintainer.stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/sinktree', methods=['GET'])
+    def get_sink_tree_stats(self, req, **kwargs):
+        stats = self.route_manage_instance.sink_trees.stats()
+        stats['forwarding_mode'] = self.route_manage_instance.forwarding_mode
+        body = json.dumps(stats)
+        return Response(content_type='application/json', body=body)
+
+    @route('routemanage', '/routemanage/stats/queue', methods=['GET'])
+    def get_queue_stats(self, req, **kwargs):
+        body = json.dumps(self.route_manage_instance.queue.stats())
+        return Response(content_type='application/json', body=body)
@@ -0,0 +1,140 @@
+import time
+
+from collections import deque
+from threading import Lock
+
+from base.parameters import FLOW_HARD_TIMEOUT, FLOW_INSTALL_TIMEOUT
+
+
+def path_links(path):
+    """links of path in both directions."""
+    links = set()
+    for i in range(len(path) - 1):
+        links.add((path[i], path[i + 1]))
+        links.add((path[i + 1], path[i]))
+    return links
+
+
+def _shortest_hop_path(switches, src_dpid, dst_dpid, excluded_links, excluded_switches):
+    previous = {src_dpid: None}
+    queue = deque([src_dpid])
+    while queue:
+        dpid = queue.popleft()
+        if dpid == dst_dpid:
+            path = [dpid]
+            while previous[path[-1]] is not None:
+                path.append(previous[path[-1]])
+            return path[::-1]
+        for neighbor in switches[dpid].neighbors:
+            if neighbor in previous or neighbor not in switches or \
+                    (dpid, neighbor) in excluded_links or neighbor in excluded_switches:
+                continue
+            previous[neighbor] = dpid
+            queue.append(neighbor)
+    return None
+
+
+def disjoint_path(switches, path):
+    """
+        shortest hop backup of path sharing no link with it, switch
+        disjoint when possible, None when the topology has none.
+    """
+    if len(path) < 2:
+        return None
+    links = path_links(path)
+    backup = _shortest_hop_path(switches, path[0], path[-1], links, set(path[1:-1]))
+    if backup is None:
+        backup = _shortest_hop_path(switches, path[0], path[-1], links, set())
+    return backup
+
+
+class FailoverGroups(object):
+    """
+        singleton allocator of fast failover group ids, one group per
+        (dpid, src_ip, dst_ip) protected route hop.
+
+        a route deployed again modifies its former groups.  the group of
+        a route older than the hard timeout of its flow entries is no
+        more referenced, its id is handed to the next route on that
+        switch, so the group table never grows beyond the routes alive.
+    """
+
+    def __init__(self):
+        if not hasattr(self, 'groups'):
+            super(FailoverGroups, self).__init__()
+            # {dpid: {(src_ip, dst_ip): [group id, created]}}
+            self.groups = {}
+            # {dpid: deque([(created, (src_ip, dst_ip))])}, oldest first,
+            # entries of modified groups are skipped
+            self.order = {}
+            # {dpid: last group id}
+            self.last_id = {}
+            self.timeout = FLOW_HARD_TIMEOUT + FLOW_INSTALL_TIMEOUT
+            self.lock = Lock()
+
+            # counters
+            self.added = 0
+            self.modified = 0
+            self.reused = 0
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(FailoverGroups, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def allocate(self, datapath, src_ip, dst_ip, now_time=None):
+        """return (group id, OFPGC_ADD or OFPGC_MODIFY)."""
+        if now_time is None:
+            now_time = time.time()
+        ofproto = datapath.ofproto
+
+        key = (src_ip, dst_ip)
+        with self.lock:
+            groups = self.groups.setdefault(datapath.id, {})
+            order = self.order.setdefault(datapath.id, deque())
+            group = groups.get(key)
+            if group is not None:
+                self.modified += 1
+                command = ofproto.OFPGC_MODIFY
+            else:
+                group = self._expired(groups, order, now_time)
+                if group is not None:
+                    self.reused += 1
+                    command = ofproto.OFPGC_MODIFY
+                else:
+                    group_id = self.last_id.get(datapath.id, 0) + 1
+                    self.last_id[datapath.id] = group_id
+                    group = [group_id, now_time]
+                    self.added += 1
+                    command = ofproto.OFPGC_ADD
+                groups[key] = group
+
+            group[1] = now_time
+            order.append((now_time, key))
+            if len(order) > 2 * len(groups) + 64:
+                order = deque((created, k) for created, k in order
+                              if groups.get(k, (None, None))[1] == created)
+                self.order[datapath.id] = order
+            return group[0], command
+
+    def _expired(self, groups, order, now_time):
+        """pop the oldest group if it expired."""
+        while order:
+            created, key = order[0]
+            group = groups.get(key)
+            if group is None or group[1] != created:
+                order.popleft()
+                continue
+            if now_time - created < self.timeout:
+                return None
+            order.popleft()
+            return groups.pop(key)
+        return None
+
+    def stats(self):
+        return {'switches': len(self.groups),
+                'groups': sum(len(groups) for groups in self.groups.values()),
+                'added': self.added,
+                'modified': self.modified,
+                'reused': self.reused}
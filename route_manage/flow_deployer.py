@@ -0,0 +1,226 @@
+import logging
+import time
+
+from collections import deque
+from threading import Event, Lock
+
+from ryu.lib import hub
+
+from base.parameters import FLOW_INSTALL_TIMEOUT, FLOW_INSTALL_EXPIRE_TICK
+from lib.latency_histogram import LatencyHistogram
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class FlowBatch(object):
+    """
+        FlowMods of one route grouped by datapath, in the order they
+        were added.
+    """
+
+    def __init__(self):
+        # [dpid], order of first FlowMod to each datapath
+        self.dpids = []
+        # {dpid: (datapath, [mod])}
+        self.groups = {}
+
+    def add(self, datapath, mod):
+        if datapath.id not in self.groups:
+            self.dpids.append(datapath.id)
+            self.groups[datapath.id] = (datapath, [])
+        self.groups[datapath.id][1].append(mod)
+
+    def ordered_groups(self, order=None):
+        """groups following the dpids of order first, then the others."""
+        dpids = []
+        if order is not None:
+            dpids = [dpid for dpid in order if dpid in self.groups]
+        dpids.extend(dpid for dpid in self.dpids if dpid not in dpids)
+        return [self.groups[dpid] for dpid in dpids]
+
+    def __len__(self):
+        return sum(len(mods) for datapath, mods in self.groups.values())
+
+
+class InstallFuture(object):
+    """
+        completion of a route installation: resolved when the barrier
+        sent after the FlowMods of every datapath has been answered.
+    """
+
+    def __init__(self, barriers):
+        # {(dpid, barrier xid)} not answered yet
+        self.barriers = set(barriers)
+        self.start = time.time()
+        self.latency = None
+        self.timed_out = False
+        self.event = Event()
+        # called with the future once resolved or timed out
+        self.callbacks = []
+        self.lock = Lock()
+
+    def done(self):
+        return self.event.is_set()
+
+    def add_done_callback(self, callback):
+        """call callback(future) when done, at once if it already is."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_done(self):
+        with self.lock:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("install callback failed")
+
+    def wait(self, timeout=None):
+        """return True when the route is installed on every datapath."""
+        self.event.wait(timeout)
+        return self.done() and not self.timed_out
+
+
+class FlowDeployer(object):
+    """
+        singleton sending the FlowMods of a route to its datapaths.
+
+        the FlowMods of one datapath and a trailing OFPBarrierRequest are
+        held by the datapath (send_msg with flush=False) and flushed in
+        a single write.  all datapaths are written at once, destination
+        end first, and barrier_reply() resolves the InstallFuture of the
+        route once every datapath has answered its barrier.
+
+        the routes waiting for barrier replies are kept in commit order,
+        the expiry thread gives up the oldest ones past
+        FLOW_INSTALL_TIMEOUT every tick.
+    """
+
+    def __init__(self):
+        if not hasattr(self, 'waiting'):
+            super(FlowDeployer, self).__init__()
+            # {(dpid, barrier xid): InstallFuture}
+            self.waiting = {}
+            # InstallFuture of the routes waiting, oldest first
+            self.pending = deque()
+            self.lock = Lock()
+            self.tick = FLOW_INSTALL_EXPIRE_TICK
+            self.thread = None
+
+            # counters
+            self.routes = 0
+            self.flow_mods = 0
+            self.writes = 0
+            self.installed = 0
+            self.timed_out = 0
+            # send -> last barrier reply of a route
+            self.install_latency = LatencyHistogram()
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(FlowDeployer, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def commit(self, batch, order=None):
+        """send batch, groups of the dpids in order first, return an InstallFuture."""
+        assert isinstance(batch, FlowBatch)
+
+        datapaths = []
+        barriers = []
+        for datapath, mods in batch.ordered_groups(order):
+            # held by the datapath until flushed below
+            for mod in mods:
+                datapath.send_msg(mod, flush=False)
+            barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+            datapath.send_msg(barrier, flush=False)
+            datapaths.append(datapath)
+            barriers.append((datapath.id, barrier.xid))
+
+        future = InstallFuture(barriers)
+        with self.lock:
+            for key in barriers:
+                self.waiting[key] = future
+            if barriers:
+                self.pending.append(future)
+            self.routes += 1
+            self.flow_mods += len(batch)
+            self.writes += len(datapaths)
+
+        for datapath in datapaths:
+            datapath.flush()
+
+        if not barriers:
+            self._resolve(future)
+        return future
+
+    def barrier_reply(self, msg):
+        """called with every OFPBarrierReply."""
+        key = (msg.datapath.id, msg.xid)
+        with self.lock:
+            future = self.waiting.pop(key, None)
+            if future is None:
+                return
+            future.barriers.discard(key)
+            if future.barriers:
+                return
+        self._resolve(future)
+
+    def _resolve(self, future):
+        future.latency = time.time() - future.start
+        self.install_latency.record(future.latency)
+        self.installed += 1
+        future.set_done()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = hub.spawn(self._expire_loop)
+        return self.thread
+
+    def stop(self):
+        if self.thread is not None:
+            hub.kill(self.thread)
+            hub.joinall([self.thread])
+            self.thread = None
+
+    def _expire_loop(self):
+        while True:
+            hub.sleep(self.tick)
+            self.expire(time.time())
+
+    def expire(self, now_time):
+        """give up the routes waiting for barrier replies longer than FLOW_INSTALL_TIMEOUT."""
+        futures = []
+        with self.lock:
+            while self.pending:
+                future = self.pending[0]
+                # all barriers answered, resolved by barrier_reply()
+                if future.barriers and now_time - future.start <= FLOW_INSTALL_TIMEOUT:
+                    break
+                self.pending.popleft()
+                if future.barriers:
+                    for key in future.barriers:
+                        self.waiting.pop(key, None)
+                    futures.append(future)
+        for future in futures:
+            logger.error("flow install timeout, barrier unanswered:%s", list(future.barriers))
+            future.timed_out = True
+            self.timed_out += 1
+            future.set_done()
+
+    def stats(self):
+        return {'routes': self.routes,
+                'flow_mods': self.flow_mods,
+                'writes': self.writes,
+                'installed': self.installed,
+                'timed_out': self.timed_out,
+                'waiting_barriers': len(self.waiting),
+                'install_latency': self.install_latency.to_dict()}
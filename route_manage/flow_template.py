@@ -0,0 +1,357 @@
+import struct
+import netaddr
+
+from functools import partial
+
+from ryu.lib import addrconv
+from ryu.lib import ofctl_v1_3
+from ryu.ofproto import ether
+from ryu.ofproto.ofproto_parser import MsgBase
+
+from base.parameters import server_tcp_port
+from base.parameters import FLOW_IDLE_TIMEOUT, FLOW_HARD_TIMEOUT, ROUTE_FLOW_PRIORITY
+from base.parameters import DESTINATION_FLOW_PRIORITY, DESTINATION_FLOW_HARD_TIMEOUT
+from base.parameters import MULTICAST_FLOW_IDLE_TIMEOUT, MULTICAST_FLOW_HARD_TIMEOUT
+
+
+"""
+    variable field kinds: (size, pack, two values differing in the last byte)
+"""
+FIELD_KINDS = {
+    'port': (4, lambda v: struct.pack('!I', int(v)), (1, 2)),
+    'ipv4': (4, lambda v: addrconv.ipv4.text_to_bin(str(v)), ('10.0.0.1', '10.0.0.2')),
+    'mac': (6, lambda v: addrconv.mac.text_to_bin(str(v)), ('00:00:00:00:00:01', '00:00:00:00:00:02')),
+}
+
+
+class SerializedFlowMod(MsgBase):
+    """
+        a FlowMod already serialized by a template, only the xid is
+        patched in when the datapath assigns it.
+    """
+
+    def __init__(self, datapath, buf):
+        super(SerializedFlowMod, self).__init__(datapath)
+        self.buf = buf
+
+    def set_xid(self, xid):
+        assert self.xid is None
+        self.xid = xid
+        self.buf[4:8] = struct.pack('!I', xid)
+
+    def serialize(self):
+        pass
+
+
+class FlowModTemplate(object):
+    """
+        FlowMod of one shape serialized once.
+
+        build(datapath, **values) returns the OFPFlowMod of that shape;
+        fields: {name: kind}.  the offset of every variable field is
+        found by serializing the FlowMod again with that field changed,
+        render() then only copies the skeleton and packs the values at
+        those offsets.
+    """
+
+    def __init__(self, datapath, build, fields):
+        self.fields = fields
+        defaults = dict((name, FIELD_KINDS[kind][2][0]) for name, kind in fields.items())
+        self.skeleton = self._serialize(build(datapath, **defaults))
+
+        # {name: [offset]}
+        self.offsets = {}
+        for name, kind in fields.items():
+            values = dict(defaults)
+            values[name] = FIELD_KINDS[kind][2][1]
+            buf = self._serialize(build(datapath, **values))
+            assert len(buf) == len(self.skeleton)
+            size = FIELD_KINDS[kind][0]
+            self.offsets[name] = [i - size + 1 for i in range(len(buf))
+                                  if buf[i] != self.skeleton[i]]
+            assert self.offsets[name], "field %s not found in FlowMod" % name
+
+    @staticmethod
+    def _serialize(mod):
+        mod.set_xid(0)
+        mod.serialize()
+        return bytearray(mod.buf)
+
+    def render(self, datapath, **values):
+        buf = bytearray(self.skeleton)
+        for name, kind in self.fields.items():
+            size, pack = FIELD_KINDS[kind][:2]
+            packed = pack(values[name])
+            for offset in self.offsets[name]:
+                buf[offset:offset + size] = packed
+        return SerializedFlowMod(datapath, buf)
+
+
+class FlowModTemplates(dict):
+    """
+        singleton cache of FlowModTemplate:
+        {(OpenFlow version, shape): FlowModTemplate}.
+    """
+
+    def __init__(self):
+        if not hasattr(self, 'hits'):
+            super(FlowModTemplates, self).__init__()
+            self.hits = 0
+            self.misses = 0
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance'):
+            orig = super(FlowModTemplates, cls)
+            cls._instance = orig.__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def render(self, shape, build, fields, datapath, **values):
+        key = (datapath.ofproto.OFP_VERSION, shape)
+        template = self.get(key)
+        if template is None:
+            template = FlowModTemplate(datapath, build, fields)
+            self[key] = template
+            self.misses += 1
+        else:
+            self.hits += 1
+        return template.render(datapath, **values)
+
+    def to_dict(self):
+        return {'templates': len(self),
+                'hits': self.hits,
+                'misses': self.misses}
+
+
+def build_route_flow_mod(datapath, src_ip, dst_ip, inport, outport, flags=0,
+                         idle_timeout=FLOW_IDLE_TIMEOUT):
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, in_port=inport,
+                            ipv4_src=str(src_ip), ipv4_dst=str(dst_ip))
+
+    actions = [parser.OFPActionOutput(outport)]
+
+    inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+
+    return parser.OFPFlowMod(datapath=datapath, flags=flags,
+                             priority=ROUTE_FLOW_PRIORITY,
+                             idle_timeout=idle_timeout,
+                             hard_timeout=FLOW_HARD_TIMEOUT,
+                             command=ofproto.OFPFC_ADD,
+                             match=match, instructions=inst)
+
+
+def build_route_group_flow_mod(datapath, src_ip, dst_ip, inport, group_id, flags=0):
+    """route entry forwarding to a group instead of an output port."""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, in_port=inport,
+                            ipv4_src=str(src_ip), ipv4_dst=str(dst_ip))
+
+    actions = [parser.OFPActionGroup(group_id)]
+
+    inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+
+    return parser.OFPFlowMod(datapath=datapath, flags=flags,
+                             priority=ROUTE_FLOW_PRIORITY,
+                             idle_timeout=FLOW_IDLE_TIMEOUT,
+                             hard_timeout=FLOW_HARD_TIMEOUT,
+                             command=ofproto.OFPFC_ADD,
+                             match=match, instructions=inst)
+
+
+def failover_group_mod(datapath, group_id, buckets, command=None):
+    """fast failover group, buckets: [(watch port, out port)] by preference."""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    if command is None:
+        command = ofproto.OFPGC_ADD
+    buckets = [parser.OFPBucket(watch_port=watch_port,
+                                actions=[parser.OFPActionOutput(outport)])
+               for watch_port, outport in buckets]
+    return parser.OFPGroupMod(datapath, command, ofproto.OFPGT_FF, group_id, buckets)
+
+
+def build_destination_flow_mod(datapath, dst_ip, outport, prefix_len=32):
+    """sink tree entry: every packet to dst_ip/prefix_len, whatever its source."""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    if prefix_len < 32:
+        network = netaddr.IPNetwork('%s/%d' % (dst_ip, prefix_len))
+        match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP,
+                                ipv4_dst=(str(network.network), str(network.netmask)))
+    else:
+        match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, ipv4_dst=str(dst_ip))
+
+    actions = [parser.OFPActionOutput(outport)]
+
+    inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+
+    # longer prefix wins
+    return parser.OFPFlowMod(datapath=datapath,
+                             priority=DESTINATION_FLOW_PRIORITY + prefix_len,
+                             idle_timeout=0,
+                             hard_timeout=DESTINATION_FLOW_HARD_TIMEOUT,
+                             command=ofproto.OFPFC_ADD,
+                             match=match, instructions=inst)
+
+
+def build_multicast_flow_mod(datapath, src_ip, dst_ip, inport, **outports):
+    """outports: out_port_0, out_port_1, ..."""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, in_port=inport,
+                            ipv4_src=str(src_ip), ipv4_dst=str(dst_ip))
+
+    actions = []
+    for i in range(len(outports)):
+        actions.append(parser.OFPActionOutput(outports['out_port_%d' % i]))
+
+    inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+
+    return parser.OFPFlowMod(datapath=datapath, priority=ROUTE_FLOW_PRIORITY,
+                             idle_timeout=MULTICAST_FLOW_IDLE_TIMEOUT,
+                             hard_timeout=MULTICAST_FLOW_HARD_TIMEOUT,
+                             command=ofproto.OFPFC_ADD,
+                             match=match, instructions=inst)
+
+
+def build_user_to_server_flow_mod(datapath, user_ip, server_ip, outport,
+                                  gateway_ip, server_mac):
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    # match by IP address of users and gateways
+    format_match = {'dl_type': str(0x0800),
+                    'nw_proto': 6,
+                    'ipv4_src': str(user_ip),
+                    'ipv4_dst': str(gateway_ip)}
+    match = ofctl_v1_3.to_match(datapath, format_match)
+
+    actions = [parser.OFPActionDecNwTtl(),
+               parser.OFPActionSetField(tcp_dst=int(server_tcp_port)),
+               parser.OFPActionSetField(ipv4_dst=netaddr.IPAddress(server_ip)),
+               parser.OFPActionSetField(eth_dst=netaddr.EUI(server_mac)),
+               parser.OFPActionOutput(outport)]
+
+    inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+
+    return parser.OFPFlowMod(datapath=datapath, flags=1,
+                             priority=ROUTE_FLOW_PRIORITY, cookie=0,
+                             buffer_id=ofproto.OFP_NO_BUFFER,
+                             idle_timeout=FLOW_IDLE_TIMEOUT,
+                             hard_timeout=FLOW_HARD_TIMEOUT,
+                             command=ofproto.OFPFC_ADD,
+                             match=match, instructions=inst)
+
+
+def build_server_to_user_flow_mod(datapath, user_ip, server_ip, outport,
+                                  gateway_ip, gateway_mac, user_mac):
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+
+    # match by IP address of server and user
+    format_match = {'dl_type': str(0x0800),
+                    'nw_proto': 6,
+                    'ipv4_src': str(server_ip),
+                    'ipv4_dst': str(user_ip)}
+
+    actions = [parser.OFPActionDecNwTtl(),
+               parser.OFPActionSetField(tcp_src=int(80)),
+               parser.OFPActionSetField(ipv4_src=netaddr.IPAddress(gateway_ip)),
+               parser.OFPActionSetField(eth_src=netaddr.EUI(gateway_mac)),
+               parser.OFPActionSetField(eth_dst=netaddr.EUI(user_mac)),
+               parser.OFPActionOutput(outport)]
+
+    match = ofctl_v1_3.to_match(datapath, format_match)
+    inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+
+    return parser.OFPFlowMod(datapath=datapath, flags=1,
+                             priority=ROUTE_FLOW_PRIORITY, cookie=0,
+                             buffer_id=ofproto.OFP_NO_BUFFER,
+                             idle_timeout=FLOW_IDLE_TIMEOUT,
+                             hard_timeout=FLOW_HARD_TIMEOUT,
+                             command=ofproto.OFPFC_ADD,
+                             match=match, instructions=inst)
+
+
+ROUTE_FIELDS = {'src_ip': 'ipv4', 'dst_ip': 'ipv4', 'inport': 'port', 'outport': 'port'}
+ROUTE_GROUP_FIELDS = {'src_ip': 'ipv4', 'dst_ip': 'ipv4', 'inport': 'port', 'group_id': 'port'}
+DESTINATION_FIELDS = {'dst_ip': 'ipv4', 'outport': 'port'}
+USER_TO_SERVER_FIELDS = {'user_ip': 'ipv4', 'server_ip': 'ipv4', 'outport': 'port',
+                         'gateway_ip': 'ipv4', 'server_mac': 'mac'}
+SERVER_TO_USER_FIELDS = {'user_ip': 'ipv4', 'server_ip': 'ipv4', 'outport': 'port',
+                         'gateway_ip': 'ipv4', 'gateway_mac': 'mac', 'user_mac': 'mac'}
+
+
+def route_flow_mod(datapath, src_ip, dst_ip, inport, outport, notify_removed=False):
+    """notify_removed: OFPFF_SEND_FLOW_REM, the switch reports the entry removal."""
+    flags = datapath.ofproto.OFPFF_SEND_FLOW_REM if notify_removed else 0
+    return FlowModTemplates().render(('route', flags), partial(build_route_flow_mod, flags=flags),
+                                     ROUTE_FIELDS, datapath,
+                                     src_ip=src_ip, dst_ip=dst_ip,
+                                     inport=inport, outport=outport)
+
+
+def protection_flow_mod(datapath, src_ip, dst_ip, inport, outport):
+    """
+        route entry of a backup path or of packets sent back by a fast
+        failover group.  it carries no traffic while the primary path is
+        up, so it has no idle timeout and ends with the primary entries,
+        installed at the same time with the same hard timeout.
+    """
+    return FlowModTemplates().render('route_protection',
+                                     partial(build_route_flow_mod, idle_timeout=0),
+                                     ROUTE_FIELDS, datapath,
+                                     src_ip=src_ip, dst_ip=dst_ip,
+                                     inport=inport, outport=outport)
+
+
+def route_group_flow_mod(datapath, src_ip, dst_ip, inport, group_id, notify_removed=False):
+    flags = datapath.ofproto.OFPFF_SEND_FLOW_REM if notify_removed else 0
+    return FlowModTemplates().render(('route_group', flags),
+                                     partial(build_route_group_flow_mod, flags=flags),
+                                     ROUTE_GROUP_FIELDS, datapath,
+                                     src_ip=src_ip, dst_ip=dst_ip,
+                                     inport=inport, group_id=group_id)
+
+
+def destination_flow_mod(datapath, dst_ip, outport, prefix_len=32):
+    # the masked address of a prefix is not found by diffing two
+    # addresses, aggregated entries are few and built directly
+    if prefix_len < 32:
+        return build_destination_flow_mod(datapath, dst_ip, outport, prefix_len)
+    return FlowModTemplates().render('destination', build_destination_flow_mod,
+                                     DESTINATION_FIELDS, datapath,
+                                     dst_ip=dst_ip, outport=outport)
+
+
+def multicast_flow_mod(datapath, src_ip, dst_ip, inport, outports):
+    fields = {'src_ip': 'ipv4', 'dst_ip': 'ipv4', 'inport': 'port'}
+    values = {'src_ip': src_ip, 'dst_ip': dst_ip, 'inport': inport}
+    for i, port in enumerate(outports):
+        fields['out_port_%d' % i] = 'port'
+        values['out_port_%d' % i] = port
+    return FlowModTemplates().render(('multicast', len(outports)), build_multicast_flow_mod,
+                                     fields, datapath, **values)
+
+
+def user_to_server_flow_mod(datapath, user_ip, server_ip, outport, gateway_ip, server_mac):
+    return FlowModTemplates().render('user_to_server', build_user_to_server_flow_mod,
+                                     USER_TO_SERVER_FIELDS, datapath,
+                                     user_ip=user_ip, server_ip=server_ip, outport=outport,
+                                     gateway_ip=gateway_ip, server_mac=server_mac)
+
+
+def server_to_user_flow_mod(datapath, user_ip, server_ip, outport,
+                            gateway_ip, gateway_mac, user_mac):
+    return FlowModTemplates().render('server_to_user', build_server_to_user_flow_mod,
+                                     SERVER_TO_USER_FIELDS, datapath,
+                                     user_ip=user_ip, server_ip=server_ip, outport=outport,
+                                     gateway_ip=gateway_ip, gateway_mac=gateway_mac,
+                                     user_mac=user_mac)
@@ -0,0 +1,161 @@
+import heapq
+import logging
+import time
+
+from threading import Lock
+
+from ryu.lib import hub
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(object):
+    __slots__ = ('requested', 'expire', 'link_list', 'link_cost', 'topology')
+
+    def __init__(self, requested, expire):
+        self.requested = requested
+        self.expire = expire
+        # path deployed for the request and topology version it was
+        # calculated at, None until deployed
+        self.link_list = None
+        self.link_cost = None
+        self.topology = None
+
+
+class RequestCache(object):
+    """
+        bounded cache of route requests: {(src_ip, dst_ip): CacheEntry}.
+
+        a packet-in of a pair requested less than request_timeout ago is
+        ignored, its task is pending or its flow entries on the way.  the
+        path deployed for the pair is kept with the topology version
+        (LinkStateEpoch().topology) it was calculated at, a later request
+        with no link added, deleted or configured since deploys it again
+        without route calculation.  band changes polled by the link
+        monitor do not invalidate it, they are too frequent to ever see
+        a request again after request_timeout.
+
+        an entry expires ttl after its last request, through a heap of
+        (expire time, key) holding one item per entry: a requested entry
+        only moves its expire time, its item is pushed back when popped
+        early.  beyond capacity the entries closest to expiry are evicted.
+        the clock is read once per tick by the expiry thread, not per
+        packet-in.
+    """
+
+    def __init__(self, capacity, ttl, request_timeout, tick=1):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.request_timeout = request_timeout
+        self.tick = tick
+        self.entries = {}
+        self.heap = []
+        self.now = time.time()
+        self.lock = Lock()
+        self.thread = None
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.path_hits = 0
+        self.path_stale = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = hub.spawn(self._expire_loop)
+        return self.thread
+
+    def stop(self):
+        if self.thread is not None:
+            hub.kill(self.thread)
+            hub.joinall([self.thread])
+            self.thread = None
+
+    def _expire_loop(self):
+        while True:
+            hub.sleep(self.tick)
+            self.now = time.time()
+            with self.lock:
+                self._expire(self.now)
+
+    def request(self, key, topology, now_time=None):
+        """
+            called on every packet-in of key, return (new, link_list, link_cost):
+            new is False for a request to ignore, link_list is the cached
+            path still valid at topology version, or None.
+        """
+        if now_time is None:
+            now_time = self.now
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now_time - entry.requested < self.request_timeout:
+                self.hits += 1
+                return False, None, None
+
+            self.misses += 1
+            if entry is None:
+                entry = CacheEntry(now_time, now_time + self.ttl)
+                self.entries[key] = entry
+                heapq.heappush(self.heap, (entry.expire, key))
+                while len(self.entries) > self.capacity:
+                    self._pop_oldest()
+                    self.evicted += 1
+                return True, None, None
+
+            entry.requested = now_time
+            entry.expire = now_time + self.ttl
+            if entry.link_list is None:
+                return True, None, None
+            if entry.topology != topology:
+                self.path_stale += 1
+                return True, None, None
+            self.path_hits += 1
+            return True, entry.link_list, entry.link_cost
+
+    def put_path(self, key, link_list, link_cost, topology):
+        """keep the path deployed for the request key."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry.link_list = link_list
+            entry.link_cost = link_cost
+            entry.topology = topology
+
+    def _pop_oldest(self):
+        """remove and return the key of the entry closest to expiry."""
+        while True:
+            expire, key = heapq.heappop(self.heap)
+            entry = self.entries[key]
+            if entry.expire > expire:
+                heapq.heappush(self.heap, (entry.expire, key))
+                continue
+            del self.entries[key]
+            return key
+
+    def _expire(self, now_time):
+        while self.heap and self.heap[0][0] <= now_time:
+            expire, key = heapq.heappop(self.heap)
+            entry = self.entries[key]
+            if entry.expire > expire:
+                heapq.heappush(self.heap, (entry.expire, key))
+                continue
+            del self.entries[key]
+            self.expired += 1
+
+    def stats(self):
+        return {'entries': len(self.entries),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'paths': sum(1 for entry in self.entries.values() if entry.link_list is not None),
+                'hits': self.hits,
+                'misses': self.misses,
+                'path_hits': self.path_hits,
+                'path_stale': self.path_stale,
+                'expired': self.expired,
+                'evicted': self.evicted}
@@ -7,6 +7,7 @@ import networkx as nx
 
 from lib.project_lib import Megabits
 from topology_manage.object.link import LinkTableApi
+from link_monitor.link_state import LinkStateLog
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
 logging.basicConfig(format=FORMAT)
@@ -246,6 +247,10 @@ class MOEA(object):
 
         self.nodes = []
         self.edges = []
+        # position of link (src_dpid, dst_dpid) in self.edges
+        self.edge_num = {}
+        # LinkStateLog sequence number self.edges is up to date with
+        self.link_state_seq = None
 
         self.num_nodes = 0
         self.num_edges = 0
@@ -277,27 +282,17 @@ class MOEA(object):
 
         self.switch_queue = switches.keys()
         self.link_queue = links.keys()
+        switch_index = dict((dpid, index) for index, dpid in enumerate(self.switch_queue))
 
-        for dpid, sw in switches.items():
-            index = self.switch_queue.index(dpid)
-            neighbors_dpid = sw.neighbors.keys()
-            neighbors_index = []
-            for i in neighbors_dpid:
-                neighbors_index.append(self.switch_queue.index(i))
+        self.nodes = []
+        for index, dpid in enumerate(self.switch_queue):
+            neighbors_index = [switch_index[i] for i in switches[dpid].neighbors.keys()]
 
             node = Node(index, len(neighbors_index), neighbors_index)
             self.nodes.append(node)
 
-        for dpids, link in links.items():
-            index = self.link_queue.index((dpids[0], dpids[1]))
-            value = link.values()[0]
-            src = dpids[0]
-            dst = dpids[1]
-
-            loss = float(value.pkt_loss) / 100.0
-
-            edge = Edge(index, src, dst, float(value.delay), float(value.total_band), loss)
-            self.edges.append(edge)
+        self._load_edges(links)
+        self.link_state_seq = None
 
         self.num_nodes = self.nodes.__len__()
         self.num_edges = self.edges.__len__()
@@ -306,28 +301,34 @@ class MOEA(object):
     def update_link_status(self, links):
         assert isinstance(links, LinkTableApi)
 
-        self.edges = []
-
-        for dpids, link in links.items():
-            index = self.link_queue.index((dpids[0], dpids[1]))
-            src = dpids[0]
-            dst = dpids[1]
+        changed, self.link_state_seq = LinkStateLog().changed_since(self.link_state_seq)
+        if changed is None or not self.edges:
+            self._load_edges(links)
+        else:
+            # only links changed by the link monitor since last update
+            for dpids in changed:
+                index = self.edge_num.get(dpids)
+                link = links.get(dpids)
+                if index is None or not link:
+                    continue
+                self._set_edge_status(self.edges[index], link.values()[0])
 
-            value = link.values()[0]
+        self.num_edges = self.edges.__len__()
 
-            loss = float(value.pkt_loss) / 100.0
 
-            edge = Edge(index, src, dst, float(value.delay), float(value.total_band), loss)
+    def _load_edges(self, links):
+        self.edges = []
+        self.edge_num = {}
+        for index, (dpids, link) in enumerate(links.items()):
+            edge = Edge(index, dpids[0], dpids[1], 0.0, 0.0, 0.0)
+            self._set_edge_status(edge, link.values()[0])
             self.edges.append(edge)
+            self.edge_num[dpids] = index
 
-            logger.debug("src_dpid:%s, dst_dpid:%s, available band:%s Mbits, total band:%s Mbits, usage:%s",
-                         dpids[0], dpids[1],
-                         float(value.available_band) / Megabits,
-                         float(value.total_band) / Megabits,
-                         1.0 - float(value.available_band) / float(value.total_band))
-
-        self.num_edges = self.edges.__len__()
-
+    def _set_edge_status(self, edge, value):
+        edge.delay = float(value.delay)
+        edge.band = float(value.total_band)
+        edge.loss = float(value.pkt_loss) / 100.0
 
     def run(self, src_dpid, dst_dpid, min_available_bandwidth):
 
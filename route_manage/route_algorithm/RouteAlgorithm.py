@@ -2,10 +2,14 @@ import logging
 import random
 import json
 import copy
+import heapq
 import networkx as nx
 
 from lib.project_lib import Megabits
 from topology_manage.object.link import LinkTableApi
+from link_monitor.link_state import LinkStateEpoch, LinkStateLog
+from route_manage.route_algorithm.spt_cache import SPTCache
+from route_manage.route_algorithm import ga_fitness
 
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
@@ -24,6 +28,8 @@ class Algorithm(object):
             # num = self.switch_queue.index(dpid)
             # dpid = self.switch_queue[num]
             self.switch_queue = []
+            # num = self.switch_index[dpid]
+            self.switch_index = {}
 
             # map of edge (src_dpid, dst_dpid) and serial number:
             # num = self.edge_queue.index((src_dpid, dst_dpid))
@@ -48,6 +54,11 @@ class Algorithm(object):
             # link cache by GA: {(src_num, dst_num):[]}
             self.link_cache = {}
 
+            # position of edge (src_dpid, dst_dpid) in self.edges and
+            # the LinkStateLog sequence number self.edges is up to date with
+            self.edge_num = {}
+            self.link_state_seq = None
+
     def get_link(self, src, dst, link_type=None):
         pass
 
@@ -66,6 +77,51 @@ class Algorithm(object):
     def update_param(self, data):
         pass
 
+    def _edge_status(self, ev):
+        """link status of an edge, the fields after [0, src_num, dst_num]."""
+        return [float(ev.delay), float(ev.cost),
+                float(ev.available_band), float(ev.total_band)]
+
+    def _init_switch_index(self, switches, links):
+        self.switch_queue = switches.keys()
+        self.edge_queue = links.keys()
+        self.switch_index = dict((dpid, num) for num, dpid in enumerate(self.switch_queue))
+        self.edge_num = {}
+        self.link_state_seq = None
+
+    def _refresh_edges(self, links):
+        """
+            bring self.edges up to date with links.
+            only the edges of links changed since the last call (as logged
+            by the link monitor) are updated in place, their numbers are
+            returned; None is returned when every edge had to be reloaded.
+        """
+        changed, self.link_state_seq = LinkStateLog().changed_since(self.link_state_seq)
+
+        if changed is None or not self.edges:
+            self.edges = []
+            self.edge_num = {}
+            for dpids, edge in links.items():
+                src_num = self.switch_index[dpids[0]]
+                dst_num = self.switch_index[dpids[1]]
+                ev = edge.values()[0]
+                self.edge_collection[(src_num, dst_num)] = ev
+                self.edge_num[dpids] = len(self.edges)
+                self.edges.append([0, src_num, dst_num] + self._edge_status(ev))
+            return None
+
+        nums = []
+        for dpids in changed:
+            num = self.edge_num.get(dpids)
+            edge = links.get(dpids)
+            if num is None or not edge:
+                continue
+            ev = edge.values()[0]
+            self.edge_collection[(self.edges[num][1], self.edges[num][2])] = ev
+            self.edges[num][3:] = self._edge_status(ev)
+            nums.append(num)
+        return nums
+
     def _check_link_logic(self, link_list):
         for i in list(range(len(link_list)-1)):
             neighbors = self.vertexs[link_list[i]][1]
@@ -78,7 +134,8 @@ class Algorithm(object):
 
 class GAPopulation(Algorithm):
     def __init__(self, delay_coefficient=5000, cost_coefficient=0.02, bw_load_coefficient=50,
-                 generation_max=20, max_hop=6, crossover_probability=0.7, mutation_probability=0.1):
+                 generation_max=20, max_hop=6, crossover_probability=0.7, mutation_probability=0.1,
+                 fitness_mode="loop"):
         if not hasattr(self, 'cost_coeffieient'):
             super(GAPopulation, self).__init__()
 
@@ -92,6 +149,11 @@ class GAPopulation(Algorithm):
             self.crossover_probability = float(crossover_probability)
             self.mutation_probability = float(mutation_probability)
 
+            # "loop": fitness_evaluate, "vector": one numpy computation
+            # over the whole population with self.edge_arrays
+            self.fitness_mode = fitness_mode
+            self.edge_arrays = None
+
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance'):
             orig = super(GAPopulation, cls)
@@ -139,22 +201,21 @@ class GAPopulation(Algorithm):
         self.link_cache = {}
 
         # update switch/edge queue
-        self.switch_queue = switches.keys()
-        self.edge_queue = links.keys()
+        self._init_switch_index(switches, links)
 
         # update switch neighbors
         for dpid, sw in switches.items():
-            num = self.switch_queue.index(dpid)
+            num = self.switch_index[dpid]
             neighbors_in_dpid = sw.neighbors.keys()
             neighbors_in_num = []
             for n in neighbors_in_dpid:
-                neighbors_in_num.append(self.switch_queue.index(n))
+                neighbors_in_num.append(self.switch_index[n])
             self.switch_neighbors[num] = neighbors_in_num
 
         # init edge collection, ev.available_band = None
         for dpids, edge in links.items():
-            src_num = self.switch_queue.index(dpids[0])
-            dst_num = self.switch_queue.index(dpids[1])
+            src_num = self.switch_index[dpids[0]]
+            dst_num = self.switch_index[dpids[1]]
             ev = edge.values()[0]
             self.edge_collection[(src_num, dst_num)] = ev
             self.edges.append([0, src_num, dst_num,
@@ -170,25 +231,19 @@ class GAPopulation(Algorithm):
                        (edge[1], edge[2]) == (dst_num, src_num):
                         self.vertexs[src_num][2].append(num)
 
+        self.edge_arrays = None
+
     def update_link_status(self, links):
         self.age = 0
 
         assert isinstance(links, LinkTableApi)
 
-        self.edges = []
-        for dpids, edge in links.items():
-            src_num = self.switch_queue.index(dpids[0])
-            dst_num = self.switch_queue.index(dpids[1])
-            ev = edge.values()[0]
-            self.edge_collection[(src_num, dst_num)] = ev
-            self.edges.append([0, src_num, dst_num,
-                               float(ev.delay), float(ev.cost),
-                               float(ev.available_band), float(ev.total_band)])
-            logger.debug("src_dpid:%s, dst_dpid:%s, available band:%s Mbits, total band:%s Mbits, usage:%s",
-                         dpids[0], dpids[1],
-                         float(ev.available_band)/Megabits,
-                         float(ev.total_band)/Megabits,
-                         1.0 - float(ev.available_band) / float(ev.total_band))
+        nums = self._refresh_edges(links)
+        if self.edge_arrays is not None:
+            if nums is None:
+                self.edge_arrays = None
+            else:
+                self.edge_arrays.set_status(self.edges, nums)
 
     def run(self, src_dpid, dst_dpid, min_bandwidth):
         self.evolve(src_dpid, dst_dpid, min_bandwidth)
@@ -219,6 +274,20 @@ class GAPopulation(Algorithm):
                                      self.bw_load_coefficient * bw_load_rate)
         return fitness
 
+    def fitness_evaluate_vector(self, paths, min_bandwidth):
+        """fitness_evaluate of the whole population at once with numpy."""
+        if self.edge_arrays is None:
+            self.edge_arrays = ga_fitness.EdgeArrays(self.vertexs, self.edges)
+        return self.edge_arrays.evaluate(paths, min_bandwidth,
+                                         self.delay_coefficient,
+                                         self.cost_coefficient,
+                                         self.bw_load_coefficient)
+
+    def _fitness(self, min_bandwidth):
+        if self.fitness_mode == "vector":
+            return self.fitness_evaluate_vector(self.links, min_bandwidth)
+        return self.fitness_evaluate(self.links, min_bandwidth, self.vertexs, self.edges)
+
     def init(self, src, dst, max_hop):
         return find_path_dfs(src, dst, max_hop, self.vertexs)
 
@@ -619,18 +688,18 @@ class GAPopulation(Algorithm):
         return new_link
 
     def evolve(self, src_dpid, dst_dpid, min_bandwidth):
-        src_num = self.switch_queue.index(src_dpid)
-        dst_num = self.switch_queue.index(dst_dpid)
+        src_num = self.switch_index[src_dpid]
+        dst_num = self.switch_index[dst_dpid]
         logger.debug("population init")
         self.links = self.init(src_num, dst_num, self.max_hop)
         logger.debug("population age: %s, init links:%s", self.age, self.links)
 
         while True:
-            self.fitness = self.fitness_evaluate(self.links, min_bandwidth, self.vertexs, self.edges)
+            self.fitness = self._fitness(min_bandwidth)
 
             self.links = self.select(self.links, self.fitness)
             logger.debug("population select, links=%s", self.links)
-            self.fitness = self.fitness_evaluate(self.links, min_bandwidth, self.vertexs, self.edges)
+            self.fitness = self._fitness(min_bandwidth)
 
             item = self.links[0]
             if self.links.count(item) == len(self.links):
@@ -665,13 +734,23 @@ class GAPopulation(Algorithm):
                            "generation_max": self.generation_max,
                            "max_hop": self.max_hop,
                            "crossover_probability": self.crossover_probability,
-                           "mutation_probability": self.mutation_probability})
+                           "mutation_probability": self.mutation_probability,
+                           "fitness_mode": self.fitness_mode})
         return body
 
     def update_param(self, data):
         if data["algorithm_type"] != "GA":
             return False
 
+        fitness_mode = data.get("fitness_mode", self.fitness_mode)
+        if fitness_mode not in ("loop", "vector"):
+            logger.info("fitness mode not support: %s", fitness_mode)
+            return False
+        if fitness_mode == "vector" and ga_fitness.np is None:
+            logger.info("fitness mode vector needs numpy.")
+            return False
+        self.fitness_mode = fitness_mode
+
         def update(s, k, p):
             if k in p: return float(p[k])
             else: return s
@@ -707,6 +786,18 @@ class Dijkstra(Algorithm):
             self.cost_coefficient = cost_coefficient
             self.bw_load_coefficient = bw_load_coefficient
 
+            # edge index: {(src_num, dst_num): edge num}, both directions
+            self.edge_index = {}
+
+            # adjacency list with precomputed weights:
+            # adjacency[num] = [(neighbor_num, weight)]
+            self.adjacency = []
+
+            # (topology version, LinkStateLog sequence number) self.edges
+            # and the shortest path trees by source are up to date with
+            self.link_state_epoch = None
+            self.spt_cache = SPTCache()
+
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance'):
             orig = super(Dijkstra, cls)
@@ -714,13 +805,12 @@ class Dijkstra(Algorithm):
         return cls._instance
 
     def get_link(self, src, dst, link_type=None):
-        dst_num = self.switch_queue.index(dst)
+        dst_num = self.switch_index[dst]
 
+        # calculate() returns the path to vertex i at position i
         links_in_num = None
-        for num, link in enumerate(self.links):
-            if dst_num == link[len(link)-1]:
-                links_in_num = self.links[num]
-                break
+        if dst_num < len(self.links):
+            links_in_num = self.links[dst_num]
 
         # handle algorithm failure mode
         if links_in_num is None:
@@ -739,11 +829,9 @@ class Dijkstra(Algorithm):
 
         link_cost = 0
         for i in range(0, len(links_in_num)-1):
-            for e in self.edges:
-                if links_in_num[i] == e[1] and links_in_num[i+1] == e[2] or \
-                   links_in_num[i] == e[2] and links_in_num[i+1] == e[1]:
-                    link_cost += e[4]
-                    break
+            num = self.edge_index.get((links_in_num[i], links_in_num[i+1]))
+            if num is not None:
+                link_cost += self.edges[num][4]
 
         return links_in_dpid, link_cost
 
@@ -767,16 +855,16 @@ class Dijkstra(Algorithm):
         self.link_cache = {}
 
         # update switch/edge queue
-        self.switch_queue = switches.keys()
-        self.edge_queue = links.keys()
+        self._init_switch_index(switches, links)
+        switch_index = self.switch_index
 
         # update switch neighbors
         for dpid, sw in switches.items():
-            num = self.switch_queue.index(dpid)
+            num = switch_index[dpid]
             neighbors_in_dpid = sw.neighbors.keys()
             neighbors_in_num = []
             for n in neighbors_in_dpid:
-                neighbors_in_num.append(self.switch_queue.index(n))
+                neighbors_in_num.append(switch_index[n])
             self.switch_neighbors[num] = neighbors_in_num
 
         # update edge collection
@@ -793,8 +881,8 @@ class Dijkstra(Algorithm):
         Change cost to loss
         '''
         for dpids, edge in links.items():
-            src_num = self.switch_queue.index(dpids[0])
-            dst_num = self.switch_queue.index(dpids[1])
+            src_num = switch_index[dpids[0]]
+            dst_num = switch_index[dpids[1]]
             ev = edge.values()[0]
             self.edge_collection[(src_num, dst_num)] = ev
             self.edges.append([0, src_num, dst_num,
@@ -802,57 +890,91 @@ class Dijkstra(Algorithm):
                                ev.available_band, float(ev.total_band),
                                ev.pkt_loss])
 
+        # {(src_num, dst_num): [edge num]}, both directions
+        edge_nums = {}
+        for num, edge in enumerate(self.edges):
+            edge_nums.setdefault((edge[1], edge[2]), []).append(num)
+            if edge[1] != edge[2]:
+                edge_nums.setdefault((edge[2], edge[1]), []).append(num)
 
         # update self.vertexs
         for src_num, neighbors in self.switch_neighbors.items():
             self.vertexs.append([len(neighbors), neighbors, []])
             for dst_num in neighbors:
-                for num, edge in enumerate(self.edges):
-                    if (edge[1], edge[2]) == (src_num, dst_num) or \
-                       (edge[1], edge[2]) == (dst_num, src_num):
-                        self.vertexs[src_num][2].append(num)
+                self.vertexs[src_num][2].extend(edge_nums.get((src_num, dst_num), []))
+
+        self.link_state_epoch = None
+        self.build_adjacency()
 
     def update_link_status(self, links):
         assert isinstance(links, LinkTableApi)
 
-        self.edges = []
-        # for dpids, edge in links.items():
-        #     src_num = self.switch_queue.index(dpids[0])
-        #     dst_num = self.switch_queue.index(dpids[1])
-        #     ev = edge.values()[0]
-        #     self.edge_collection[(src_num, dst_num)] = ev
-        #     self.edges.append([0, src_num, dst_num,
-        #                        float(ev.delay), float(ev.cost),
-        #                        float(ev.available_band), float(ev.total_band)])
-        #     logger.debug("src_dpid:%s, dst_dpid:%s, available band:%s Mbits, total band:%s Mbits, usage:%s",
-        #                  dpids[0], dpids[1],
-        #                  float(ev.available_band)/Megabits,
-        #                  float(ev.total_band)/Megabits,
-        #                  1.0 - float(ev.available_band) / float(ev.total_band))
+        # links added, deleted or configured: reload every edge, else
+        # only the edges of the links logged by the link monitor
+        topology = LinkStateEpoch().topology
+        if self.link_state_epoch is None or self.link_state_epoch[0] != topology:
+            self.link_state_seq = None
+
+        nums = self._refresh_edges(links)
+        if nums is None or nums or not self.adjacency:
+            self.link_state_epoch = (topology, self.link_state_seq)
+            if nums:
+                self.update_adjacency(nums)
+            else:
+                self.build_adjacency()
 
-        '''
-        Change cost to loss
-        '''
-        for dpids, edge in links.items():
-            src_num = self.switch_queue.index(dpids[0])
-            dst_num = self.switch_queue.index(dpids[1])
-            ev = edge.values()[0]
-            self.edge_collection[(src_num, dst_num)] = ev
-            self.edges.append([0, src_num, dst_num,
-                               float(ev.delay), float(ev.cost),
-                               float(ev.available_band), float(ev.total_band),
-                               ev.pkt_loss])
-            logger.debug("src_dpid:%s, dst_dpid:%s, available band:%s Mbits, total band:%s Mbits, usage:%s",
-                         dpids[0], dpids[1],
-                         float(ev.available_band)/Megabits,
-                         float(ev.total_band)/Megabits,
-                         1.0 - float(ev.available_band) / float(ev.total_band))
+    def _edge_status(self, ev):
+        # Change cost to loss
+        return [float(ev.delay), float(ev.cost),
+                float(ev.available_band), float(ev.total_band),
+                ev.pkt_loss]
 
+    def update_adjacency(self, nums):
+        """
+            recompute the weights around the ends of edges nums only,
+            cached shortest path trees are dropped.
+        """
+        self.spt_cache.invalidate(self.link_state_epoch)
 
+        for num in nums:
+            for src_num in self.edges[num][1:3]:
+                self.adjacency[src_num] = [
+                    (dst_num, self.use_available_bandwidth_mark_weight(src_num, dst_num, self.edges))
+                    for dst_num in self.vertexs[src_num][1]]
+
+    def build_adjacency(self):
+        """
+            index self.edges by vertex pair and precompute the weight of
+            every (vertex, neighbor) pair, called once per link status
+            update instead of scanning self.edges per relaxation.
+            cached shortest path trees are dropped.
+        """
+        self.spt_cache.invalidate(self.link_state_epoch)
+
+        self.edge_index = {}
+        for num, edge in enumerate(self.edges):
+            self.edge_index.setdefault((edge[1], edge[2]), num)
+            self.edge_index.setdefault((edge[2], edge[1]), num)
+
+        self.adjacency = []
+        for vertex in self.vertexs:
+            self.adjacency.append([])
+        for src_num, vertex in enumerate(self.vertexs):
+            for dst_num in vertex[1]:
+                weight = self.use_available_bandwidth_mark_weight(src_num, dst_num, self.edges)
+                self.adjacency[src_num].append((dst_num, weight))
 
     def run(self, src_dpid, dst_dpid, min_bandwidth):
-        src_num = self.switch_queue.index(src_dpid)
-        self.links = self.calculate(src_num, self.vertexs, self.edges)
+        src_num = self.switch_index[src_dpid]
+        if len(self.adjacency) != len(self.vertexs):
+            self.build_adjacency()
+
+        # calculate() covers every destination, reuse the tree of src
+        paths = self.spt_cache.get_tree(src_num, self.link_state_epoch)
+        if paths is None:
+            paths = self.calculate(src_num, self.vertexs, self.edges)
+            self.spt_cache.put_tree(src_num, self.link_state_epoch, paths)
+        self.links = paths
 
     def calculate(self, sou_vertex, vertexs, edges):
         """
@@ -860,57 +982,48 @@ class Dijkstra(Algorithm):
             vertex, such as:
             when source vertex number = 5
             paths = [[5, 6, 7, ..., 1], [5, ..., 4], [5, 8], ..., [5]]
+            binary heap over the adjacency list built by build_adjacency().
         """
-        tag = [0 for i in range(vertexs.__len__())]
-        previous_vertex = [-1 for i in range(vertexs.__len__())]
-        paths_length = [10000 for i in range(vertexs.__len__())]
-        paths = []
+        adjacency = self.adjacency
+        vertex_num = len(vertexs)
+        tag = [False] * vertex_num
+        previous_vertex = [-1] * vertex_num
+        paths_length = [float('inf')] * vertex_num
 
-        vertex_selected = sou_vertex
-        tag[sou_vertex] = 1
         paths_length[sou_vertex] = 0
+        heap = [(0, sou_vertex)]
+        while heap:
+            length, vertex_selected = heapq.heappop(heap)
+            if tag[vertex_selected]:
+                continue
+            tag[vertex_selected] = True
+            for j, weight in adjacency[vertex_selected]:
+                if tag[j]:
+                    continue
+                new_length = length + weight
+                if new_length < paths_length[j]:
+                    paths_length[j] = new_length
+                    previous_vertex[j] = vertex_selected
+                    heapq.heappush(heap, (new_length, j))
 
-        for i in range(vertexs.__len__() - 1):
-            for j in range(vertexs.__len__()):
-                if tag[j] == 0:
-                    min_length = paths_length[j]
-                    record = j
-                    break
-            for j in vertexs[vertex_selected][1]:
-                if tag[j] == 0:
-                    temp = self.use_available_bandwidth_mark_weight(vertex_selected, j, edges)
-                    if paths_length[vertex_selected] + temp < paths_length[j]:
-                        paths_length[j] = paths_length[vertex_selected] + temp
-                        previous_vertex[j] = vertex_selected
-            for j in range(vertexs.__len__()):
-                if tag[j] == 0:
-                    if paths_length[j] < min_length:
-                        min_length = paths_length[j]
-                        record = j
-            vertex_selected = record
-            tag[vertex_selected] = 1
-        for i in range(vertexs.__len__()):
-            paths.append([i])
+        paths = []
+        for i in range(vertex_num):
+            path = [i]
             j = i
             while not previous_vertex[j] == -1:
                 j = previous_vertex[j]
-                paths[i].insert(0, j)
+                path.append(j)
+            path.reverse()
+            paths.append(path)
         return paths
 
     def use_available_bandwidth_mark_weight(self, vertex1, vertex2, edges):
-        for i in range(edges.__len__()):
-            if vertex1 == edges[i][1]:
-                if vertex2 == edges[i][2]:
-                    rval = (self.delay_coefficient * edges[i][3] +
-                            self.cost_coefficient * edges[i][4] +
-                            self.bw_load_coefficient * (1-edges[i][5]/edges[i][6]))
-                    return rval
-            if vertex2 == edges[i][1]:
-                if vertex1 == edges[i][2]:
-                    rval = (self.delay_coefficient * edges[i][3] +
-                            self.cost_coefficient * edges[i][4] +
-                            self.bw_load_coefficient * (1-edges[i][5]/edges[i][6]))
-                    return rval
+        num = self.edge_index.get((vertex1, vertex2))
+        if num is not None:
+            edge = edges[num]
+            return (self.delay_coefficient * edge[3] +
+                    self.cost_coefficient * edge[4] +
+                    self.bw_load_coefficient * (1-edge[5]/edge[6]))
         return 2 * (self.delay_coefficient * 1 +
                     self.cost_coefficient * 100 +
                     self.bw_load_coefficient * 1)
@@ -932,6 +1045,7 @@ class Dijkstra(Algorithm):
         self.delay_coefficient = update(self.delay_coefficient, "delay_coefficient", data)
         self.cost_coefficient = update(self.cost_coefficient, "cost_coefficient", data)
         self.bw_load_coefficient = update(self.bw_load_coefficient, "bw_load_coefficient", data)
+        self.build_adjacency()
         return True
 
 
@@ -990,6 +1104,12 @@ class RouteAlgorithm(object):
 
         self.nodes = []
         self.edges = []
+        # position of link (src_dpid, dst_dpid) in self.edges
+        self.edge_num = {}
+        # LinkStateLog sequence number self.edges is up to date with
+        self.link_state_seq = None
+        # networkx graph of self.edges, built by main()
+        self.graph = None
 
         self.num_nodes = 0
         self.num_edges = 0
@@ -1019,27 +1139,17 @@ class RouteAlgorithm(object):
 
         self.switch_queue = switches.keys()
         self.link_queue = links.keys()
+        switch_index = dict((dpid, index) for index, dpid in enumerate(self.switch_queue))
 
-        for dpid, sw in switches.items():
-            index = self.switch_queue.index(dpid)
-            neighbors_dpid = sw.neighbors.keys()
-            neighbors_index = []
-            for i in neighbors_dpid:
-                neighbors_index.append(self.switch_queue.index(i))
+        self.nodes = []
+        for index, dpid in enumerate(self.switch_queue):
+            neighbors_index = [switch_index[i] for i in switches[dpid].neighbors.keys()]
 
             node = Node(index, len(neighbors_index), neighbors_index)
             self.nodes.append(node)
 
-        for dpids, link in links.items():
-            index = self.link_queue.index((dpids[0], dpids[1]))
-            value = link.values()[0]
-            src = dpids[0]
-            dst = dpids[1]
-
-            loss = float(value.pkt_loss) / 100.0
-
-            edge = Edge(index, src, dst, float(value.delay), float(value.total_band), loss)
-            self.edges.append(edge)
+        self._load_edges(links)
+        self.link_state_seq = None
 
         self.num_nodes = self.nodes.__len__()
         self.num_edges = self.edges.__len__()
@@ -1049,27 +1159,37 @@ class RouteAlgorithm(object):
     def update_link_status(self, links):
         assert isinstance(links, LinkTableApi)
 
-        self.edges = []
-
-        for dpids, link in links.items():
-            index = self.link_queue.index((dpids[0], dpids[1]))
-            src = dpids[0]
-            dst = dpids[1]
-
-            value = link.values()[0]
+        changed, self.link_state_seq = LinkStateLog().changed_since(self.link_state_seq)
+        if changed is None or not self.edges:
+            self._load_edges(links)
+        else:
+            # only links changed by the link monitor since last update
+            for dpids in changed:
+                index = self.edge_num.get(dpids)
+                link = links.get(dpids)
+                if index is None or not link:
+                    continue
+                self._set_edge_status(self.edges[index], link.values()[0])
 
-            loss = float(value.pkt_loss) / 100.0
+        self.num_edges = self.edges.__len__()
 
-            edge = Edge(index, src, dst, float(value.delay), float(value.total_band), loss)
+    def _load_edges(self, links):
+        self.edges = []
+        self.edge_num = {}
+        for index, (dpids, link) in enumerate(links.items()):
+            edge = Edge(index, dpids[0], dpids[1], 0.0, 0.0, 0.0)
+            self._set_edge_status(edge, link.values()[0])
             self.edges.append(edge)
+            self.edge_num[dpids] = index
+        self.graph = None
 
-            logger.debug("src_dpid:%s, dst_dpid:%s, available band:%s Mbits, total band:%s Mbits, usage:%s",
-                         dpids[0], dpids[1],
-                         float(value.available_band) / Megabits,
-                         float(value.total_band) / Megabits,
-                         1.0 - float(value.available_band) / float(value.total_band))
-
-        self.num_edges = self.edges.__len__()
+    def _set_edge_status(self, edge, value):
+        edge.delay = float(value.delay)
+        edge.band = float(value.total_band)
+        edge.loss = float(value.pkt_loss) / 100.0
+        if self.graph is not None:
+            self.graph.edge[edge.src][edge.dst].update(
+                delay=edge.delay, band=edge.band, loss=edge.loss)
 
     def run(self, src_dpid, dst_dpid, min_available_bandwidth):
 
@@ -1091,10 +1211,13 @@ class RouteAlgorithm(object):
         return self.path, self.delay
 
     def main(self):
-        graph = nx.Graph()
-
-        for edge in self.edges:
-            graph.add_edge(edge.src, edge.dst, delay=edge.delay, band=edge.band, loss=edge.loss)
+        # the graph is kept between requests, update_link_status
+        # changes the attributes of its edges in place
+        if self.graph is None:
+            self.graph = nx.Graph()
+            for edge in self.edges:
+                self.graph.add_edge(edge.src, edge.dst, delay=edge.delay, band=edge.band, loss=edge.loss)
+        graph = self.graph
 
         if random.random() < 0.5:
             path = nx.dijkstra_path(graph, self.src_node, self.dst_node, weight='delay')
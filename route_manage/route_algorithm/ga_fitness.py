@@ -0,0 +1,77 @@
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# fitness of a path using an edge with less available band than requested
+INFEASIBLE_FITNESS = -1000
+
+
+class EdgeArrays(object):
+    """
+        numpy copy of GAPopulation vertexs/edges for batched fitness.
+
+        edge_matrix[src_num, dst_num] is the edge num of a link, -1 when
+        there is none.  both the matrix and the edge attribute arrays
+        carry one extra padding slot at index -1, so a population padded
+        with -1 after the end of each path maps its missing hops to an
+        edge with no delay, cost or load that is always feasible.
+    """
+
+    def __init__(self, vertexs, edges):
+        num = len(vertexs)
+        self.edge_matrix = np.full((num + 1, num + 1), -1, dtype=np.int32)
+        for e, edge in enumerate(edges):
+            self.edge_matrix[edge[1], edge[2]] = e
+            self.edge_matrix[edge[2], edge[1]] = e
+
+        size = len(edges) + 1
+        self.delay = np.zeros(size)
+        self.cost = np.zeros(size)
+        self.bw_load_rate = np.zeros(size)
+        self.available_band = np.zeros(size)
+        self.available_band[-1] = np.inf
+
+        self.set_status(edges)
+
+    def set_status(self, edges, nums=None):
+        """copy link status of edges nums (all edges if None) from edges."""
+        if nums is None:
+            nums = range(len(edges))
+        for e in nums:
+            edge = edges[e]
+            self.delay[e] = edge[3]
+            self.cost[e] = edge[4]
+            self.bw_load_rate[e] = 1 - edge[5] / edge[6]
+            self.available_band[e] = edge[5]
+
+    def encode(self, paths):
+        """return paths as a matrix of vertex nums padded with -1."""
+        width = max(len(p) for p in paths)
+        return np.array([p + [-1] * (width - len(p)) for p in paths],
+                        dtype=np.int32)
+
+    def evaluate(self, paths, min_bandwidth, delay_coefficient,
+                 cost_coefficient, bw_load_coefficient):
+        """same result as GAPopulation.fitness_evaluate for the whole population."""
+        if not paths:
+            return []
+        population = self.encode(paths)
+        hops = self.edge_matrix[population[:, :-1], population[:, 1:]]
+
+        delay = self.delay[hops].sum(axis=1)
+        cost = self.cost[hops].sum(axis=1)
+        bw_load_rate = self.bw_load_rate[hops].sum(axis=1)
+
+        fitness = 10.0 / (delay_coefficient * delay +
+                          cost_coefficient * cost +
+                          bw_load_coefficient * bw_load_rate)
+        fitness[(self.available_band[hops] < min_bandwidth).any(axis=1)] = INFEASIBLE_FITNESS
+        return fitness.tolist()
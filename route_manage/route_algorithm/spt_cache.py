@@ -0,0 +1,43 @@
+class SPTCache(dict):
+    """
+        shortest path trees by source vertex: {src_num: paths}.
+
+        every tree belongs to the link state epoch it was calculated
+        at; looking up with a newer epoch drops the whole cache.
+    """
+
+    def __init__(self):
+        super(SPTCache, self).__init__()
+        self.epoch = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_tree(self, src_num, epoch):
+        if epoch != self.epoch:
+            self.invalidate(epoch)
+        paths = self.get(src_num)
+        if paths is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return paths
+
+    def put_tree(self, src_num, epoch, paths):
+        if epoch != self.epoch:
+            self.invalidate(epoch)
+        self[src_num] = paths
+
+    def invalidate(self, epoch=None):
+        if self:
+            self.invalidations += 1
+        self.clear()
+        self.epoch = epoch
+
+    def to_dict(self):
+        return {'epoch': self.epoch,
+                'size': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations}
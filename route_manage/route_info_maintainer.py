@@ -1,11 +1,22 @@
+import time
 import logging
 
+from collections import deque
+from threading import Lock
+
+from base.parameters import FLOW_HARD_TIMEOUT, FLOW_REGISTRY_MAX_FLOWS
+
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
 logging.basicConfig(format=FORMAT)
 logger = logging.getLogger(__name__)
 
 
 class RequestInfo(object):
+    __slots__ = ('request_type', 'network_layer_type', 'transport_layer_type',
+                 'src_datapath', 'src_dpid', 'src_mac', 'src_ip', 'src_port_no',
+                 'dst_datapath', 'dst_dpid', 'dst_mac', 'dst_ip', 'dst_port_no',
+                 'switches')
+
     def __init__(self, request_type=None, network_layer_type=None, transport_layer_type=None,
                  src_datapath=None, src_dpid=None, src_mac=None, src_ip=None, src_port_no=None,
                  dst_datapath=None, dst_dpid=None, dst_mac=None, dst_ip=None, dst_port_no=None,
@@ -26,18 +37,115 @@ class RequestInfo(object):
         self.switches = switches
 
 
+class FlowRecord(object):
+    """
+        a deployed unicast route, the RequestInfo and the task entry
+        handed to fault recovery are only built for the affected flows,
+        from the class, route type and extra constructor arguments of the
+        entry that deployed it.
+    """
+    __slots__ = ('flow_id', 'src_dpid', 'src_ip', 'src_port_no',
+                 'dst_dpid', 'dst_ip', 'dst_port_no', 'path', 'backup_path',
+                 'entry_type', 'route_type', 'entry_args', 'timestamp', 'removed')
+
+    # bits of removed, ingress entries reported removed by the switches
+    SRC_TO_DST = 1
+    DST_TO_SRC = 2
+
+    def __init__(self, flow_id, src_dpid, src_ip, src_port_no, dst_dpid, dst_ip, dst_port_no,
+                 path, timestamp, backup_path=None, entry_type=None, route_type=None,
+                 entry_args=()):
+        self.flow_id = flow_id
+        self.src_dpid = src_dpid
+        self.src_ip = src_ip
+        self.src_port_no = src_port_no
+        self.dst_dpid = dst_dpid
+        self.dst_ip = dst_ip
+        self.dst_port_no = dst_port_no
+        self.path = path
+        self.backup_path = backup_path
+        self.entry_type = entry_type
+        self.route_type = route_type
+        self.entry_args = entry_args
+        self.timestamp = timestamp
+        self.removed = 0
+
+    def links(self):
+        return [link_key(self.path[i], self.path[i + 1]) for i in range(len(self.path) - 1)]
+
+    def ports(self):
+        return [(self.src_dpid, self.src_port_no), (self.dst_dpid, self.dst_port_no)]
+
+    def request(self, switches=None):
+        return RequestInfo(src_dpid=self.src_dpid, src_ip=self.src_ip, src_port_no=self.src_port_no,
+                           dst_dpid=self.dst_dpid, dst_ip=self.dst_ip, dst_port_no=self.dst_port_no,
+                           switches=switches)
+
+    def task_entry(self, route_manage):
+        """a new task entry of the route, None if registered without one."""
+        if self.entry_type is None:
+            return None
+        entry = self.entry_type(self.route_type, self.src_dpid, self.src_ip, self.src_port_no,
+                                self.dst_dpid, self.dst_ip, self.dst_port_no,
+                                route_manage, *self.entry_args)
+        entry.flow_id = self.flow_id
+        if self.backup_path is not None:
+            entry.backup_path = list(self.backup_path)
+        return entry
+
+
+def link_key(src_dpid, dst_dpid):
+    """index key of a link, the same for both directions."""
+    if src_dpid <= dst_dpid:
+        return src_dpid, dst_dpid
+    return dst_dpid, src_dpid
+
+
 class RouteInfoMaintainer(object):
-    # singleton class, used to maintain the route information
-    _instances = 0
+    """
+        singleton registry of deployed unicast routes for fault recovery.
+
+        flows: {flow id: FlowRecord}, flow_ids: {(src_ip, dst_ip): flow id},
+        indexed by the links of their path: {link_key: set(flow id)} and
+        by their end ports: {(dpid, port_no): set(flow id)}, so the flows
+        of a failed link or port are found in time proportional to their
+        number.
+
+        the paths of the flows are interned and reference counted, a path
+        is dropped with its last flow.
+
+        a flow is unregistered when it is deployed again, when the
+        switches report both its ingress entries removed, FLOW_HARD_TIMEOUT
+        after deployment at the latest, or oldest first beyond
+        FLOW_REGISTRY_MAX_FLOWS flows.
+    """
 
     def __init__(self, *args, **kwargs):
-        if not hasattr(self, 'request_info_dic'):
-            # explanation of self.request_info_dic: {link:(request,path)}
-            self.request_info_dic = {}
-            self.request_info_dic_port = {}
-            
+        if not hasattr(self, 'flows'):
+            self.flows = {}
+            self.flow_ids = {}
+            self.link_index = {}
+            self.port_index = {}
+            # path tuples shared by the flows of the same path and backup
+            # path: {path: [path, number of flows]}
+            self.paths = {}
+            # flow ids in registration order, unregistered ids are skipped
+            self.order = deque()
+            self.next_flow_id = 0
+            self.max_flows = FLOW_REGISTRY_MAX_FLOWS
+            self.timeout = FLOW_HARD_TIMEOUT
+            self.switches = None
+            self.route_manage = None
+            self.lock = Lock()
+
+            # paths of the 'old' store method, scanned on every failure
             self.link_path_old = []
-        pass
+
+            # counters
+            self.registered = 0
+            self.removed = 0
+            self.expired = 0
+            self.evicted = 0
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance'):
@@ -54,97 +162,157 @@ class RouteInfoMaintainer(object):
         :param link_list: route path result
         :return:
         """
-        request_info = RequestInfo(request_type=None, network_layer_type=None, transport_layer_type=None,
-                                   src_datapath=None, src_dpid=task_entry.src_dpid, src_mac=None,
-                                   src_ip=task_entry.src_ip, src_port_no=task_entry.src_port_no,
-                                   dst_datapath=None, dst_dpid=task_entry.dst_dpid,
-                                   dst_mac=None, dst_ip=task_entry.dst_ip, dst_port_no=task_entry.dst_port_no,
-                                   switches=route_manage.switches)
-        route_info = {'path': link_list,
-                      'request': request_info,
-                      'task_entry': task_entry}
-
-        # self.update_request_info_for_link(fault_recovery, route_info)
-        # self.update_request_info_for_ports(route_manage, route_info)
-
-    def update_request_info_for_link(self, fault_recovery, route_info):
-        if fault_recovery.DATA_STORE_METHOD == fault_recovery.IMPROVED_STORE_METHOD:
-            self._update_route_info(route_info)
-        elif fault_recovery.DATA_STORE_METHOD == fault_recovery.OLD_STORE_METHOD:
-            self._update_route_info_old(route_info)
-
-        logger.debug('instance of route_info_maintainer in RouteManage is: ', self)
-
-    def update_request_info_for_ports(self, route_manage, route_info):
-        switches = route_manage.switches
-
-        fault_classifier = route_manage.fault_classifier
-
-        link_list = route_info['path']
-        task_entry = route_info['task_entry']
-
-        if len(link_list) == 1:
-            dpid = switches.get_switch(link_list[0]).dp.id
-            dst_port_index = (dpid, task_entry.dst_port_no)
-            if dst_port_index in fault_classifier.edge_switch_to_server_ports:
-                self._update_route_info_port(dst_port_index, route_info)
-        elif len(link_list) > 1:
-            sw1 = switches.get_switch(link_list[0])
-            sw2 = switches.get_switch(link_list[len(link_list) - 1])
-            src_dpid = sw1.dp.id
-            dst_dpid = sw2.dp.id
-            dst_port_index = (dst_dpid, task_entry.dst_port_no)
-            src_port_index = (src_dpid, task_entry.src_port_no)
-            if dst_port_index in fault_classifier.edge_switch_to_server_ports:
-                self._update_route_info_port(dst_port_index, route_info)
-            elif src_port_index in fault_classifier.edge_switch_to_server_ports:
-                self._update_route_info_port(src_port_index, route_info)
-        else:
-            logger.debug("None port modified!!")
-
-    def get_route_info(self):
-        logger.debug('get route info, request_info_dic is: %s', self.request_info_dic)
-        return self.request_info_dic
-
-    def get_route_info_by_port(self):
-        logger.debug('get route info, request_info_dic_port is: %s', self.request_info_dic_port)
-        return self.request_info_dic_port
+        self.switches = route_manage.switches
+        self.route_manage = route_manage
+        if fault_recovery.DATA_STORE_METHOD == fault_recovery.OLD_STORE_METHOD:
+            self.link_path_old.append(link_list)
+            return
+
+        self.register(task_entry.src_dpid, task_entry.src_ip, task_entry.src_port_no,
+                      task_entry.dst_dpid, task_entry.dst_ip, task_entry.dst_port_no,
+                      link_list, task_entry)
+
+    def register(self, src_dpid, src_ip, src_port_no, dst_dpid, dst_ip, dst_port_no,
+                 path, task_entry=None, now_time=None):
+        """register a deployed route, replacing the former one of the pair."""
+        if now_time is None:
+            now_time = time.time()
+
+        with self.lock:
+            self._expire(now_time)
+
+            # the former route of the task or of the pair, in either way,
+            # flow ids are not reused
+            former = [getattr(task_entry, 'flow_id', None),
+                      self.flow_ids.get((src_ip, dst_ip)),
+                      self.flow_ids.get((dst_ip, src_ip))]
+            for flow_id in former:
+                if flow_id in self.flows:
+                    self._unregister(flow_id)
+
+            flow_id = self.next_flow_id
+            self.next_flow_id += 1
+            record = FlowRecord(flow_id, src_dpid, src_ip, src_port_no, dst_dpid, dst_ip, dst_port_no,
+                                self._intern(path), now_time)
+            if task_entry is not None:
+                record.backup_path = self._intern(getattr(task_entry, 'backup_path', None))
+                record.entry_type = type(task_entry)
+                record.route_type = task_entry.route_type
+                record.entry_args = task_entry.entry_args()
+            self.flows[flow_id] = record
+            self.flow_ids[(src_ip, dst_ip)] = flow_id
+            for key in record.links():
+                self.link_index.setdefault(key, set()).add(flow_id)
+            for key in record.ports():
+                self.port_index.setdefault(key, set()).add(flow_id)
+            self.order.append(flow_id)
+            if task_entry is not None:
+                task_entry.flow_id = flow_id
+            self.registered += 1
+
+            while len(self.flows) > self.max_flows:
+                self._unregister(self._oldest())
+                self.evicted += 1
+            # drop the ids of flows unregistered out of order
+            if len(self.order) > 2 * len(self.flows) + 1024:
+                self.order = deque(i for i in self.order if i in self.flows)
+        return flow_id
+
+    def _oldest(self):
+        while self.order[0] not in self.flows:
+            self.order.popleft()
+        return self.order.popleft()
+
+    def _expire(self, now_time):
+        while self.order:
+            record = self.flows.get(self.order[0])
+            if record is not None and now_time - record.timestamp < self.timeout:
+                return
+            self.order.popleft()
+            if record is not None:
+                self._unregister(record.flow_id)
+                self.expired += 1
+
+    def _intern(self, path):
+        if path is None:
+            return None
+        path = tuple(path)
+        interned = self.paths.get(path)
+        if interned is None:
+            interned = self.paths[path] = [path, 0]
+        interned[1] += 1
+        return interned[0]
+
+    def _release(self, path):
+        if path is None:
+            return
+        interned = self.paths[path]
+        interned[1] -= 1
+        if not interned[1]:
+            del self.paths[path]
+
+    def _unregister(self, flow_id):
+        record = self.flows.pop(flow_id)
+        self._release(record.path)
+        self._release(record.backup_path)
+        if self.flow_ids.get((record.src_ip, record.dst_ip)) == flow_id:
+            del self.flow_ids[(record.src_ip, record.dst_ip)]
+        for index, keys in ((self.link_index, record.links()), (self.port_index, record.ports())):
+            for key in keys:
+                flow_ids = index.get(key)
+                if flow_ids is None:
+                    continue
+                flow_ids.discard(flow_id)
+                if not flow_ids:
+                    del index[key]
+        return record
+
+    def flow_removed(self, src_ip, dst_ip):
+        """
+            called when a switch reports the ingress entry of src_ip ->
+            dst_ip removed, the route is unregistered once both ways are.
+        """
+        with self.lock:
+            flow_id = self.flow_ids.get((src_ip, dst_ip))
+            removed = FlowRecord.SRC_TO_DST
+            if flow_id is None:
+                flow_id = self.flow_ids.get((dst_ip, src_ip))
+                removed = FlowRecord.DST_TO_SRC
+            record = self.flows.get(flow_id)
+            if record is None:
+                return False
+
+            record.removed |= removed
+            if record.removed == FlowRecord.SRC_TO_DST | FlowRecord.DST_TO_SRC:
+                self._unregister(flow_id)
+                self.removed += 1
+            return True
+
+    def _affected(self, flow_ids):
+        records = [self.flows[flow_id] for flow_id in flow_ids or ()]
+        return [(record.request(self.switches), list(record.path),
+                 record.task_entry(self.route_manage))
+                for record in records]
+
+    def get_route_info_by_link(self, src_dpid, dst_dpid):
+        """[(RequestInfo, path, task_entry)] of the routes over the link, in either way."""
+        with self.lock:
+            return self._affected(self.link_index.get(link_key(src_dpid, dst_dpid)))
+
+    def get_route_info_by_port(self, port_index):
+        """[(RequestInfo, path, task_entry)] of the routes ending at (dpid, port_no)."""
+        with self.lock:
+            return self._affected(self.port_index.get(port_index))
 
     def get_route_info_old(self):
         return self.link_path_old
 
-    def _update_route_info(self, route_info):
-        route_request_info = route_info['request']
-        route_path = route_info['path']
-        task_entry = route_info['task_entry']
-        route_path_length = len(route_path)
-
-        for current_switch_index in range(route_path_length-1)[::-1]:
-            current_switch = route_path[current_switch_index]
-            next_switch = route_path[current_switch_index+1]
-            link_path_dic_index = (current_switch, next_switch)
-            if self.request_info_dic in link_path_dic_index:
-                self.request_info_dic[link_path_dic_index].append((route_request_info, route_path, task_entry))
-            else:
-                self.request_info_dic[link_path_dic_index] = [(route_request_info, route_path, task_entry)]
-
-        logger.debug('update route info, request_info_dic is: %s', self.request_info_dic)
-
-    def _update_route_info_old(self, route_info):
-        route_path = route_info['path']
-        self.link_path_old.append(route_path)
-
-    def _update_route_info_port(self, port_index, route_info):
-        route_request_info_list = route_info['request']
-        route_path = route_info['path']
-        task_entry = route_info['task_entry']
-
-        if port_index in self.request_info_dic_port:
-            old_request_info_list = self.request_info_dic_port[port_index]
-            old_request_info_list.append((route_request_info_list, route_path, task_entry))
-            new_request_info_list = old_request_info_list
-            self.request_info_dic_port[port_index] = new_request_info_list
-        else:
-            self.request_info_dic_port[port_index] = [(route_request_info_list, route_path, task_entry)]
-
-        logger.debug('update route info, request_info_dic_port is: %s', self.request_info_dic_port)
+    def stats(self):
+        return {'flows': len(self.flows),
+                'paths': len(self.paths),
+                'links': len(self.link_index),
+                'ports': len(self.port_index),
+                'registered': self.registered,
+                'removed': self.removed,
+                'expired': self.expired,
+                'evicted': self.evicted}
@@ -0,0 +1,192 @@
+import logging
+import json
+import time
+import cPickle
+import multiprocessing
+
+from topology_manage.object.link import Link, LinkTableApi
+from link_monitor.link_state import LinkStateEpoch
+from route_manage.route_algorithm.RouteAlgorithm import GAPopulation, Dijkstra, RouteAlgorithm
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+ALGORITHMS = {'GAPopulation': GAPopulation,
+              'Dijkstra': Dijkstra,
+              'RouteAlgorithm': RouteAlgorithm}
+
+
+class SnapshotSwitch(object):
+    """switch rebuilt from a snapshot, only neighbors are kept."""
+    def __init__(self, neighbors):
+        self.neighbors = neighbors
+
+
+def algorithm_param(algorithm):
+    param_to_dict = getattr(algorithm, 'param_to_dict', None)
+    param = param_to_dict() if param_to_dict else None
+    return json.loads(param) if param else {}
+
+
+class RouteSnapshot(object):
+    """
+        immutable copy of what a unicast algorithm needs to calculate
+        routes: topology, link status and algorithm parameters of one
+        link state epoch.  only plain python types, so it is cheap to
+        pickle and does not hold any datapath.
+    """
+
+    def __init__(self, epoch, algorithm, switches, link_table):
+        self.epoch = epoch
+        self.algorithm_name = algorithm.__class__.__name__
+        self.algorithm_param = algorithm_param(algorithm)
+        # {dpid: {neighbor_dpid: [port_no]}}
+        self.switches = dict((dpid, dict(sw.neighbors)) for dpid, sw in switches.items())
+        # {(src_dpid, dst_dpid): (pkt_loss, total_band, available_band, delay, cost)}
+        self.links = {}
+        for dpids, links in link_table.items():
+            link = links.values()[0]
+            self.links[dpids] = (link.pkt_loss, link.total_band,
+                                 link.available_band, link.delay, link.cost)
+
+    def build_algorithm(self):
+        """return (algorithm initialized with this snapshot, link table)."""
+        switches = dict((dpid, SnapshotSwitch(neighbors))
+                        for dpid, neighbors in self.switches.items())
+        links = LinkTableApi()
+        for dpids, (pkt_loss, total_band, available_band, delay, cost) in self.links.items():
+            links[dpids] = {(0, 0): Link(None, None, pkt_loss=pkt_loss,
+                                         total_band=total_band,
+                                         available_band=available_band,
+                                         delay=delay, cost=cost)}
+
+        algorithm = ALGORITHMS[self.algorithm_name]()
+        algorithm.init_algorithm(switches, links)
+        for key, value in self.algorithm_param.items():
+            setattr(algorithm, key, value)
+        return algorithm, links
+
+
+# algorithm and link table of the last snapshot seen by this worker process
+_worker_state = {'snapshot_id': None, 'algorithm': None, 'links': None}
+
+
+def calculate_routes(snapshot_id, snapshot_data, requests):
+    """
+        run in a worker process.
+        snapshot_id: changes whenever the pickled snapshot_data changes.
+        requests: [(index, src_dpid, dst_dpid, business_type)],
+        return [(index, link_list, link_cost)], link_list is None when
+        the calculation failed.
+    """
+    if _worker_state['snapshot_id'] != snapshot_id:
+        algorithm, links = cPickle.loads(snapshot_data).build_algorithm()
+        _worker_state.update(snapshot_id=snapshot_id, algorithm=algorithm, links=links)
+    algorithm = _worker_state['algorithm']
+    links = _worker_state['links']
+
+    results = []
+    for index, src_dpid, dst_dpid, business_type in requests:
+        try:
+            # same sequence as TaskEntryBase.route_calc
+            algorithm.update_link_status(links)
+            algorithm.run(src_dpid, dst_dpid, business_type)
+            link_list, link_cost = algorithm.get_link(src_dpid, dst_dpid)
+        except Exception:
+            logger.exception("route calculate failed, src:%s, dst:%s", src_dpid, dst_dpid)
+            link_list, link_cost = None, None
+        results.append((index, link_list, link_cost))
+    return results
+
+
+class RoutePool(object):
+    """
+        multiprocessing pool calculating independent unicast requests in
+        parallel.
+
+        the snapshot of the link state is pickled once per epoch (or
+        when the algorithm or its parameters change); every worker
+        rebuilds its algorithm from it only when it sees a new one.
+        calculate() blocks the calling thread until the whole batch is
+        back or timeout expires.
+    """
+
+    def __init__(self, workers, max_batch, timeout):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.pool = None
+
+        # (epoch, algorithm name, algorithm param) of snapshot_data
+        self.snapshot_key = None
+        self.snapshot_data = None
+
+        # counters
+        self.batches = 0
+        self.requests = 0
+        self.snapshots = 0
+        self.failures = 0
+        self.max_batch_time = 0.0
+
+    def start(self):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+            logger.info("route pool start with %d workers", self.workers)
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def update_snapshot(self, algorithm, switches, link_table):
+        key = (LinkStateEpoch().value, algorithm.__class__.__name__,
+               algorithm_param(algorithm))
+        if key != self.snapshot_key or self.snapshot_data is None:
+            snapshot = RouteSnapshot(key[0], algorithm, switches, link_table)
+            self.snapshot_data = cPickle.dumps(snapshot, cPickle.HIGHEST_PROTOCOL)
+            self.snapshot_key = key
+            self.snapshots += 1
+        return self.snapshots, self.snapshot_data
+
+    def calculate(self, algorithm, switches, link_table, requests):
+        """
+            requests: [(src_dpid, dst_dpid, business_type)].
+            return [(link_list, link_cost)] in the order of requests.
+        """
+        self.start()
+        snapshot_id, data = self.update_snapshot(algorithm, switches, link_table)
+        start = time.time()
+
+        indexed = [(i,) + tuple(r) for i, r in enumerate(requests)]
+        chunk = max(1, (len(indexed) + self.workers - 1) / self.workers)
+        async_results = [self.pool.apply_async(calculate_routes, (snapshot_id, data, indexed[i:i+chunk]))
+                         for i in range(0, len(indexed), chunk)]
+
+        results = [(None, None)] * len(requests)
+        for async_result in async_results:
+            try:
+                for index, link_list, link_cost in async_result.get(self.timeout):
+                    results[index] = (link_list, link_cost)
+            except multiprocessing.TimeoutError:
+                logger.error("route pool batch timeout after %ss.", self.timeout)
+                self.failures += 1
+
+        used = time.time() - start
+        self.max_batch_time = max(self.max_batch_time, used)
+        self.batches += 1
+        self.requests += len(requests)
+        return results
+
+    def stats(self):
+        return {'workers': self.workers,
+                'max_batch': self.max_batch,
+                'timeout': self.timeout,
+                'snapshot_epoch': self.snapshot_key[0] if self.snapshot_key else None,
+                'snapshots': self.snapshots,
+                'batches': self.batches,
+                'requests': self.requests,
+                'failures': self.failures,
+                'max_batch_time': self.max_batch_time}
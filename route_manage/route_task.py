@@ -1,19 +1,25 @@
 import time
-import netaddr
+import heapq
 import logging
 
-from threading import Thread
+from collections import deque
+from threading import Thread, Event
 from web_service import ws_event
-from ryu.lib import ofctl_v1_3
 from ryu.lib.dpid import dpid_to_str
-from ryu.ofproto import ether
 
 from base.parameters import BusinessType, DefaultBusinessType
-from base.parameters import server_tcp_port, ROUTE_TASK_HANDLE_INTERVAL
-from base.parameters import FLOW_IDLE_TIMEOUT, FLOW_HARD_TIMEOUT, ROUTE_FLOW_PRIORITY
-from base.parameters import MULTICAST_FLOW_IDLE_TIMEOUT, MULTICAST_FLOW_HARD_TIMEOUT
+from base.parameters import ROUTE_TASK_MAX_RETRY, ROUTE_TASK_RETRY_BACKOFF, ROUTE_TASK_RETRY_BACKOFF_MAX
+from base.parameters import ROUTE_POOL_ENABLE, ROUTE_POOL_WORKERS, ROUTE_POOL_MAX_BATCH, ROUTE_POOL_TIMEOUT
+from base.parameters import ROUTE_BACKUP_PATH
 from link_monitor import link_monitor_main
 from fault_recovery import fault_recovery_main
+from route_manage.route_pool import RoutePool
+from route_manage.flow_deployer import FlowBatch, FlowDeployer
+from route_manage import flow_template
+from route_manage.route_info_maintainer import RouteInfoMaintainer
+from route_manage.backup_path import disjoint_path, FailoverGroups
+from lib.latency_histogram import LatencyHistogram
+from link_monitor.link_state import LinkStateEpoch
 # from route_manage.RouteManage import system_performance_logger
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
@@ -23,79 +29,217 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-class RouteTaskHandler(list):
+def _path_hops(path):
+    """{dpid: (previous dpid, next dpid)} of path, None at its ends."""
+    hops = {}
+    for num, dpid in enumerate(path):
+        hops[dpid] = (path[num-1] if num > 0 else None,
+                      path[num+1] if num < len(path) - 1 else None)
+    return hops
+
+
+class RouteTaskHandler(object):
     """
-        handle route task in queue with window ROUTE_TASK_HANDLE_INTERVAL.
-        merge requests for performance improvement.
+        route task scheduler.
+
+        new tasks are appended to a deque and wake the handler thread up
+        through an event, there is no polling interval.  a task with the
+        same (src_ip, dst_ip) as a pending one is dropped.  a task whose
+        route calculation fails is retried after an exponential backoff
+        without blocking the tasks behind it, and given up after
+        ROUTE_TASK_MAX_RETRY retries.
     """
     def __init__(self, route_manage):
         super(RouteTaskHandler, self).__init__()
 
         self.route_manage = route_manage
-        self.rt_interval = ROUTE_TASK_HANDLE_INTERVAL
+
+        # tasks ready to handle, in arrival order
+        self.tasks = deque()
+        # tasks waiting for retry: [(due time, seq, task)]
+        self.retry_heap = []
+        self.retry_seq = 0
+        # pending tasks: {(src_ip, dst_ip): task}
+        self.pending = {}
+        self.wakeup = Event()
+
+        # counters
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.deployed = 0
+        self.retried = 0
+        self.given_up = 0
+        # enqueue -> compute start, compute, deploy, enqueue -> deploy done
+        self.latency = {'queue': LatencyHistogram(),
+                        'compute': LatencyHistogram(),
+                        'deploy': LatencyHistogram(),
+                        'total': LatencyHistogram()}
+
+        # process pool for unicast route calculation, None for serial mode
+        self.route_pool = None
+        if ROUTE_POOL_ENABLE:
+            self.route_pool = RoutePool(ROUTE_POOL_WORKERS, ROUTE_POOL_MAX_BATCH,
+                                        ROUTE_POOL_TIMEOUT)
+            self.route_pool.start()
 
         self._init_thread()
 
+    def __len__(self):
+        return len(self.pending)
+
     def _init_thread(self):
         """init RouteTaskHandler thread."""
-        logger.info('route task handler thread start with interval %fs', self.rt_interval)
+        logger.info('route task handler thread start')
         gc_thread = Thread(target=self._handle_task)
         gc_thread.setDaemon(True)
         gc_thread.start()
 
     def _handle_task(self):
         """
-            handle the whole task queue, calculate route and deploy flow table.
+            handle the task queue, calculate route and deploy flow table.
         """
         while True:
-            now_time = time.time()
-            for i in list(range(len(self))):
-                # get next undo task.
-                entry = self[0]
-
-                if entry.timestamp < now_time:
-                    if isinstance(entry, RouteTaskEntry) or \
-                       isinstance(entry, NATRouteTaskEntry):
-                        # handle unicast request task.
-                        link_list, link_cost = entry.route_calc()
-                        if link_list is None:
-                            logger.error("route path calculate failed/ no path exist.")
-                            break
-
-                        entry.deploy_flow_table(link_list, link_cost)
-                        # system_performance_logger.handle_req_finish(time.time())
-                        '''
-                        Fault recovery
-                        '''
-
-                        # Update the request information and its route path information for fault_recovery
-                        # self.route_manage.route_info_maintainer.update(self.route_manage, fault_recovery_main,
-                        #                                                entry, link_list)
-                    elif isinstance(entry, MulticastTaskEntry):
-                        # handle multicast request task.
-                        link_list, link_cost = entry.route_calc()
-                        if link_list is None:
-                            break
-
-                        entry.deploy_flow_table(link_list, link_cost)
-
-                    # pop task when is done.
-                    self.pop(0)
-                else:
-                    # when all task timeout done.
-                    break
+            self._wait_task()
+            self._promote_retry(time.time())
+
+            batch = []
+            while self.tasks:
+                batch.append(self.tasks.popleft())
+
+            pool_results = {}
+            if self.route_pool is not None:
+                pool_results = self._calculate_in_pool(batch)
+
+            for entry in batch:
+                try:
+                    self._handle_entry(entry, pool_results)
+                except Exception:
+                    logger.exception("handle %s failed, src:%s, dst:%s",
+                                     entry, entry.src_ip, entry.dst_ip)
+                    self._retry(entry)
+
+    def _wait_task(self):
+        """block until a task is ready or the first retry is due."""
+        timeout = None
+        if self.retry_heap:
+            timeout = max(0.0, self.retry_heap[0][0] - time.time())
+        if not self.tasks:
+            self.wakeup.wait(timeout)
+        self.wakeup.clear()
+
+    def _promote_retry(self, now_time):
+        while self.retry_heap and self.retry_heap[0][0] <= now_time:
+            self.tasks.append(heapq.heappop(self.retry_heap)[2])
+
+    def _handle_entry(self, entry, pool_results):
+        start = time.time()
+        if entry.cached_route is None:
+            entry.topology_version = LinkStateEpoch().topology
+        if id(entry) in pool_results:
+            link_list, link_cost = pool_results[id(entry)]
+            logger.info("src:%s, dst:%s, deploy link:%s, link cost:%s",
+                        entry.src_ip, entry.dst_ip, link_list, link_cost)
+        else:
+            link_list, link_cost = entry.route_calc()
+        computed = time.time()
+
+        if link_list is None:
+            logger.error("route path calculate failed/ no path exist.")
+            self._retry(entry)
+            return
+
+        # registers the route for fault recovery as well
+        if entry.install(link_list, link_cost) and entry.cache_path:
+            self.route_manage.request_cache.put_path((entry.src_ip, entry.dst_ip), link_list,
+                                                     link_cost, entry.topology_version)
+        # system_performance_logger.handle_req_finish(time.time())
+        deployed = time.time()
+
+        self.latency['queue'].record(start - entry.timestamp)
+        self.latency['compute'].record(computed - start)
+        self.latency['deploy'].record(deployed - computed)
+        self.latency['total'].record(deployed - entry.timestamp)
+        self.deployed += 1
+        self._done(entry)
+
+    def _retry(self, entry):
+        entry.retries += 1
+        if entry.retries > ROUTE_TASK_MAX_RETRY:
+            logger.error("give up route task after %d retries, src:%s, dst:%s",
+                         ROUTE_TASK_MAX_RETRY, entry.src_ip, entry.dst_ip)
+            self.given_up += 1
+            self._done(entry)
+            return
+
+        backoff = min(ROUTE_TASK_RETRY_BACKOFF * 2 ** (entry.retries - 1),
+                      ROUTE_TASK_RETRY_BACKOFF_MAX)
+        self.retry_seq += 1
+        heapq.heappush(self.retry_heap, (time.time() + backoff, self.retry_seq, entry))
+        self.retried += 1
+
+    def _done(self, entry):
+        key = (entry.src_ip, entry.dst_ip)
+        if self.pending.get(key) is entry:
+            del self.pending[key]
+
+    def _calculate_in_pool(self, entries):
+        """
+            calculate the unicast tasks of entries in the process pool,
+            flow tables are still deployed by _handle_task in arrival order.
 
-            time.sleep(self.rt_interval)
+            :return: {id(entry): (link_list, link_cost)}
+        """
+        entries = [entry for entry in entries
+                   if (isinstance(entry, RouteTaskEntry) or isinstance(entry, NATRouteTaskEntry)) and
+                   entry.src_dpid != entry.dst_dpid and entry.cached_route is None][:self.route_pool.max_batch]
+
+        # a single task is not worth the round trip
+        if len(entries) < 2:
+            return {}
+
+        requests = [(entry.src_dpid, entry.dst_dpid, entry.get_business_type())
+                    for entry in entries]
+        results = self.route_pool.calculate(self.route_manage.algorithm,
+                                            self.route_manage.switches,
+                                            link_monitor_main.global_link_table,
+                                            requests)
+        return dict((id(entry), result) for entry, result in zip(entries, results))
 
     def update_entry(self, task_entry):
-        """update route task entry."""
-        self.append(task_entry)
+        """
+            add route task entry, return False when the same
+            (src_ip, dst_ip) task is already pending.
+        """
+        key = (task_entry.src_ip, task_entry.dst_ip)
+        if key in self.pending:
+            self.deduplicated += 1
+            return False
+
+        self.pending[key] = task_entry
+        self.tasks.append(task_entry)
+        self.enqueued += 1
+        self.wakeup.set()
+        return True
+
+    def stats(self):
+        return {'pending': len(self.pending),
+                'ready': len(self.tasks),
+                'retry_waiting': len(self.retry_heap),
+                'enqueued': self.enqueued,
+                'deduplicated': self.deduplicated,
+                'deployed': self.deployed,
+                'retried': self.retried,
+                'given_up': self.given_up,
+                'latency': dict((k, v.to_dict()) for k, v in self.latency.items())}
 
 
 class TaskEntryBase(object):
     """
         task entry base class, all task entry inherited from here.
     """
+    # the deployed path is kept in the request cache of RouteManage
+    cache_path = False
+
     def __init__(self, route_type, src_dpid, src_ip, src_port_no,
                  dst_dpid, dst_ip, dst_port_no, route_manage):
         # value in checker should not be None
@@ -110,7 +254,19 @@ class TaskEntryBase(object):
         self.dst_ip = dst_ip
         self.dst_port_no = dst_port_no
         self.timestamp = time.time()
+        self.retries = 0
         self.route_manage = route_manage
+        # FlowMods collected by install(), None when sent one by one
+        self.flow_batch = None
+        self.install_future = None
+        # id in RouteInfoMaintainer of the deployed route
+        self.flow_id = None
+        # backup path installed in fast failover groups, None if unprotected
+        self.backup_path = None
+        # (link_list, link_cost) deployed instead of calculating the route,
+        # and topology version the route was calculated at
+        self.cached_route = None
+        self.topology_version = None
         pass
 
     def __str__(self):
@@ -123,26 +279,76 @@ class TaskEntryBase(object):
 
         :return:
         """
-        if self.src_dpid == self.dst_dpid:
+        if self.cached_route is not None:
+            link_list, link_cost = self.cached_route
+            self.cached_route = None
+            logger.info("src:%s, dst:%s, deploy cached link:%s, link cost:%s",
+                        self.src_ip, self.dst_ip, link_list, link_cost)
+        elif self.src_dpid == self.dst_dpid:
             link_list = [self.src_dpid]
             link_cost = 0
-            # self.request_cache[(src_ip, dst_ip)][1] = link_list
             logger.info("src:%s, dst:%s, both connect to dpid:%s",
                         self.src_ip, self.dst_ip, self.src_dpid)
         else:
             self.route_manage.algorithm.update_link_status(link_monitor_main.global_link_table)
-            try:
-                business_type = BusinessType[self.route_manage.servers[self.dst_ip]]
-            except KeyError:
-                business_type = BusinessType[DefaultBusinessType]
+            business_type = self.get_business_type()
             self.route_manage.algorithm.run(self.src_dpid, self.dst_dpid, business_type)
             link_list, link_cost = self.route_manage.algorithm.get_link(self.src_dpid,
                                                                         self.dst_dpid)
-            # self.request_cache[(src_ip, dst_ip)][1] = link_list
             logger.info("src:%s, dst:%s, deploy link:%s, link cost:%s",
                         self.src_ip, self.dst_ip, link_list, link_cost)
         return link_list, link_cost
 
+    def get_business_type(self):
+        """bandwidth requirement of the service behind dst_ip."""
+        try:
+            return BusinessType[self.route_manage.servers[self.dst_ip]]
+        except KeyError:
+            return BusinessType[DefaultBusinessType]
+
+    def install(self, link_list, link_cost):
+        """deploy_flow_table with the FlowMods of every switch sent as
+        one write, destination end first; self.install_future is
+        resolved when all switches answered their barrier.
+        """
+        self.flow_batch = FlowBatch()
+        try:
+            result = self.deploy_flow_table(link_list, link_cost)
+        finally:
+            batch, self.flow_batch = self.flow_batch, None
+        self.install_future = FlowDeployer().commit(batch, self._install_order(link_list))
+        if result:
+            self.register_route(link_list)
+        return result
+
+    def register_route(self, link_list):
+        """register the deployed route for fault recovery."""
+        RouteInfoMaintainer().update(self.route_manage, fault_recovery_main, self, link_list)
+
+    def entry_args(self):
+        """constructor arguments after route_manage, RouteInfoMaintainer
+        keeps them to build the entry again for fault recovery."""
+        return ()
+
+    def deploy_changed(self, link_list, former_path):
+        """deploy_flow_table of link_list replacing former_path, every switch by default."""
+        return self.deploy_flow_table(link_list, None)
+
+    def reoptimize(self):
+        """calculate and deploy the route again through the route task handler."""
+        self.retries = 0
+        self.timestamp = time.time()
+        self.route_manage.add_to_queue(self)
+
+    def _install_order(self, link_list):
+        return link_list[::-1]
+
+    def send_flow_mod(self, datapath, mod):
+        if self.flow_batch is not None:
+            self.flow_batch.add(datapath, mod)
+        else:
+            datapath.send_msg(mod)
+
     def deploy_flow_table(self, link_list, link_cost):
         """Deploy flow tables of switches in both way, from the end of link_list to the start
 
@@ -152,8 +358,7 @@ class TaskEntryBase(object):
         """
         pass
 
-    @staticmethod
-    def flow_mod(datapath, src_ip, dst_ip, inport, outport):
+    def flow_mod(self, datapath, src_ip, dst_ip, inport, outport):
         """deploy flow table
 
         :param datapath: switch datapath
@@ -162,22 +367,12 @@ class TaskEntryBase(object):
         :param inport: data in port number for matching
         :param outport: data out port number
         """
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-
-        match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, in_port=inport,
-                                ipv4_src=str(src_ip), ipv4_dst=str(dst_ip))
-
-        actions = [parser.OFPActionOutput(outport)]
-
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-
-        mod = parser.OFPFlowMod(datapath=datapath, priority=ROUTE_FLOW_PRIORITY,
-                                idle_timeout=FLOW_IDLE_TIMEOUT,
-                                hard_timeout=FLOW_HARD_TIMEOUT,
-                                command=ofproto.OFPFC_ADD,
-                                match=match, instructions=inst)
-        datapath.send_msg(mod)
+        # the switch reports the removal of the ingress entries of the route
+        notify_removed = (datapath.id, inport) in ((self.src_dpid, self.src_port_no),
+                                                   (self.dst_dpid, self.dst_port_no))
+        mod = flow_template.route_flow_mod(datapath, src_ip, dst_ip, inport, outport,
+                                           notify_removed)
+        self.send_flow_mod(datapath, mod)
 
     def to_dict(self):
         pass
@@ -201,10 +396,26 @@ class RouteTaskEntry(TaskEntryBase):
                                              route_manage)
         pass
 
+    cache_path = True
+
     def __str__(self):
         return "RouteTaskEntry"
 
     def deploy_flow_table(self, link_list, link_cost):
+        self.backup_path = None
+        if ROUTE_BACKUP_PATH and len(link_list) > 1:
+            backup_path = disjoint_path(self.route_manage.switches, link_list)
+            if backup_path is not None:
+                self._deploy_protected(self.src_ip, self.dst_ip, self.src_port_no, self.dst_port_no,
+                                       link_list, backup_path)
+                self._deploy_protected(self.dst_ip, self.src_ip, self.dst_port_no, self.src_port_no,
+                                       link_list[::-1], backup_path[::-1])
+                self.backup_path = backup_path
+                logger.info("src:%s, dst:%s, backup link:%s", self.src_ip, self.dst_ip, backup_path)
+                if len(link_list) > 2:
+                    self._send_web_route(link_list)
+                return True
+
         if len(link_list) == 1:
             dp = self.route_manage.switches.get_switch(link_list[0]).dp
             self.flow_mod(dp, self.dst_ip, self.src_ip, self.dst_port_no, self.src_port_no)
@@ -267,6 +478,96 @@ class RouteTaskEntry(TaskEntryBase):
             logger.info("find path failed!")
             return False
 
+    def deploy_changed(self, link_list, former_path):
+        """
+            deploy link_list replacing the unprotected route former_path
+            between the same switches, on the switches whose neighbors on
+            the path changed only.  the entries of the other switches are
+            still in place.
+        """
+        if self.backup_path is not None or len(link_list) < 2 or len(former_path) < 2 or \
+                (link_list[0], link_list[-1]) != (former_path[0], former_path[-1]) or \
+                (ROUTE_BACKUP_PATH and disjoint_path(self.route_manage.switches, link_list)):
+            return self.deploy_flow_table(link_list, None)
+
+        former_hops = _path_hops(former_path)
+        for dpid, hop in _path_hops(link_list).items():
+            if former_hops.get(dpid) == hop:
+                continue
+            sw = self.route_manage.switches.get_switch(dpid)
+            previous_dpid, next_dpid = hop
+            inport = self.src_port_no if previous_dpid is None else sw.neighbors[previous_dpid][0]
+            outport = self.dst_port_no if next_dpid is None else sw.neighbors[next_dpid][0]
+            self.flow_mod(sw.dp, self.src_ip, self.dst_ip, inport, outport)
+            self.flow_mod(sw.dp, self.dst_ip, self.src_ip, outport, inport)
+
+        if len(link_list) > 2:
+            self._send_web_route(link_list)
+        return True
+
+    def _send_web_route(self, link_list):
+        """send GUI event of link_list."""
+        links = []
+        for num in range(len(link_list) - 1):
+            sw = self.route_manage.switches.get_switch(link_list[num])
+            next_sw = self.route_manage.switches.get_switch(link_list[num+1])
+            links.append([dpid_to_str(sw.dp.id), sw.neighbors[next_sw.dp.id][0],
+                          dpid_to_str(next_sw.dp.id), next_sw.neighbors[sw.dp.id][0]])
+
+        if self.route_manage.algorithm_type == "GA":
+            self.route_manage.send_event_to_observers(ws_event.EventWebRouteSet(links))
+        elif self.route_manage.algorithm_type == "Dij":
+            self.route_manage.send_event_to_observers(ws_event.EventWebRouteSetDij(links))
+
+    def _deploy_protected(self, src_ip, dst_ip, src_port_no, dst_port_no, link_list, backup_path):
+        """deploy src_ip -> dst_ip over link_list protected by backup_path.
+
+        every switch of link_list but the last forwards through a fast
+        failover group: the next switch while that port is up, else back
+        where the packet came from.  packets sent back are forwarded up
+        to the first switch, which sends them over backup_path.
+        """
+        switches = self.route_manage.switches
+
+        def port(dpid, neighbor_dpid):
+            return switches.get_switch(dpid).neighbors[neighbor_dpid][0]
+
+        last = len(link_list) - 1
+        for num, dpid in enumerate(link_list):
+            dp = switches.get_switch(dpid).dp
+            inport = src_port_no if num == 0 else port(dpid, link_list[num-1])
+            if num == last:
+                self.flow_mod(dp, src_ip, dst_ip, inport, dst_port_no)
+                continue
+
+            outport = port(dpid, link_list[num+1])
+            if num == 0:
+                # the first switch fails over to the backup path
+                back_port = port(dpid, backup_path[1])
+                buckets = [(outport, outport), (back_port, back_port)]
+            else:
+                back_port = inport
+                buckets = [(outport, outport), (inport, dp.ofproto.OFPP_IN_PORT)]
+            group_id, command = FailoverGroups().allocate(dp, src_ip, dst_ip)
+            self.send_flow_mod(dp, flow_template.failover_group_mod(dp, group_id, buckets, command))
+            mod = flow_template.route_group_flow_mod(dp, src_ip, dst_ip, inport, group_id,
+                                                     notify_removed=(num == 0))
+            self.send_flow_mod(dp, mod)
+            # packets sent back by the next switch
+            self.send_flow_mod(dp, flow_template.protection_flow_mod(
+                dp, src_ip, dst_ip, outport, back_port))
+
+        for num in range(1, len(backup_path)):
+            dpid = backup_path[num]
+            dp = switches.get_switch(dpid).dp
+            inport = port(dpid, backup_path[num-1])
+            if num == len(backup_path) - 1:
+                outport = dst_port_no
+            else:
+                outport = port(dpid, backup_path[num+1])
+            self.send_flow_mod(dp, flow_template.protection_flow_mod(
+                dp, src_ip, dst_ip, inport, outport))
+
     def to_dict(self):
         r = {'route_type': self.route_type,
              'src_dpid': self.src_dpid,
@@ -274,7 +575,118 @@ class RouteTaskEntry(TaskEntryBase):
              'src_port_no': self.src_port_no,
              'dst_dpid': self.dst_dpid,
              'dst_ip': self.dst_ip,
-             'dst_port_no': self.dst_port_no}
+             'dst_port_no': self.dst_port_no,
+             'backup_path': self.backup_path}
+        return r
+
+
+class SinkTreeTaskEntry(TaskEntryBase):
+    """destination forwarding task entry, installs the sink trees toward
+    both hosts instead of the flow entries of the pair, see sink_tree.
+
+    src and dst may be the same host, to install its sink tree only.
+    """
+    def __init__(self, route_type, src_dpid, src_ip, src_port_no,
+                 dst_dpid, dst_ip, dst_port_no, route_manage):
+        super(SinkTreeTaskEntry, self).__init__(route_type, src_dpid, src_ip, src_port_no,
+                                                dst_dpid, dst_ip, dst_port_no,
+                                                route_manage)
+        # [(ip, dpid, port_no, SinkTree)], destination first
+        self.trees = []
+        # trees whose entries are sent by the current install()
+        self.sent_trees = []
+
+    def __str__(self):
+        return "SinkTreeTaskEntry"
+
+    def route_calc(self):
+        """sink trees toward dst and src.
+
+        :return: path from src to dst in the sink tree of dst, hop count
+        """
+        sink_trees = self.route_manage.sink_trees
+        self.trees = []
+        for ip, dpid, port_no in ((self.dst_ip, self.dst_dpid, self.dst_port_no),
+                                  (self.src_ip, self.src_dpid, self.src_port_no)):
+            if self.trees and ip == self.trees[0][0]:
+                continue
+            tree = sink_trees.get_tree(ip, dpid, self.route_manage.switches,
+                                       link_monitor_main.global_link_table,
+                                       self.route_manage.host_locations)
+            self.trees.append((ip, dpid, port_no, tree))
+
+        link_list = self.trees[0][3].path(self.src_dpid)
+        if link_list is None:
+            return None, None
+        logger.info("src:%s, dst:%s, sink tree:%s/%s, deploy link:%s",
+                    self.src_ip, self.dst_ip, self.trees[0][3].network,
+                    self.trees[0][3].prefix_len, link_list)
+        return link_list, len(link_list) - 1
+
+    def deploy_flow_table(self, link_list, link_cost):
+        switches = self.route_manage.switches
+        sink_trees = self.route_manage.sink_trees
+        sent = 0
+        for ip, dpid, port_no, tree in self.trees:
+            if not tree.installed:
+                for tree_dpid, outport in tree.entries(switches):
+                    self.destination_flow_mod(switches[tree_dpid].dp, tree.network,
+                                              outport, tree.prefix_len)
+                    sent += 1
+                self.sent_trees.append(tree)
+            if not sink_trees.has_host(ip, dpid, port_no):
+                self.destination_flow_mod(switches[dpid].dp, ip, port_no)
+                sink_trees.add_host(ip, dpid, port_no)
+                sent += 1
+
+        if sent == 0:
+            # everything was installed, the packet-in came from a switch
+            # which lost an entry, send the entries of the path again
+            for ip, dpid, port_no, tree in self.trees:
+                path = tree.path(self.src_dpid if ip == self.dst_ip else self.dst_dpid)
+                for tree_dpid, outport in tree.entries(switches, path or []):
+                    self.destination_flow_mod(switches[tree_dpid].dp, tree.network,
+                                              outport, tree.prefix_len)
+                self.destination_flow_mod(switches[dpid].dp, ip, port_no)
+        return True
+
+    def install(self, link_list, link_cost):
+        """install, the sent trees are marked installed once every switch
+        answered its barrier, and sent again by the next request after a
+        timeout.
+        """
+        self.sent_trees = []
+        try:
+            result = super(SinkTreeTaskEntry, self).install(link_list, link_cost)
+        finally:
+            trees, self.sent_trees = self.sent_trees, []
+        if trees:
+            self.install_future.add_done_callback(lambda future: self._trees_installed(trees, future))
+        return result
+
+    @staticmethod
+    def _trees_installed(trees, future):
+        if not future.timed_out:
+            for tree in trees:
+                tree.installed = True
+
+    def register_route(self, link_list):
+        """sink trees are reinstalled by RouteManage on link deletion."""
+        pass
+
+    def destination_flow_mod(self, datapath, dst_ip, outport, prefix_len=32):
+        mod = flow_template.destination_flow_mod(datapath, dst_ip, outport, prefix_len)
+        self.send_flow_mod(datapath, mod)
+
+    def to_dict(self):
+        r = {'route_type': self.route_type,
+             'src_dpid': self.src_dpid,
+             'src_ip': self.src_ip,
+             'src_port_no': self.src_port_no,
+             'dst_dpid': self.dst_dpid,
+             'dst_ip': self.dst_ip,
+             'dst_port_no': self.dst_port_no,
+             'sink_trees': [tree.to_dict() for ip, dpid, port_no, tree in self.trees]}
         return r
 
 
@@ -293,6 +705,9 @@ class NATRouteTaskEntry(TaskEntryBase):
     def __str__(self):
         return "NATRouteTaskEntry"
 
+    def entry_args(self):
+        return self.gateway_ip, self.gateway_mac, self.server_mac, self.user_mac
+
     def update_attribute(self, dst_ip=None, dst_port_no=None, server_mac=None):
         if dst_ip:
             self.dst_ip = dst_ip
@@ -387,66 +802,19 @@ class NATRouteTaskEntry(TaskEntryBase):
             logger.info("find path failed!")
             return False
 
-    @staticmethod
-    def _user_to_server_flow_mod(datapath, user_ip, server_ip, outport,
+    def _user_to_server_flow_mod(self, datapath, user_ip, server_ip, outport,
                                  gateway_ip, gateway_mac, server_mac, user_mac):
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-
         # match by IP address of users and gateways
-        format_match = {'dl_type': str(0x0800),
-                        'nw_proto': 6,
-                        'ipv4_src': str(user_ip),
-                        'ipv4_dst': str(gateway_ip)}
-        match = ofctl_v1_3.to_match(datapath, format_match)
-
-        actions = [parser.OFPActionDecNwTtl(),
-                   parser.OFPActionSetField(tcp_dst=int(server_tcp_port)),
-                   parser.OFPActionSetField(ipv4_dst=netaddr.IPAddress(server_ip)),
-                   parser.OFPActionSetField(eth_dst=netaddr.EUI(server_mac)),
-                   parser.OFPActionOutput(outport)]
-
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-
-        mod = parser.OFPFlowMod(datapath=datapath, flags=1,
-                                priority=ROUTE_FLOW_PRIORITY, cookie=0,
-                                buffer_id=ofproto.OFP_NO_BUFFER,
-                                idle_timeout=FLOW_IDLE_TIMEOUT,
-                                hard_timeout=FLOW_HARD_TIMEOUT,
-                                command=ofproto.OFPFC_ADD,
-                                match=match, instructions=inst)
-        datapath.send_msg(mod)
+        mod = flow_template.user_to_server_flow_mod(datapath, user_ip, server_ip, outport,
+                                                    gateway_ip, server_mac)
+        self.send_flow_mod(datapath, mod)
 
-    @staticmethod
-    def _server_to_user_flow_mod(datapath, user_ip, server_ip, outport,
+    def _server_to_user_flow_mod(self, datapath, user_ip, server_ip, outport,
                                  gateway_ip, gateway_mac, server_mac, user_mac):
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-
         # match by IP address of server and user
-        format_match = {'dl_type': str(0x0800),
-                        'nw_proto': 6,
-                        'ipv4_src': str(server_ip),
-                        'ipv4_dst': str(user_ip)}
-
-        actions = [parser.OFPActionDecNwTtl(),
-                   parser.OFPActionSetField(tcp_src=int(80)),
-                   parser.OFPActionSetField(ipv4_src=netaddr.IPAddress(gateway_ip)),
-                   parser.OFPActionSetField(eth_src=netaddr.EUI(gateway_mac)),
-                   parser.OFPActionSetField(eth_dst=netaddr.EUI(user_mac)),
-                   parser.OFPActionOutput(outport)]
-
-        match = ofctl_v1_3.to_match(datapath, format_match)
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-
-        mod = parser.OFPFlowMod(datapath=datapath, flags=1,
-                                priority=ROUTE_FLOW_PRIORITY, cookie=0,
-                                buffer_id=ofproto.OFP_NO_BUFFER,
-                                idle_timeout=FLOW_IDLE_TIMEOUT,
-                                hard_timeout=FLOW_HARD_TIMEOUT,
-                                command=ofproto.OFPFC_ADD,
-                                match=match, instructions=inst)
-        datapath.send_msg(mod)
+        mod = flow_template.server_to_user_flow_mod(datapath, user_ip, server_ip, outport,
+                                                    gateway_ip, gateway_mac, user_mac)
+        self.send_flow_mod(datapath, mod)
         pass
 
     def to_dict(self):
@@ -495,6 +863,14 @@ class MulticastTaskEntry(TaskEntryBase):
         link_cost = None
         return link_list, link_cost
 
+    def _install_order(self, link_list):
+        # deploy_flow_table already goes from the leaves to the root
+        return None
+
+    def register_route(self, link_list):
+        """multicast trees are not recovered from the route registry."""
+        pass
+
     def deploy_flow_table(self, link_list, link_cost):
         # get formatted link list and reverse for deployment.
         format_link_list = self._format_link_list(link_list)
@@ -533,32 +909,15 @@ class MulticastTaskEntry(TaskEntryBase):
                           in_port, outports)
         pass
 
-    @staticmethod
-    def flow_mod(datapath, src_ip, dst_ip, inport, outport):
+    def flow_mod(self, datapath, src_ip, dst_ip, inport, outport):
         """for multicast support
 
         :param outport: data out ports number list
         """
         assert isinstance(outport, list)
 
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-
-        match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, in_port=inport,
-                                ipv4_src=str(src_ip), ipv4_dst=str(dst_ip))
-
-        actions = []
-        for port in outport:
-            actions.append(parser.OFPActionOutput(port))
-
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-
-        mod = parser.OFPFlowMod(datapath=datapath, priority=ROUTE_FLOW_PRIORITY,
-                                idle_timeout=MULTICAST_FLOW_IDLE_TIMEOUT,
-                                hard_timeout=MULTICAST_FLOW_HARD_TIMEOUT,
-                                command=ofproto.OFPFC_ADD,
-                                match=match, instructions=inst)
-        datapath.send_msg(mod)
+        mod = flow_template.multicast_flow_mod(datapath, src_ip, dst_ip, inport, outport)
+        self.send_flow_mod(datapath, mod)
 
     @staticmethod
     def _format_link_list(link_list):
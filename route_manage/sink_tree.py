@@ -0,0 +1,213 @@
+import logging
+import time
+import netaddr
+
+from threading import Lock
+
+from base.parameters import DESTINATION_PREFIX_LEN, DESTINATION_FLOW_HARD_TIMEOUT
+
+FORMAT = '%(name)s[%(levelname)s]%(message)s'
+logging.basicConfig(format=FORMAT)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def available_band(link_table, src_dpid, dst_dpid):
+    link = link_table.get((src_dpid, dst_dpid)) if link_table is not None else None
+    if not link:
+        return 0.0
+    return float(link.values()[0].available_band or 0)
+
+
+def calculate_next_hops(switches, dst_dpid, link_table=None):
+    """
+        shortest hop sink tree toward dst_dpid: {dpid: next dpid} for
+        every switch reaching dst_dpid.  among equal hop next switches
+        the link with the most available bandwidth is chosen, ties are
+        spread over destinations by hash.
+    """
+    distance = {dst_dpid: 0}
+    layer = [dst_dpid]
+    while layer:
+        next_layer = []
+        for dpid in layer:
+            for neighbor in switches[dpid].neighbors:
+                if neighbor not in distance and neighbor in switches:
+                    distance[neighbor] = distance[dpid] + 1
+                    next_layer.append(neighbor)
+        layer = next_layer
+
+    next_hops = {}
+    for dpid, hops in distance.items():
+        if dpid == dst_dpid:
+            continue
+        candidates = [neighbor for neighbor in switches[dpid].neighbors
+                      if distance.get(neighbor) == hops - 1]
+        if candidates:
+            next_hops[dpid] = max(candidates, key=lambda n: (available_band(link_table, dpid, n),
+                                                             hash((dst_dpid, n))))
+    return next_hops
+
+
+class SinkTree(object):
+    """
+        destination flow entries forwarding network/prefix_len to the
+        switch dst_dpid, next_hops: {dpid: next dpid toward dst_dpid},
+        dst_dpid itself excluded.  the last hop of every host is a
+        separate /32 entry on dst_dpid, see SinkTrees.add_host().
+    """
+
+    def __init__(self, network, prefix_len, dst_dpid, next_hops, created):
+        self.network = network
+        self.prefix_len = prefix_len
+        self.dst_dpid = dst_dpid
+        self.next_hops = next_hops
+        self.created = created
+        # set once the switches answered the barrier after the entries
+        self.installed = False
+
+    def path(self, src_dpid):
+        """switches from src_dpid to dst_dpid, None when unreachable."""
+        path = [src_dpid]
+        while path[-1] != self.dst_dpid:
+            next_dpid = self.next_hops.get(path[-1])
+            if next_dpid is None:
+                return None
+            path.append(next_dpid)
+        return path
+
+    def uses_link(self, src_dpid, dst_dpid):
+        return self.next_hops.get(src_dpid) == dst_dpid or \
+            self.next_hops.get(dst_dpid) == src_dpid
+
+    def entries(self, switches, dpids=None):
+        """[(dpid, out port)] of the switches in dpids, all switches by default."""
+        if dpids is None:
+            dpids = self.next_hops.keys()
+        return [(dpid, switches[dpid].neighbors[self.next_hops[dpid]][0])
+                for dpid in dpids if dpid in self.next_hops]
+
+    def to_dict(self):
+        return {'network': self.network,
+                'prefix_len': self.prefix_len,
+                'dst_dpid': self.dst_dpid,
+                'switches': len(self.next_hops),
+                'installed': self.installed}
+
+
+class SinkTrees(object):
+    """
+        sink trees of destination forwarding: {(network, prefix_len): SinkTree}
+        and the last hop entries of hosts: {ip: (dpid, port_no, created)}.
+
+        a sink tree is calculated once per destination and shared by
+        every source.  the hosts of one edge switch sharing a prefix of
+        prefix_len bits share one aggregated tree, unless a known host of
+        that prefix is behind another switch, which then gets its own /32
+        tree overriding the aggregated one.  trees and hosts expire with
+        their flow entries after timeout.
+    """
+
+    def __init__(self, prefix_len=DESTINATION_PREFIX_LEN, timeout=DESTINATION_FLOW_HARD_TIMEOUT):
+        self.prefix_len = prefix_len
+        self.timeout = timeout
+        self.trees = {}
+        self.hosts = {}
+        self.lock = Lock()
+
+        # counters
+        self.calculated = 0
+        self.reused = 0
+        self.invalidated = 0
+
+    def _fresh(self, tree, dst_dpid, now_time):
+        return tree is not None and tree.dst_dpid == dst_dpid and \
+            now_time - tree.created < self.timeout
+
+    def get_tree(self, dst_ip, dst_dpid, switches, link_table=None, hosts=None, now_time=None):
+        """
+            sink tree toward dst_ip behind dst_dpid, calculated when
+            missing, expired or ending at another switch.
+
+            :param hosts: function returning [(ip, dpid)] of known hosts,
+                          checked before aggregating the prefix of dst_ip
+        """
+        if now_time is None:
+            now_time = time.time()
+
+        with self.lock:
+            tree = self.trees.get((dst_ip, 32))
+            if self._fresh(tree, dst_dpid, now_time):
+                self.reused += 1
+                return tree
+
+            if self.prefix_len < 32:
+                network = netaddr.IPNetwork('%s/%d' % (dst_ip, self.prefix_len))
+                key = (str(network.network), self.prefix_len)
+                tree = self.trees.get(key)
+                if self._fresh(tree, dst_dpid, now_time):
+                    self.reused += 1
+                    return tree
+                # an aggregated tree to another switch is kept, dst_ip
+                # gets a longer prefix tree
+                if (tree is None or now_time - tree.created >= self.timeout) and \
+                        all(dpid == dst_dpid for ip, dpid in (hosts() if hosts else [])
+                            if netaddr.IPAddress(ip) in network):
+                    return self._calculate(key, dst_dpid, switches, link_table, now_time)
+
+            return self._calculate((dst_ip, 32), dst_dpid, switches, link_table, now_time)
+
+    def _calculate(self, key, dst_dpid, switches, link_table, now_time):
+        next_hops = calculate_next_hops(switches, dst_dpid, link_table)
+        tree = SinkTree(key[0], key[1], dst_dpid, next_hops, now_time)
+        self.trees[key] = tree
+        self.calculated += 1
+        return tree
+
+    def has_host(self, ip, dpid, port_no, now_time=None):
+        if now_time is None:
+            now_time = time.time()
+        host = self.hosts.get(ip)
+        return host is not None and host[:2] == (dpid, port_no) and \
+            now_time - host[2] < self.timeout
+
+    def add_host(self, ip, dpid, port_no, now_time=None):
+        if now_time is None:
+            now_time = time.time()
+        self.hosts[ip] = (dpid, port_no, now_time)
+
+    def invalidate_link(self, src_dpid, dst_dpid):
+        """
+            drop the trees forwarding over link (src_dpid, dst_dpid).
+
+            :return: [(ip, dpid, port_no)] of the hosts behind them
+        """
+        with self.lock:
+            dropped = [key for key, tree in self.trees.items()
+                       if tree.uses_link(src_dpid, dst_dpid)]
+            trees = [self.trees.pop(key) for key in dropped]
+            self.invalidated += len(trees)
+
+        hosts = []
+        for ip, (dpid, port_no, created) in self.hosts.items():
+            for tree in trees:
+                if dpid == tree.dst_dpid and \
+                        netaddr.IPAddress(ip) in netaddr.IPNetwork('%s/%d' % (tree.network, tree.prefix_len)):
+                    hosts.append((ip, dpid, port_no))
+                    break
+        return hosts
+
+    def clear(self):
+        with self.lock:
+            self.invalidated += len(self.trees)
+            self.trees.clear()
+            self.hosts.clear()
+
+    def stats(self):
+        return {'trees': len(self.trees),
+                'aggregated_trees': sum(1 for network, prefix_len in self.trees
+                                        if prefix_len < 32),
+                'hosts': len(self.hosts),
+                'calculated': self.calculated,
+                'reused': self.reused,
+                'invalidated': self.invalidated}
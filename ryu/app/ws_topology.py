@@ -58,6 +58,11 @@ class WebSocketTopology(app_manager.RyuApp):
 
     # _EVENTS = [ws_event.EventWebRouteSet]
 
+    # only the latest available band of a link is sent to the clients
+    EVENT_QUEUE_COALESCE = {
+        ws_event.EventWebLinkBandChange: lambda ev: tuple(ev.link_band[:4])
+    }
+
     def __init__(self, *args, **kwargs):
         super(WebSocketTopology, self).__init__(*args, **kwargs)
 
@@ -23,6 +23,7 @@ The central management of Ryu applications.
 
 """
 
+import collections
 import inspect
 import itertools
 import logging
@@ -88,6 +89,152 @@ def require_app(app_name, api_style=False):
     LOG.debug('require_app: %s is required by %s', app_name, m.__name__)
 
 
+# what RyuApp._send_event does with an event sent to a full queue
+EVENT_QUEUE_BLOCK = 'block'              # wait for room, the former behavior
+EVENT_QUEUE_DROP_NEWEST = 'drop_newest'  # drop the event
+EVENT_QUEUE_DROP_OLDEST = 'drop_oldest'  # drop the oldest queued event
+
+
+class EventQueue(object):
+    """
+    The event queue of a RyuApp, bounded by maxsize.
+
+    When the queue is full, put() waits for room under EVENT_QUEUE_BLOCK,
+    or drops the new event or the oldest queued one under the drop
+    policies, so that the sender is never blocked.  The drop policies
+    only drop the events of the classes in droppable (all of them if
+    None), the others are queued beyond maxsize.
+
+    coalesce_keys maps event classes to a function of the event returning
+    a key: an event whose key is the same as the one of an event still
+    queued replaces that event, in its place in the queue.
+    """
+
+    def __init__(self, maxsize, policy=EVENT_QUEUE_BLOCK,
+                 droppable=None, coalesce_keys=None):
+        assert policy in (EVENT_QUEUE_BLOCK, EVENT_QUEUE_DROP_NEWEST,
+                          EVENT_QUEUE_DROP_OLDEST)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.droppable = tuple(droppable) if droppable is not None else None
+        self.coalesce_keys = dict(coalesce_keys or {})
+        self._items = collections.deque()   # [[ev, state]]
+        self._pending = {}                  # (ev_cls, key) -> queued item
+        self._not_empty = hub.Event()
+        self._not_full = hub.Event()
+        self._getters = 0
+        self._putters = 0
+
+        # counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def full(self):
+        return len(self._items) >= self.maxsize
+
+    def _key(self, ev):
+        key_func = self.coalesce_keys.get(ev.__class__)
+        if key_func is None:
+            return None
+        return (ev.__class__, key_func(ev))
+
+    def _is_droppable(self, ev):
+        return self.droppable is None or isinstance(ev, self.droppable)
+
+    def _drop_oldest(self):
+        for item in self._items:
+            if self._is_droppable(item[0]):
+                break
+        else:
+            return False
+        self._items.remove(item)
+        key = self._key(item[0])
+        if key is not None and self._pending.get(key) is item:
+            del self._pending[key]
+        return True
+
+    def put(self, item, force=False):
+        """
+        Queue item, an (ev, state) tuple. Returns False if the event was
+        dropped. With force=True it is queued whatever the policy.
+        """
+        ev, state = item
+        key = self._key(ev)
+        if key is not None:
+            queued = self._pending.get(key)
+            if queued is not None:
+                queued[0] = ev
+                queued[1] = state
+                self.coalesced += 1
+                return True
+
+        if not force and self.full():
+            if self.policy == EVENT_QUEUE_BLOCK:
+                self.blocked += 1
+                while self.full():
+                    self._putters += 1
+                    self._not_full.clear()
+                    try:
+                        self._not_full.wait()
+                    finally:
+                        self._putters -= 1
+            elif not self._is_droppable(ev):
+                pass
+            else:
+                self.dropped += 1
+                if (self.policy == EVENT_QUEUE_DROP_NEWEST or
+                        not self._drop_oldest()):
+                    return False
+
+        queued = [ev, state]
+        if key is not None:
+            self._pending[key] = queued
+        self._items.append(queued)
+        self.enqueued += 1
+        if len(self._items) > self.max_depth:
+            self.max_depth = len(self._items)
+        if self._getters:
+            self._not_empty.set()
+        return True
+
+    def get(self):
+        """Wait for an event and return it as an (ev, state) tuple."""
+        while not self._items:
+            self._getters += 1
+            self._not_empty.clear()
+            try:
+                self._not_empty.wait()
+            finally:
+                self._getters -= 1
+        queued = self._items.popleft()
+        ev, state = queued
+        key = self._key(ev)
+        if key is not None and self._pending.get(key) is queued:
+            del self._pending[key]
+        if self._putters:
+            self._not_full.set()
+        return ev, state
+
+    def stats(self):
+        return {'depth': len(self._items),
+                'max_depth': self.max_depth,
+                'maxsize': self.maxsize,
+                'policy': self.policy,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'blocked': self.blocked}
+
+
 class RyuApp(object):
     """
     The base class for Ryu applications.
@@ -143,6 +290,36 @@ class RyuApp(object):
     the intersection of their OFP_VERSIONS is used.
     """
 
+    EVENT_QUEUE_SIZE = 128
+    """
+    The maximum number of events queued for this RyuApp.
+    """
+
+    EVENT_QUEUE_POLICY = EVENT_QUEUE_BLOCK
+    """
+    What happens to an event sent to this RyuApp when its queue is full:
+    EVENT_QUEUE_BLOCK makes the sender wait for room, which may be a
+    Datapath receiving messages.  EVENT_QUEUE_DROP_NEWEST and
+    EVENT_QUEUE_DROP_OLDEST drop the new event or the oldest queued one.
+    """
+
+    EVENT_QUEUE_DROPPABLE = None
+    """
+    A list of the event classes the drop policies may drop, None for all.
+    The events of other classes are queued even if the queue is full.
+
+    Examples::
+
+        EVENT_QUEUE_DROPPABLE = [ofp_event.EventOFPPacketIn]
+    """
+
+    EVENT_QUEUE_COALESCE = {}
+    """
+    A dictionary of event class to a function of the event returning a
+    key.  An event replaces the queued event of the same class and key,
+    if any, for events where only the latest one matters.
+    """
+
     @classmethod
     def context_iteritems(cls):
         """
@@ -155,8 +332,16 @@ class RyuApp(object):
         self.name = self.__class__.__name__
         self.event_handlers = {}        # ev_cls -> handlers:list
         self.observers = {}     # ev_cls -> observer-name -> states:set
+        # get_handlers/get_observers results per (ev_cls, state), valid
+        # for dispatch_version, which every (un)registration bumps
+        self.dispatch_version = 0
+        self._handlers_cache = {}
+        self._observers_cache = {}
         self.threads = []
-        self.events = hub.Queue(128)
+        self.events = EventQueue(self.EVENT_QUEUE_SIZE,
+                                 self.EVENT_QUEUE_POLICY,
+                                 self.EVENT_QUEUE_DROPPABLE,
+                                 self.EVENT_QUEUE_COALESCE)
         if hasattr(self.__class__, 'LOGGER_NAME'):
             self.logger = logging.getLogger(self.__class__.LOGGER_NAME)
         else:
@@ -177,32 +362,42 @@ class RyuApp(object):
 
     def stop(self):
         self.is_active = False
-        self._send_event(self._event_stop, None)
+        self.events.put((self._event_stop, None), force=True)
         hub.joinall(self.threads)
 
+    def _invalidate_dispatch(self):
+        self.dispatch_version += 1
+        self._handlers_cache = {}
+        self._observers_cache = {}
+
     def register_handler(self, ev_cls, handler):
         assert callable(handler)
         self.event_handlers.setdefault(ev_cls, [])
         self.event_handlers[ev_cls].append(handler)
+        self._invalidate_dispatch()
 
     def unregister_handler(self, ev_cls, handler):
         assert callable(handler)
         self.event_handlers[ev_cls].remove(handler)
         if not self.event_handlers[ev_cls]:
             del self.event_handlers[ev_cls]
+        self._invalidate_dispatch()
 
     def register_observer(self, ev_cls, name, states=None):
         states = states or set()
         ev_cls_observers = self.observers.setdefault(ev_cls, {})
         ev_cls_observers.setdefault(name, set()).update(states)
+        self._invalidate_dispatch()
 
     def unregister_observer(self, ev_cls, name):
         observers = self.observers.get(ev_cls, {})
         observers.pop(name)
+        self._invalidate_dispatch()
 
     def unregister_observer_all_event(self, name):
         for observers in self.observers.values():
             observers.pop(name, None)
+        self._invalidate_dispatch()
 
     def observe_event(self, ev_cls, states=None):
         brick = _lookup_service_brick_by_ev_cls(ev_cls)
@@ -229,6 +424,11 @@ class RyuApp(object):
         if state is None:
             return handlers
 
+        key = (ev_cls, state)
+        cached = self._handlers_cache.get(key)
+        if cached is not None:
+            return cached
+
         def test(h):
             if not hasattr(h, 'callers') or ev_cls not in h.callers:
                 # dynamically registered handlers does not have
@@ -240,14 +440,22 @@ class RyuApp(object):
                 return True
             return state in states
 
-        return filter(test, handlers)
+        handlers = list(filter(test, handlers))
+        self._handlers_cache[key] = handlers
+        return handlers
 
     def get_observers(self, ev, state):
+        key = (ev.__class__, state)
+        cached = self._observers_cache.get(key)
+        if cached is not None:
+            return cached
+
         observers = []
         for k, v in self.observers.get(ev.__class__, {}).items():
             if not state or not v or state in v:
                 observers.append(k)
 
+        self._observers_cache[key] = observers
         return observers
 
     def send_request(self, req):
@@ -30,6 +30,9 @@ from ryu.lib.hub import StreamServer
 import traceback
 import random
 import ssl
+import struct
+import threading
+import time
 from socket import IPPROTO_TCP, TCP_NODELAY
 import warnings
 
@@ -45,6 +48,7 @@ from ryu.controller import handler
 from ryu.controller import ofp_event
 
 from ryu.lib.dpid import dpid_to_str
+from ryu.lib.packet.packet_view import PacketView
 
 LOG = logging.getLogger('ryu.controller.controller')
 
@@ -107,6 +111,11 @@ def _deactivate(method):
 
 
 class Datapath(ofproto_protocol.ProtocolDesc):
+    # initial size of the receive buffer, more than the largest message
+    recv_buf_size = 64 * 1024
+    # bytes of queued buffers coalesced into one write
+    send_buf_cap = 256 * 1024
+
     def __init__(self, socket, address):
         super(Datapath, self).__init__()
 
@@ -118,12 +127,28 @@ class Datapath(ofproto_protocol.ProtocolDesc):
         # The limit is arbitrary. We need to limit queue size to
         # prevent it from eating memory up
         self.send_q = hub.Queue(16)
+        # messages held by send_msg(msg, flush=False). they may be
+        # appended from a native thread (the route task handler) while a
+        # greenlet flushes, hence the lock.
+        self._send_later = []
+        self._send_later_lock = threading.Lock()
+
+        # send counters, and their rates over the last second or more
+        self.sent_msgs = 0
+        self.sent_bytes = 0
+        self.send_writes = 0
+        self.send_rate = (0, 0, 0)
+        self._send_rate_start = time.time()
+        self._send_rate_base = (0, 0, 0)
 
         self.xid = random.randint(0, self.ofproto.MAX_XID)
         self.id = None  # datapath_id is unknown yet
         self._ports = None
         self.flow_format = ofproto_v1_0.NXFF_OPENFLOW10
         self.ofp_brick = ryu.base.app_manager.lookup_service_brick('ofp_event')
+        # {(ev_cls, state): handlers} of ofp_brick at _handlers_version
+        self._handlers_cache = {}
+        self._handlers_version = None
         self.set_state(handler.HANDSHAKE_DISPATCHER)
 
     def _get_ports(self):
@@ -154,42 +179,80 @@ class Datapath(ofproto_protocol.ProtocolDesc):
         ev.state = state
         self.ofp_brick.send_event_to_observers(ev, state)
 
+    def _get_handlers(self, ev):
+        """handlers of ofp_brick for ev in the current state, cached."""
+        version = self.ofp_brick.dispatch_version
+        if version != self._handlers_version:
+            self._handlers_cache = {}
+            self._handlers_version = version
+        key = (ev.__class__, self.state)
+        handlers = self._handlers_cache.get(key)
+        if handlers is None:
+            dispatchers = lambda x: x.callers[ev.__class__].dispatchers
+            handlers = [handler for handler in
+                        self.ofp_brick.get_handlers(ev) if
+                        self.state in dispatchers(handler)]
+            self._handlers_cache[key] = handlers
+        return handlers
+
     # Low level socket handling layer
     @_deactivate
     def _recv_loop(self):
-        buf = bytearray()
-        required_len = ofproto_common.OFP_HEADER_SIZE
+        # Messages are received into one preallocated buffer and parsed
+        # where they lie, buf[start:end] holding the bytes not parsed yet.
+        # Only the bytes of a partial message are moved to the front,
+        # when the buffer is full.
+        buf = bytearray(self.recv_buf_size)
+        view = memoryview(buf)
+        start = end = 0
+        header_size = ofproto_common.OFP_HEADER_SIZE
 
         count = 0
         while self.is_active:
-            ret = self.socket.recv(required_len)
-            if len(ret) == 0:
+            if end == len(buf):
+                pending = end - start
+                if start == 0:
+                    # a message larger than the buffer
+                    buf = buf + bytearray(len(buf))
+                else:
+                    buf[:pending] = buf[start:end]
+                view = memoryview(buf)
+                start, end = 0, pending
+
+            ret = self.socket.recv_into(view[end:])
+            if ret == 0:
                 self.is_active = False
                 self.socket.close()
                 break
-            buf += ret
-            while len(buf) >= required_len:
-                (version, msg_type, msg_len, xid) = ofproto_parser.header(buf)
-                required_len = msg_len
-                if len(buf) < required_len:
+            end += ret
+            while end - start >= header_size:
+                (version, msg_type, msg_len, xid) = struct.unpack_from(
+                    ofproto_common.OFP_HEADER_PACK_STR, buf, start)
+                if msg_len < header_size:
+                    LOG.error('invalid message length %d from switch %s, '
+                              'closing connection', msg_len, self.address)
+                    self.is_active = False
+                    self.socket.close()
+                    return
+                if end - start < msg_len:
                     break
 
+                # the message keeps its own copy, the buffer is reused
                 msg = ofproto_parser.msg(self,
-                                         version, msg_type, msg_len, xid, buf)
+                                         version, msg_type, msg_len, xid,
+                                         buf[start:start + msg_len])
                 # LOG.debug('queue msg %s cls %s', msg, msg.__class__)
                 if msg:
                     ev = ofp_event.ofp_msg_to_ev(msg)
+                    if msg_type == self.ofproto.OFPT_PACKET_IN:
+                        # decoded at most once and shared by every app
+                        ev.packet_view = PacketView(msg.data)
                     self.ofp_brick.send_event_to_observers(ev, self.state)
 
-                    dispatchers = lambda x: x.callers[ev.__class__].dispatchers
-                    handlers = [handler for handler in
-                                self.ofp_brick.get_handlers(ev) if
-                                self.state in dispatchers(handler)]
-                    for handler in handlers:
+                    for handler in self._get_handlers(ev):
                         handler(ev)
 
-                buf = buf[required_len:]
-                required_len = ofproto_common.OFP_HEADER_SIZE
+                start += msg_len
 
                 # We need to schedule other greenlets. Otherwise, ryu
                 # can't accept new switches or handle the existing
@@ -200,12 +263,31 @@ class Datapath(ofproto_protocol.ProtocolDesc):
                     count = 0
                     hub.sleep(0)
 
+            if start == end:
+                start = end = 0
+
     @_deactivate
     def _send_loop(self):
         try:
             while self.is_active:
                 buf = self.send_q.get()
+                # coalesce the buffers queued meanwhile into one write,
+                # up to send_buf_cap bytes
+                bufs = [buf]
+                size = len(buf)
+                while size < self.send_buf_cap:
+                    try:
+                        buf = self.send_q.get(block=False)
+                    except hub.QueueEmpty:
+                        break
+                    bufs.append(buf)
+                    size += len(buf)
+                if len(bufs) > 1:
+                    buf = bytearray().join(bufs)
                 self.socket.sendall(buf)
+                self.sent_bytes += size
+                self.send_writes += 1
+                self._update_send_rate(time.time())
         finally:
             q = self.send_q
             # first, clear self.send_q to prevent new references.
@@ -222,19 +304,62 @@ class Datapath(ofproto_protocol.ProtocolDesc):
         if self.send_q:
             self.send_q.put(buf)
 
+    def flush(self):
+        """send the messages held by send_msg(msg, flush=False)."""
+        with self._send_later_lock:
+            bufs, self._send_later = self._send_later, []
+        if bufs:
+            self.send(bytearray().join(bufs))
+
+    def _update_send_rate(self, now_time):
+        elapsed = now_time - self._send_rate_start
+        if elapsed < 1:
+            return
+        msgs, size, writes = self._send_rate_base
+        self.send_rate = ((self.sent_msgs - msgs) / elapsed,
+                          (self.sent_bytes - size) / elapsed,
+                          (self.send_writes - writes) / elapsed)
+        self._send_rate_start = now_time
+        self._send_rate_base = (self.sent_msgs, self.sent_bytes,
+                                self.send_writes)
+
+    def send_stats(self):
+        self._update_send_rate(time.time())
+        msgs_rate, bytes_rate, writes_rate = self.send_rate
+        return {'msgs': self.sent_msgs,
+                'bytes': self.sent_bytes,
+                'writes': self.send_writes,
+                'msgs_per_sec': msgs_rate,
+                'bytes_per_sec': bytes_rate,
+                'writes_per_sec': writes_rate,
+                'held': len(self._send_later)}
+
     def set_xid(self, msg):
         self.xid += 1
         self.xid &= self.ofproto.MAX_XID
         msg.set_xid(self.xid)
         return self.xid
 
-    def send_msg(self, msg):
+    def send_msg(self, msg, flush=True):
+        """
+        Serialize and send msg. With flush=False the message is held
+        until the next flush() or send_msg(..., flush=True), so that the
+        messages of a bulk install go out in a single write.
+        """
         assert isinstance(msg, self.ofproto_parser.MsgBase)
         if msg.xid is None:
             self.set_xid(msg)
         msg.serialize()
         # LOG.debug('send_msg %s', msg)
-        self.send(msg.buf)
+        with self._send_later_lock:
+            self.sent_msgs += 1
+            held = not flush or bool(self._send_later)
+            if held:
+                self._send_later.append(msg.buf)
+        if not held:
+            self.send(msg.buf)
+        elif flush:
+            self.flush()
 
     def serve(self):
         send_thr = hub.spawn(self._send_loop)
@@ -0,0 +1,130 @@
+# Copyright (C) 2012 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shared, lazily decoded view of a Packet-In payload.
+
+The same EventOFPPacketIn instance is delivered to every observing
+application, so Datapath attaches a PacketView to the event before
+dispatching it.  Applications call get_packet_view(ev) instead of
+packet.Packet(ev.msg.data) and the payload is decoded at most once,
+no matter how many applications look at it.
+"""
+
+from . import packet
+from . import packet_base
+
+
+class PacketViewStats(object):
+    """decode counters shared by every PacketView."""
+
+    def __init__(self):
+        self.requests = 0
+        self.decodes = 0
+
+    @property
+    def decodes_saved(self):
+        return max(self.requests - self.decodes, 0)
+
+    def reset(self):
+        self.requests = 0
+        self.decodes = 0
+
+    def to_dict(self):
+        return {'requests': self.requests,
+                'decodes': self.decodes,
+                'decodes_saved': self.decodes_saved}
+
+
+stats = PacketViewStats()
+
+
+class PacketView(object):
+    """
+    Packet-In payload which is decoded on first access.
+
+    header_list maps protocol_name to the decoded protocol instance, as
+    the applications used to build by hand.  The convenience attributes
+    return None when the protocol is not present in the packet.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._pkt = None
+        self._header_list = None
+
+    @property
+    def pkt(self):
+        if self._pkt is None:
+            self._pkt = packet.Packet(self.data)
+            stats.decodes += 1
+        return self._pkt
+
+    @property
+    def protocols(self):
+        return self.pkt.protocols
+
+    @property
+    def header_list(self):
+        if self._header_list is None:
+            self._header_list = dict(
+                (p.protocol_name, p) for p in self.pkt.protocols
+                if isinstance(p, packet_base.PacketBase))
+        return self._header_list
+
+    def get_protocols(self, protocol):
+        return self.pkt.get_protocols(protocol)
+
+    def get_protocol(self, protocol):
+        return self.pkt.get_protocol(protocol)
+
+    @property
+    def ethernet(self):
+        return self.header_list.get('ethernet')
+
+    @property
+    def arp(self):
+        return self.header_list.get('arp')
+
+    @property
+    def ipv4(self):
+        return self.header_list.get('ipv4')
+
+    @property
+    def ipv6(self):
+        return self.header_list.get('ipv6')
+
+    @property
+    def igmp(self):
+        return self.header_list.get('igmp')
+
+    @property
+    def lldp(self):
+        return self.header_list.get('lldp')
+
+
+def get_packet_view(ev):
+    """
+    return the PacketView attached to a Packet-In event.
+
+    events which did not go through Datapath (e.g. created by tests or
+    other applications) get a view attached on first use.
+    """
+    view = getattr(ev, 'packet_view', None)
+    if view is None:
+        view = PacketView(ev.msg.data)
+        ev.packet_view = view
+    stats.requests += 1
+    return view
@@ -0,0 +1,194 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import logging
+
+import nose
+from nose.tools import assert_equal
+from nose.tools import assert_true
+
+from ryu.base import app_manager
+from ryu.controller import event
+from ryu.controller.handler import set_ev_cls
+from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER
+from ryu.lib import hub
+
+
+LOG = logging.getLogger('test_app_manager')
+
+
+class EventTest(event.EventBase):
+    pass
+
+
+class EventOther(event.EventBase):
+    pass
+
+
+class EventKeyed(event.EventBase):
+    def __init__(self, key, value):
+        super(EventKeyed, self).__init__()
+        self.key = key
+        self.value = value
+
+
+class _App(app_manager.RyuApp):
+    @set_ev_cls(EventTest, MAIN_DISPATCHER)
+    def main_handler(self, ev):
+        pass
+
+    @set_ev_cls(EventTest, [MAIN_DISPATCHER, CONFIG_DISPATCHER])
+    def both_handler(self, ev):
+        pass
+
+    @set_ev_cls(EventTest)
+    def any_handler(self, ev):
+        pass
+
+
+class Test_RyuApp(unittest.TestCase):
+
+    """ Test case for the dispatch cache of RyuApp
+    """
+
+    def setUp(self):
+        self.app = _App()
+        app_manager.register_instance(self.app)
+
+    def test_get_handlers(self):
+        ev = EventTest()
+        main = self.app.get_handlers(ev, MAIN_DISPATCHER)
+        config = self.app.get_handlers(ev, CONFIG_DISPATCHER)
+        assert_equal(set(main), set([self.app.main_handler,
+                                     self.app.both_handler,
+                                     self.app.any_handler]))
+        assert_equal(set(config), set([self.app.both_handler,
+                                       self.app.any_handler]))
+        assert_true(self.app.get_handlers(ev, MAIN_DISPATCHER) is main)
+        assert_equal(self.app.get_handlers(EventOther(), MAIN_DISPATCHER), [])
+        assert_equal(len(self.app.get_handlers(ev)), 3)
+
+    def test_get_handlers_invalidate(self):
+        ev = EventTest()
+        version = self.app.dispatch_version
+        main = self.app.get_handlers(ev, MAIN_DISPATCHER)
+
+        def handler(ev):
+            pass
+
+        self.app.register_handler(EventTest, handler)
+        assert_true(self.app.dispatch_version > version)
+        assert_equal(set(self.app.get_handlers(ev, MAIN_DISPATCHER)),
+                     set(main) | set([handler]))
+        self.app.unregister_handler(EventTest, handler)
+        assert_equal(set(self.app.get_handlers(ev, MAIN_DISPATCHER)),
+                     set(main))
+
+    def test_get_observers(self):
+        ev = EventTest()
+        assert_equal(self.app.get_observers(ev, MAIN_DISPATCHER), [])
+
+        self.app.register_observer(EventTest, 'main', set([MAIN_DISPATCHER]))
+        self.app.register_observer(EventTest, 'any')
+        assert_equal(set(self.app.get_observers(ev, MAIN_DISPATCHER)),
+                     set(['main', 'any']))
+        assert_equal(self.app.get_observers(ev, CONFIG_DISPATCHER), ['any'])
+
+        self.app.unregister_observer(EventTest, 'any')
+        assert_equal(self.app.get_observers(ev, MAIN_DISPATCHER), ['main'])
+        self.app.unregister_observer_all_event('main')
+        assert_equal(self.app.get_observers(ev, MAIN_DISPATCHER), [])
+
+
+
+class Test_EventQueue(unittest.TestCase):
+
+    """ Test case for the overload policies of EventQueue
+    """
+
+    def _drain(self, q):
+        events = []
+        while not q.empty():
+            events.append(q.get()[0])
+        return events
+
+    def test_drop_newest(self):
+        q = app_manager.EventQueue(2, app_manager.EVENT_QUEUE_DROP_NEWEST)
+        evs = [EventTest() for _ in range(3)]
+        assert_equal([q.put((ev, None)) for ev in evs], [True, True, False])
+        assert_equal(self._drain(q), evs[:2])
+        assert_equal((q.enqueued, q.dropped, q.max_depth), (2, 1, 2))
+
+    def test_drop_oldest(self):
+        q = app_manager.EventQueue(2, app_manager.EVENT_QUEUE_DROP_OLDEST)
+        evs = [EventTest() for _ in range(3)]
+        assert_equal([q.put((ev, None)) for ev in evs], [True, True, True])
+        assert_equal(self._drain(q), evs[1:])
+        assert_equal(q.dropped, 1)
+
+    def test_droppable(self):
+        q = app_manager.EventQueue(2, app_manager.EVENT_QUEUE_DROP_OLDEST,
+                                   droppable=[EventTest])
+        other = EventOther()
+        evs = [EventTest() for _ in range(3)]
+        q.put((other, None))
+        q.put((evs[0], None))
+        # the oldest droppable event is dropped, not the first one
+        q.put((evs[1], None))
+        # no room for a non droppable event, queued anyway
+        q_other = EventOther()
+        q.put((q_other, None))
+        assert_equal(self._drain(q)[1:], [evs[1], q_other])
+        # queue full of non droppable events, the new event is dropped
+        q.put((other, None))
+        q.put((EventOther(), None))
+        assert_equal(q.put((evs[2], None)), False)
+        assert_equal(q.dropped, 2)
+
+    def test_coalesce(self):
+        q = app_manager.EventQueue(
+            10, coalesce_keys={EventKeyed: lambda ev: ev.key})
+        q.put((EventKeyed(1, 'a'), None))
+        q.put((EventTest(), None))
+        q.put((EventKeyed(2, 'b'), None))
+        q.put((EventKeyed(1, 'c'), MAIN_DISPATCHER))
+        assert_equal(q.qsize(), 3)
+        assert_equal(q.coalesced, 1)
+        ev, state = q.get()
+        assert_equal((ev.value, state), ('c', MAIN_DISPATCHER))
+        # no longer queued, not coalesced
+        q.put((EventKeyed(1, 'd'), None))
+        assert_equal([getattr(ev, 'value', None) for ev in self._drain(q)],
+                     [None, 'b', 'd'])
+
+    def test_block(self):
+        q = app_manager.EventQueue(1)
+        q.put((EventTest(), None))
+        putter = hub.spawn(q.put, (EventOther(), None))
+        hub.sleep(0)
+        assert_equal((q.qsize(), q.blocked), (1, 1))
+        assert_true(isinstance(q.get()[0], EventTest))
+        hub.joinall([putter])
+        assert_true(isinstance(q.get()[0], EventOther))
+
+        got = []
+        getter = hub.spawn(lambda: got.append(q.get()))
+        hub.sleep(0)
+        q.put((EventKeyed(0, 0), None))
+        hub.joinall([getter])
+        assert_true(isinstance(got[0][0], EventKeyed))
+
+
+if __name__ == '__main__':
+    nose.main(argv=['nosetests', '-s', '-v'], defaultTest=__file__)
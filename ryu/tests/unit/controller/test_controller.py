@@ -19,9 +19,12 @@ try:
 except ImportError:
     from unittest import mock  # Python 3
 
+import sys
+import threading
 import warnings
 import unittest
 import logging
+import random
 
 import nose
 from nose.tools import assert_equal
@@ -29,6 +32,8 @@ from nose.tools import assert_true
 
 from ryu.base import app_manager  # To suppress cyclic import
 from ryu.controller import controller
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_3
 from ryu.ofproto import ofproto_v1_3_parser
 from ryu.ofproto import ofproto_v1_2_parser
 from ryu.ofproto import ofproto_v1_0_parser
@@ -79,5 +84,156 @@ class Test_Datapath(unittest.TestCase):
         self._test_ports_accessibility(ofproto_v1_0_parser, 0)
 
 
+    def _recv_msgs(self, data, chunk_sizes, recv_buf_size):
+        """feed data in chunks to _recv_loop, return the parsed messages."""
+        chunks = []
+        pos = 0
+        for size in chunk_sizes:
+            chunks.append(data[pos:pos + size])
+            pos += size
+        if pos < len(data):
+            chunks.append(data[pos:])
+
+        def recv_into(view):
+            if not chunks:
+                return 0
+            chunk = chunks.pop(0)
+            if len(chunk) > len(view):
+                chunks.insert(0, chunk[len(view):])
+                chunk = chunk[:len(view)]
+            view[:len(chunk)] = chunk
+            return len(chunk)
+
+        with mock.patch('ryu.controller.controller.Datapath.set_state'):
+            sock_mock = mock.Mock()
+            sock_mock.recv_into.side_effect = recv_into
+            dp = controller.Datapath(sock_mock, mock.Mock())
+            dp.set_version(ofproto_v1_3.OFP_VERSION)
+            dp.state = None
+            dp.recv_buf_size = recv_buf_size
+            dp.ofp_brick = mock.Mock()
+            dp.ofp_brick.get_handlers.return_value = []
+            dp._recv_loop()
+
+        assert_true(sock_mock.close.called)
+        return [args[0][0].msg for args in
+                dp.ofp_brick.send_event_to_observers.call_args_list]
+
+    def test_recv_loop(self):
+        sizes = [0, 1, 10, 100, 300, 1000, 5000, 7, 0]
+        data = bytearray()
+        for num, size in enumerate(sizes):
+            data += b'\x04\x02' + bytearray(
+                [(8 + size) >> 8, (8 + size) & 0xff, 0, 0, 0, num])
+            data += bytearray([num]) * size
+
+        random.seed(0)
+        for recv_buf_size in (16, 256, 64 * 1024):
+            for chunk_sizes in ([len(data)], [1] * len(data),
+                                [random.randint(1, 700) for _ in range(100)]):
+                msgs = self._recv_msgs(data, chunk_sizes, recv_buf_size)
+                assert_equal(len(msgs), len(sizes))
+                for num, (msg, size) in enumerate(zip(msgs, sizes)):
+                    assert_true(isinstance(
+                        msg, ofproto_v1_3_parser.OFPEchoRequest))
+                    assert_equal(msg.xid, num)
+                    assert_equal(msg.data, bytearray([num]) * size)
+
+    def test_recv_loop_invalid_length(self):
+        data = b'\x04\x02\x00\x04\x00\x00\x00\x00' * 2
+        msgs = self._recv_msgs(bytearray(data), [len(data)], 1024)
+        assert_equal(msgs, [])
+
+
+    def _send_writes(self, send, send_buf_cap=None):
+        """run send(datapath) and _send_loop, return the buffers written."""
+        with mock.patch('ryu.controller.controller.Datapath.set_state'):
+            sock_mock = mock.Mock()
+            dp = controller.Datapath(sock_mock, mock.Mock())
+            dp.set_version(ofproto_v1_3.OFP_VERSION)
+            if send_buf_cap is not None:
+                dp.send_buf_cap = send_buf_cap
+            send(dp)
+            thr = hub.spawn(dp._send_loop)
+            hub.sleep(0)
+            hub.kill(thr)
+            hub.joinall([thr])
+
+        writes = [bytes(args[0][0]) for args in sock_mock.sendall.call_args_list]
+        assert_equal(dp.send_writes, len(writes))
+        assert_equal(dp.sent_bytes, sum(len(buf) for buf in writes))
+        return dp, writes
+
+    def test_send_loop_coalesce(self):
+        bufs = [str(num).encode('ascii') * (num + 1) for num in range(10)]
+
+        def send(dp):
+            for buf in bufs:
+                dp.send(buf)
+
+        dp, writes = self._send_writes(send)
+        assert_equal(writes, [b''.join(bufs)])
+
+        dp, writes = self._send_writes(send, send_buf_cap=10)
+        assert_true(len(writes) > 1)
+        assert_true(all(len(buf) < 10 + 10 for buf in writes))
+        assert_equal(b''.join(writes), b''.join(bufs))
+
+    def test_send_msg_flush_later(self):
+        def send(dp):
+            for _ in range(5):
+                dp.send_msg(ofproto_v1_3_parser.OFPEchoRequest(dp), flush=False)
+            assert_equal(dp.send_q.qsize(), 0)
+            assert_equal(dp.send_stats()['held'], 5)
+            dp.send_msg(ofproto_v1_3_parser.OFPBarrierRequest(dp))
+            assert_equal(dp.send_q.qsize(), 1)
+
+        dp, writes = self._send_writes(send)
+        assert_equal(len(writes), 1)
+        assert_equal(len(writes[0]), 6 * 8)
+        assert_equal([bytearray(writes[0])[pos + 1] for pos in range(0, 48, 8)],
+                     [ofproto_v1_3.OFPT_ECHO_REQUEST] * 5 +
+                     [ofproto_v1_3.OFPT_BARRIER_REQUEST])
+        stats = dp.send_stats()
+        assert_equal((stats['msgs'], stats['writes'], stats['held']), (6, 1, 0))
+
+    def test_send_msg_flush_later_threads(self):
+        # held messages appended from native threads while flushing
+        thread_num = 4
+        msg_num = 2000
+        with mock.patch('ryu.controller.controller.Datapath.set_state'):
+            dp = controller.Datapath(mock.Mock(), mock.Mock())
+        dp.set_version(ofproto_v1_3.OFP_VERSION)
+        sent = []
+        dp.send = sent.append
+
+        def send_later():
+            for _ in range(msg_num):
+                dp.send_msg(ofproto_v1_3_parser.OFPEchoRequest(dp), flush=False)
+
+        # switch threads as often as possible
+        if hasattr(sys, 'setswitchinterval'):
+            interval = sys.getswitchinterval()
+            set_interval = sys.setswitchinterval
+            set_interval(1e-6)
+        else:
+            interval = sys.getcheckinterval()
+            set_interval = sys.setcheckinterval
+            set_interval(1)
+        try:
+            threads = [threading.Thread(target=send_later) for _ in range(thread_num)]
+            for thr in threads:
+                thr.start()
+            while any(thr.is_alive() for thr in threads):
+                dp.flush()
+            for thr in threads:
+                thr.join()
+            dp.flush()
+        finally:
+            set_interval(interval)
+        assert_equal(sum(len(buf) for buf in sent), thread_num * msg_num * 8)
+        assert_equal(dp.send_stats()['held'], 0)
+
+
 if __name__ == '__main__':
     nose.main(argv=['nosetests', '-s', '-v'], defaultTest=__file__)
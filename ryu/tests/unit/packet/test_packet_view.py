@@ -0,0 +1,110 @@
+# Copyright (C) 2012 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.ofproto import ether, inet
+from ryu.lib.packet import packet, ethernet, arp, ipv4, udp
+from ryu.lib.packet import packet_view
+from ryu.lib.packet.packet_view import PacketView, get_packet_view
+
+
+LOG = logging.getLogger('test_packet_view')
+
+
+class _Msg(object):
+    def __init__(self, data):
+        self.data = data
+
+
+class _Event(object):
+    def __init__(self, data):
+        self.msg = _Msg(data)
+
+
+class Test_packet_view(unittest.TestCase):
+    """ Test case for packet_view
+    """
+
+    src_mac = '00:07:0d:af:f4:54'
+    dst_mac = '00:00:00:00:00:01'
+    src_ip = '10.0.0.1'
+    dst_ip = '10.0.0.2'
+
+    def setUp(self):
+        packet_view.stats.reset()
+
+    def tearDown(self):
+        packet_view.stats.reset()
+
+    def _arp_data(self):
+        p = packet.Packet()
+        p.add_protocol(ethernet.ethernet(self.dst_mac, self.src_mac,
+                                         ether.ETH_TYPE_ARP))
+        p.add_protocol(arp.arp_ip(arp.ARP_REQUEST, self.src_mac, self.src_ip,
+                                  '00:00:00:00:00:00', self.dst_ip))
+        p.serialize()
+        return p.data
+
+    def _udp_data(self):
+        p = packet.Packet()
+        p.add_protocol(ethernet.ethernet(self.dst_mac, self.src_mac,
+                                         ether.ETH_TYPE_IP))
+        p.add_protocol(ipv4.ipv4(proto=inet.IPPROTO_UDP,
+                                 src=self.src_ip, dst=self.dst_ip))
+        p.add_protocol(udp.udp(1000, 2000))
+        p.add_protocol('payload')
+        p.serialize()
+        return p.data
+
+    def test_lazy_decode(self):
+        view = PacketView(self._arp_data())
+        eq_(packet_view.stats.decodes, 0)
+        eq_(view.arp.src_ip, self.src_ip)
+        eq_(view.ethernet.src, self.src_mac)
+        eq_(view.ipv4, None)
+        eq_(view.igmp, None)
+        eq_(view.lldp, None)
+        eq_(packet_view.stats.decodes, 1)
+
+    def test_header_list_skips_payload(self):
+        view = PacketView(self._udp_data())
+        header_list = view.header_list
+        eq_(sorted(header_list.keys()), ['ethernet', 'ipv4', 'udp'])
+        eq_(view.ipv4.dst, self.dst_ip)
+        ok_(isinstance(view.get_protocol(udp.udp), udp.udp))
+
+    def test_get_packet_view_shared(self):
+        ev = _Event(self._udp_data())
+        for _ in range(5):
+            view = get_packet_view(ev)
+            eq_(view.ipv4.src, self.src_ip)
+        ok_(get_packet_view(ev) is ev.packet_view)
+
+        eq_(packet_view.stats.requests, 6)
+        eq_(packet_view.stats.decodes, 1)
+        eq_(packet_view.stats.decodes_saved, 5)
+        eq_(packet_view.stats.to_dict(),
+            {'requests': 6, 'decodes': 1, 'decodes_saved': 5})
+
+    def test_attached_view_is_reused(self):
+        data = self._arp_data()
+        ev = _Event(data)
+        ev.packet_view = PacketView(data)
+        ok_(get_packet_view(ev) is ev.packet_view)
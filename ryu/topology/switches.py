@@ -32,6 +32,7 @@ from ryu.lib.port_no import port_no_to_str
 from ryu.lib.packet import packet, ethernet
 from ryu.lib.packet import lldp, ether_types
 from ryu.lib.packet import arp, ipv4, ipv6
+from ryu.lib.packet.packet_view import get_packet_view
 from ryu.ofproto.ether import ETH_TYPE_LLDP
 from ryu.ofproto import nx_match
 from ryu.ofproto import ofproto_v1_0
@@ -813,7 +814,7 @@ class Switches(app_manager.RyuApp):
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def host_discovery_packet_in_handler(self, ev):
         msg = ev.msg
-        pkt = packet.Packet(msg.data)
+        pkt = get_packet_view(ev)
         eth = pkt.get_protocols(ethernet.ethernet)[0]
 
         # ignore lldp packet
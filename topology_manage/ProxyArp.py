@@ -3,7 +3,6 @@ import json
 import time
 import datetime
 
-from threading import Thread
 from webob import Response
 
 from ryu.base import app_manager
@@ -19,8 +18,13 @@ from ryu.lib import mac
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.lib.packet import arp, ipv4
+from ryu.lib.packet.packet_view import get_packet_view
 
 from lib.project_lib import enum
+from lib.batch_worker import BatchWorker
+from lib.expiry_scheduler import ExpiryScheduler
+from base.parameters import ARP_QUEUE_SIZE, ARP_QUEUE_MAX_BATCH, ARP_QUEUE_MAX_LATENCY
+from base.parameters import PACKET_IN_EVENT_QUEUE_SIZE, PACKET_IN_EVENT_QUEUE_POLICY
 from host_manage.HostTrack import DEFAULT_ARP_PING_SRC_MAC
 
 
@@ -57,6 +61,9 @@ class EventProxyArpTableUpdate(event.EventBase):
 
 class ProxyArp(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    EVENT_QUEUE_SIZE = PACKET_IN_EVENT_QUEUE_SIZE
+    EVENT_QUEUE_POLICY = PACKET_IN_EVENT_QUEUE_POLICY
+    EVENT_QUEUE_DROPPABLE = [ofp_event.EventOFPPacketIn]
 
     _EVENTS = [EventProxyArpTableUpdate]
 
@@ -82,8 +89,11 @@ class ProxyArp(app_manager.RyuApp):
 
         # arp table
         # {ip: mac}
-        self.queue = hub.Queue()
         self.arp_table = ARPTable()
+        self.queue = BatchWorker('proxy_arp', self.process_queued_msg,
+                                 ARP_QUEUE_SIZE, ARP_QUEUE_MAX_BATCH,
+                                 ARP_QUEUE_MAX_LATENCY)
+        self.queue.start()
 
         # install flow for arp packet
         self.install_flow = install_flow
@@ -106,7 +116,7 @@ class ProxyArp(app_manager.RyuApp):
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def packet_in_handler(self, ev):
         msg = ev.msg
-        pkt = packet.Packet(msg.data)
+        pkt = get_packet_view(ev).pkt
 
         for p in pkt.protocols:
             if isinstance(p, arp.arp):
@@ -132,12 +142,10 @@ class ProxyArp(app_manager.RyuApp):
             return
         elif eth_dst == DEFAULT_ARP_PING_SRC_MAC:
             self.add_to_queue((ip_learning, mac_learning))
-            self.trigger_update()
             return
 
         # update arp table by src host info
         self.add_to_queue((ip_learning, mac_learning))
-        self.trigger_update()
 
         # learn a mac address to avoid FLOOD next time.
         self.mac_to_port.setdefault(dpid, {})
@@ -315,31 +323,19 @@ class ProxyArp(app_manager.RyuApp):
                 pass
         return None
 
-    def process_queued_msg(self):
+    def process_queued_msg(self, batch):
         """
-            try to process all the queued routing information.
+            update arp table with a batch of learned (ip, mac).
         """
-        try:
-            while not self.queue.empty():
-                arp_src_ip, eth_src = self.queue.get()
-                self.arp_table.update_entry(arp_src_ip, eth_src)
-        except:
-            pass
+        for arp_src_ip, eth_src in batch:
+            self.arp_table.update_entry(arp_src_ip, eth_src)
 
     def add_to_queue(self, msg):
         """
-            a interface to add a object into queue.
+            a interface to add a object into queue,
+            the object is dropped when the queue is full.
         """
-        if not self.queue.full():
-            self.queue.put(msg)
-
-    def trigger_update(self):
-        """
-            create a thread to update the routing table.
-        """
-        update_thread = Thread(target=self.process_queued_msg)
-        update_thread.setDaemon(True)
-        update_thread.start()
+        self.queue.put(msg)
 
 
 class ProxyArpRestController(ControllerBase):
@@ -352,16 +348,24 @@ class ProxyArpRestController(ControllerBase):
         body = json.dumps(self.proxy_arp_instance.arp_table.to_dict())
         return Response(content_type='application/json', body=body)
 
+    @route('proxyarp', '/proxyarp/stats/queue', methods=['GET'])
+    def get_queue_stats(self, req, **kwargs):
+        body = json.dumps(self.proxy_arp_instance.queue.stats())
+        return Response(content_type='application/json', body=body)
+
 
 class ARPTable(dict):
     def __init__(self):
         if not hasattr(self, 'expire_time'):
             super(ARPTable, self).__init__()
 
+            # time a timed out entry is kept before deletion
             self.gc_interval = ARP_TABLE_GC_INTERVAL
             self.expire_time = ARP_ENTRY_TIMEOUT
 
-            self._init_thread()
+            # deadline of every entry
+            self.expiry_scheduler = ExpiryScheduler()
+            self.expiry_scheduler.start()
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance'):
@@ -369,35 +373,30 @@ class ARPTable(dict):
             cls._instance = orig.__new__(cls, *args, **kwargs)
         return cls._instance
 
-    def _init_thread(self):
-        """
-            create a thread to check arp entry validation.
-        """
-        logger.info('garbage collector thread start with interval %ds', self.gc_interval)
-        gc_thread = Thread(target=self._garbage_collect)
-        gc_thread.setDaemon(True)
-        gc_thread.start()
-
-    def _garbage_collect(self):
+    def _entry_timeout(self, ip, entry):
         """
-            iterate the whole arp table.
-            deprecate TIMEOUT entries and delete DEL entries.
+            called by the expiry scheduler at the deadline of entry,
+            deprecate a LIVE entry older than expire_time, delete a
+            TIMEOUT entry gc_interval later.
         """
-        while True:
-            now_time = time.time()
-            valid_time = now_time - self.expire_time
-            logger.debug('[ARP Table]garbage collecting.')
-
-            for ip, entry in self.items():
-                if entry.state == entry.StateEnum.LIVE:
-                    if entry.timestamp < valid_time:
-                        entry.state = entry.StateEnum.TIMEOUT
-                elif entry.state == entry.StateEnum.TIMEOUT:
-                    if entry.timestamp < now_time:
-                        # entry.state = entry.StateEnum.DEL
-                        del self[ip]
-
-            time.sleep(self.gc_interval)
+        if self.get(ip) is not entry:
+            return None
+
+        now_time = time.time()
+        if entry.state == entry.StateEnum.LIVE:
+            if entry.timestamp + self.expire_time > now_time:
+                # refreshed meanwhile
+                self.expiry_scheduler.schedule('arp_table', entry.timestamp + self.expire_time,
+                                               self._entry_timeout, ip, entry)
+                return None
+            entry.state = entry.StateEnum.TIMEOUT
+            self.expiry_scheduler.schedule('arp_table', now_time + self.gc_interval,
+                                           self._entry_timeout, ip, entry)
+            return 'timeout'
+
+        # entry.state = entry.StateEnum.DEL
+        del self[ip]
+        return 'deleted'
 
     def update_entry(self, ip, mac):
         """
@@ -407,9 +406,13 @@ class ARPTable(dict):
             entry = self[ip]
             entry.mac = mac
             entry.timestamp = time.time()
+            # its pending deadline finds it alive and reschedules it
             entry.state = entry.StateEnum.LIVE
         except KeyError:
-            self[ip] = ARPEntry(mac)
+            entry = ARPEntry(mac)
+            self[ip] = entry
+            self.expiry_scheduler.schedule('arp_table', entry.timestamp + self.expire_time,
+                                           self._entry_timeout, ip, entry)
 
     def get_mac(self, ip):
         """
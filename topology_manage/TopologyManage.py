@@ -23,6 +23,10 @@ from object.link import Link, LinkTable, LinkTableApi
 from topology_manage.object import topo_event
 from lib.project_lib import Megabits
 from link_monitor.link_monitor_main import LinkMonitor
+from link_monitor.link_state import LinkStateEpoch
+from link_monitor.monitor_scheduler import PollingScheduler
+from link_monitor.link_history import LinkHistory
+from base.parameters import LINK_HISTORY_POINTS
 
 
 FORMAT = '%(name)s[%(levelname)s]%(message)s'
@@ -102,6 +106,7 @@ class TopologyManage(app_manager.RyuApp):
             self.links.del_all_virtual_link(neighbor_dpid, dpid)
 
         self.switches.del_switch(dpid)
+        LinkStateEpoch().bump('switch_leave')
 
         self.send_event_to_observers(topo_event.EventSwitchDel(dpid))
         logger.debug('switch leave (dpid=%s)', dpid_to_str(dpid))
@@ -194,6 +199,7 @@ class TopologyManage(app_manager.RyuApp):
             return
 
         timestamp = time.time()
+        LinkStateEpoch().bump('port_modify')
 
         # when port state changed
         if record_port_state == ofproto_v1_3.OFPPR_DELETE and \
@@ -276,6 +282,7 @@ class TopologyManage(app_manager.RyuApp):
         self.switches.set_neighbor(src_port.dpid, dst_port.dpid, src_port.port_no)
 
         if link:
+            LinkStateEpoch().bump('link_add')
             self.send_event_to_observers(topo_event.EventLinkAdd(link))
             logger.debug('link connected: %s->%s', dpid_to_str(switch.dp.id),
                          dpid_to_str(dst_port.dpid))
@@ -314,6 +321,7 @@ class TopologyManage(app_manager.RyuApp):
 
         api_links = LinkTableApi()
         api_links.init(self.links)
+        LinkStateEpoch().bump('link_delete')
         if src_dpid and dst_dpid:
             self.send_event_to_observers(topo_event.EventLinkDel(src_dpid, dst_dpid))
             self.send_event_to_observers(topo_event.EventLinkDelUpdateTopo(self.switches, api_links,
@@ -411,7 +419,10 @@ class TopologyManage(app_manager.RyuApp):
         # self.init_link_configuration()
         self.read_switch_configuration()
         self.read_link_configuration()
-        link_monitor_object = LinkMonitor()
+        LinkStateEpoch().bump('link_configuration')
+        link_monitor_object = app_manager.lookup_service_brick('LinkMonitor')
+        if link_monitor_object is None:
+            link_monitor_object = LinkMonitor()
         link_monitor_object.topo_initialize_end_handler(ev)
 
     def init_switch_configuration(self):
@@ -530,6 +541,52 @@ class TopologyManageRestController(ControllerBase):
             body = json.dumps(rest_body_none)
         return Response(content_type='application/json', body=body)
 
+    @route('topologymanage', '/topologymanage/stats/send', methods=['GET'])
+    def get_send_stats(self, req, **kwargs):
+        body = json.dumps({dpid_to_str(dpid): switch.dp.send_stats()
+                           for dpid, switch in self.topo_instance.switches.items()})
+        return Response(content_type='application/json', body=body)
+
+    @route('topologymanage', '/topologymanage/stats/linkpoll', methods=['GET'])
+    def get_link_poll_stats(self, req, **kwargs):
+        body = json.dumps(PollingScheduler().stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('topologymanage', '/topologymanage/stats/linkhistory', methods=['GET'])
+    def get_link_history_stats(self, req, **kwargs):
+        body = json.dumps(LinkHistory().stats())
+        return Response(content_type='application/json', body=body)
+
+    @route('topologymanage', '/topologymanage/link/src/{src_dpid}/dst/{dst_dpid}/history',
+           methods=['GET'])
+    def get_link_history_by_dpid(self, req, **kwargs):
+        """downsampled history of both ports of the links, ?since=<time>&points=<num>."""
+        link = self.topo_instance.links.get_link_by_dpid(str_to_dpid(kwargs['src_dpid']),
+                                                         str_to_dpid(kwargs['dst_dpid']))
+        if not link:
+            return Response(content_type='application/json',
+                            body=json.dumps(rest_body_none))
+        try:
+            since = float(req.GET['since']) if 'since' in req.GET else None
+            points = int(req.GET.get('points', LINK_HISTORY_POINTS))
+        except ValueError:
+            return Response(status=400)
+
+        history = LinkHistory()
+        links = []
+        for l in link.values():
+            ports = {}
+            for name, port in (('src', l.src), ('dst', l.dst)):
+                ports[name] = {'dpid': dpid_to_str(port.dpid),
+                               'port_no': port_no_to_str(port.port_no),
+                               'last': history.last(port.dpid, port.port_no),
+                               'ewma': history.ewma(port.dpid, port.port_no),
+                               'percentile': history.percentile(port.dpid, port.port_no),
+                               'history': history.history(port.dpid, port.port_no,
+                                                          since, max(1, points))}
+            links.append(ports)
+        return Response(content_type='application/json', body=json.dumps(links))
+
     @route('topologymanage', '/topologymanage/link', methods=['GET'])
     def get_all_link(self, req, **kwargs):
         body = json.dumps(self.topo_instance.links.to_dict())